@@ -64,144 +64,169 @@ def get_xy(file_name, x_arg_name, y_arg_name):
     df = df[df[y_arg_name] >= 0.]
     return df[x_arg_name], df[y_arg_name]
 
-def calculating_max_res_from_Rsplit_CCstar_dat(CCstar_dat_file, Rsplit_dat_file):
-    """Calculate the maximum resolution where CC* intersects with Rsplit."""
-    d_CCstar, CCstar = get_xy(CCstar_dat_file, x_arg_name, y_arg_name)
-    CCstar *= 100
-
-    d_Rsplit, Rsplit = get_xy(Rsplit_dat_file, x_arg_name, y_arg_name2)
-    
-    i = 0
-    CC2, d2 = CCstar[0], d_CCstar[0]
-    CC1, d1 = 0., 0.
-    Rsplit2 = Rsplit[0]
-    Rsplit1 = 0.
-
-    while Rsplit[i] <= CCstar[i] and i < len(d_CCstar):
-        CC1, d1, Rsplit1 = CC2, d2, Rsplit2
-        i += 1
-        try:
-            CC2, d2, Rsplit2 = CCstar[i], d_CCstar[i], Rsplit[i]
-        except IndexError:
-            return -1000
-            
-        if Rsplit[i] == CCstar[i]:
-            resolution = d_CCstar[i]
-            return resolution
-            
-    k1 = round((CC2 - CC1) / (d2 - d1), 3)
-    b1 = round((CC1 * d2 - CC2 * d1) / (d2 - d1), 3)     
-    k2 = round((Rsplit2 - Rsplit1) / (d2 - d1), 3)
-    b2 = round((Rsplit1 * d2 - Rsplit2 * d1) / (d2 - d1), 3)
-    resolution = round(0.98 * (b2 - b1) / (k1 - k2), 3)
-    return resolution
-
-def get_d_at_snr_one(file_path):
-    """Get resolution at SNR=1 using linear interpolation, handling non-monotonic SNR data."""
-    data = []
-    
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-        for line in lines[1:]:
-            parts = line.split()
-            if len(parts) < 9:
-                continue
-            try:
-                snr = float(parts[6])
-                d_value = float(parts[8])
-                data.append((snr, d_value))
-            except ValueError:
-                continue
-
-    # Filter only monotonically decreasing SNR
-    filtered_data = []
-    for i, (snr, d_value) in enumerate(data):
-        if i == 0 or snr < filtered_data[-1][0]:  # SNR must decrease
-            filtered_data.append((snr, d_value))
-
-    # Find d(A) at SNR=1 using linear interpolation
-    for i in range(len(filtered_data) - 1):
-        snr1, d1 = filtered_data[i]
-        snr2, d2 = filtered_data[i + 1]
-        if snr1 == 1.0:
-            return d1
-        if snr1 > 1.0 > snr2:  # Interpolate
-            return round(d1 + (d2 - d1) * (1.0 - snr1) / (snr2 - snr1), 3)
-
-    return None  # Return None if SNR=1 not found or data insufficient
-
-def get_d_at_cc_threshold(file_path, target_cc=0.3):
-    """Parse the file and return the d(A) value corresponding to a specific CC value."""
+def pad_columns(columns):
+    """Stack 1-D arrays of different lengths into a 2-D array padded with NaN."""
+    columns = [np.asarray(column, dtype=float) for column in columns]
+    width = max((len(column) for column in columns), default=0)
+    stacked = np.full((len(columns), width), np.nan)
+    for i, column in enumerate(columns):
+        stacked[i, :len(column)] = column
+    return stacked
+
+def d_at_threshold_batch(values, d_values, target):
+    """Vectorized d(A) at which a decreasing statistic reaches the target, one table per row.
+
+    Shells are kept only while the statistic keeps decreasing, then the first kept shell equal
+    to the target is returned as is, or the crossing of two kept shells is linearly interpolated.
+    NaN where the target is not crossed.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    d_values = np.atleast_2d(np.asarray(d_values, dtype=float))
+    n_tables, n_shells = values.shape
+    result = np.full(n_tables, np.nan)
+    if n_shells < 2:
+        return result
+
+    # Monotone filter: keep a shell if it is below the running minimum of the shells before it
+    valid = ~(np.isnan(values) | np.isnan(d_values))
+    masked = np.where(valid, values, np.inf)
+    previous_min = np.concatenate(
+        [np.full((n_tables, 1), np.inf), np.minimum.accumulate(masked, axis=1)[:, :-1]], axis=1
+    )
+    kept = valid & (masked < previous_min)
+
+    # Move the kept shells to the front of every row, in their original order
+    order = np.argsort(~kept, axis=1, kind='stable')
+    n_kept = kept.sum(axis=1)
+    y = np.take_along_axis(values, order, axis=1)
+    d = np.take_along_axis(d_values, order, axis=1)
+    y[np.arange(n_shells) >= n_kept[:, None]] = np.nan
+
+    # Kept values strictly decrease, so all shells above the target come first
+    n_above = (y > target).sum(axis=1)
+    rows = np.arange(n_tables)
+    at = np.minimum(n_above, n_shells - 1)
+    before = np.maximum(n_above - 1, 0)
+
+    exact = (n_above <= n_kept - 2) & (y[rows, at] == target)
+    result[exact] = d[rows, at][exact]
+
+    crossing = (n_above >= 1) & (n_above <= n_kept - 1) & (y[rows, at] < target)
+    y1, y2 = y[rows, before], y[rows, at]
+    d1, d2 = d[rows, before], d[rows, at]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        interpolated = d1 + (d2 - d1) * (target - y1) / (y2 - y1)
+    result[crossing] = [round(value, 3) for value in interpolated[crossing].tolist()]
+    return result
+
+def max_res_from_Rsplit_CCstar_batch(d_CCstar, CCstar, Rsplit):
+    """Vectorized resolution where CC* (in %) intersects with Rsplit, one table per row.
+
+    -1000 where the curves do not cross.
+    """
+    d = np.atleast_2d(np.asarray(d_CCstar, dtype=float))
+    C = np.atleast_2d(np.asarray(CCstar, dtype=float))
+    R = np.atleast_2d(np.asarray(Rsplit, dtype=float))
+    n_tables = d.shape[0]
+    n_shells = min(d.shape[1], C.shape[1], R.shape[1])
+    result = np.full(n_tables, -1000.)
+    if n_shells == 0:
+        return result
+    d, C, R = d[:, :n_shells], C[:, :n_shells], R[:, :n_shells]
+
+    defined = ~(np.isnan(d) | np.isnan(C) | np.isnan(R))
+    length = np.where(defined.all(axis=1), n_shells, np.argmin(defined, axis=1))
+    reached = R >= C
+    reached[:, 0] = R[:, 0] > C[:, 0]
+    reached &= np.arange(n_shells) < length[:, None]
+
+    found = reached.any(axis=1)
+    s = np.argmax(reached, axis=1)
+    rows = np.arange(n_tables)
+    C2, d2, R2 = C[rows, s], d[rows, s], R[rows, s]
+    previous = np.maximum(s - 1, 0)
+    first = s == 0
+    C1 = np.where(first, 0., C[rows, previous])
+    d1 = np.where(first, 0., d[rows, previous])
+    R1 = np.where(first, 0., R[rows, previous])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k1 = np.round((C2 - C1) / (d2 - d1), 3)
+        b1 = np.round((C1 * d2 - C2 * d1) / (d2 - d1), 3)
+        k2 = np.round((R2 - R1) / (d2 - d1), 3)
+        b2 = np.round((R1 * d2 - R2 * d1) / (d2 - d1), 3)
+        intersection = np.round(0.98 * (b2 - b1) / (k1 - k2), 3)
+
+    equal = ~first & (R2 == C2)
+    result[found] = np.where(equal, d2, intersection)[found]
+    return result
+
+def read_threshold_columns(file_path, value_index, d_index, min_parts):
+    """Read a statistic column and the d(A) column of a shell file, skipping the header."""
+    values = []
+    d_values = []
     with open(file_path, 'r') as file:
         lines = file.readlines()
-
-    data = []
     for line in lines[1:]:
         parts = line.split()
-        if len(parts) < 5:
+        if len(parts) < min_parts:
             continue
         try:
-            cc = float(parts[1])  # CC column
-            d_value = float(parts[3])  # d(A) column
-            data.append((cc, d_value))
+            value = float(parts[value_index])
+            d_value = float(parts[d_index])
         except ValueError:
             continue
+        values.append(value)
+        d_values.append(d_value)
+    return values, d_values
+
+def resolution_cutoffs_batch(shell_columns):
+    """Compute all resolution cut-offs of many runs in one vectorized call.
+
+    shell_columns is a list of (d_CCstar, CCstar, Rsplit, snr, d_snr, cc, d_cc) per run,
+    as returned by load_shell_columns.
+    """
+    d_CCstar, CCstar, Rsplit, snr, d_snr, cc, d_cc = (pad_columns(column) for column in zip(*shell_columns))
+    return {
+        'CC* intersects with Rsplit at': max_res_from_Rsplit_CCstar_batch(d_CCstar, CCstar * 100, Rsplit),
+        'Resolution SNR=1': d_at_threshold_batch(snr, d_snr, 1.0),
+        'Resolution CC>=0.3': d_at_threshold_batch(cc, d_cc, 0.3),
+    }
 
-    # Filter only monotonically decreasing CC values
-    filtered_data = []
-    for i, (cc, d_value) in enumerate(data):
-        if i == 0 or cc < filtered_data[-1][0]:  # CC must decrease
-            filtered_data.append((cc, d_value))
-
-    # Find the exact or interpolate for the target CC
-    for i in range(len(filtered_data) - 1):
-        cc1, d1 = filtered_data[i]
-        cc2, d2 = filtered_data[i + 1]
-        
-        if cc1 == target_cc:  # Exact match
-            return d1
-        if cc1 > target_cc > cc2:  # Interpolation
-            return round(d1 + (d2 - d1) * (target_cc - cc1) / (cc2 - cc1), 3)
-    return None  # Return None if target CC is out of range
-
-def processing(CCstar_dat_file):
-    """Process a single file and extract relevant data."""
-    data_info = defaultdict(dict)
-    
+def format_cutoff(value):
+    """Format a cut-off the way the per-file functions used to be printed."""
+    if np.isnan(value):
+        return 'None'
+    if value == -1000:
+        return '-1000'
+    return str(float(value))
+
+def wait_for_non_empty(file_path, start_time, timeout):
+    while not os.path.exists(file_path) and time.time() - start_time < timeout:
+        time.sleep(5)
+    while os.stat(file_path).st_size == 0 and time.time() - start_time < timeout:
+        time.sleep(5)
+
+def load_shell_columns(CCstar_dat_file):
+    """Wait for the shell files of a run and read the columns needed for its cut-offs."""
     name_of_run = os.path.basename(CCstar_dat_file).split(".")[0].replace("_CCstar","")
-    data_info[name_of_run] = {i: '' for i in indexes}
-    
     print(f'Processing {name_of_run}')
-    
+
     Rsplit_dat_file = CCstar_dat_file.replace("CCstar", "Rsplit")
-    
-    # Wait for Rsplit_dat_file to exist and be non-empty
-    start_time = time.time()
-    timeout = 60  # Timeout after 60 seconds
-    while not os.path.exists(Rsplit_dat_file) and time.time() - start_time < timeout:
-        time.sleep(5)
-    while os.stat(Rsplit_dat_file).st_size == 0 and time.time() - start_time < timeout:
-        time.sleep(5)
-    
-    # Similarly, wait for other necessary files
     CC_dat_file = CCstar_dat_file.replace("CCstar", "CC")
-    while not os.path.exists(CC_dat_file) and time.time() - start_time < timeout:
-        time.sleep(5)
-    while os.stat(CC_dat_file).st_size == 0 and time.time() - start_time < timeout:
-        time.sleep(5)
-    
     SNR_dat_file = CCstar_dat_file.replace("CCstar", "SNR")
-    while not os.path.exists(SNR_dat_file) and time.time() - start_time < timeout:
-        time.sleep(5)
-    while os.stat(SNR_dat_file).st_size == 0 and time.time() - start_time < timeout:
-        time.sleep(5)
-    
-    # Process the files and collect results
-    data_info[name_of_run]['CC* intersects with Rsplit at'] = f'{calculating_max_res_from_Rsplit_CCstar_dat(CCstar_dat_file, Rsplit_dat_file)}'
-    data_info[name_of_run]['Resolution SNR=1'] = str(get_d_at_snr_one(SNR_dat_file))
-    data_info[name_of_run]['Resolution CC>=0.3'] = str(get_d_at_cc_threshold(CC_dat_file))
-    
-    return data_info
+
+    # Wait for the files to exist and be non-empty
+    start_time = time.time()
+    timeout = 60  # Timeout after 60 seconds
+    for file_path in (Rsplit_dat_file, CC_dat_file, SNR_dat_file):
+        wait_for_non_empty(file_path, start_time, timeout)
+
+    d_CCstar, CCstar = get_xy(CCstar_dat_file, x_arg_name, y_arg_name)
+    _, Rsplit = get_xy(Rsplit_dat_file, x_arg_name, y_arg_name2)
+    snr, d_snr = read_threshold_columns(SNR_dat_file, 6, 8, 9)
+    cc, d_cc = read_threshold_columns(CC_dat_file, 1, 3, 5)
+    return name_of_run, (d_CCstar.to_numpy(), CCstar.to_numpy(), Rsplit.to_numpy(), snr, d_snr, cc, d_cc)
 
 if __name__ == "__main__":
     args = parse_cmdline_args()
@@ -216,12 +241,16 @@ if __name__ == "__main__":
             if name.endswith("CCstar.dat"):
                 CC_dat_to_parse.append(os.path.join(path, name))
 
-    # Use multiprocessing to process files in parallel
+    # Read the shell files in parallel, then compute all cut-offs in one vectorized call
     with concurrent.futures.ProcessPoolExecutor() as executor:
-        for result in executor.map(processing, CC_dat_to_parse):
-            for name_of_run in result:
-                data_info_all[name_of_run] = result[name_of_run]         
-    
+        loaded = list(executor.map(load_shell_columns, CC_dat_to_parse))
+
+    if loaded:
+        cutoffs = resolution_cutoffs_batch([columns for _, columns in loaded])
+        for i, (name_of_run, _) in enumerate(loaded):
+            data_info_all[name_of_run] = {index: '' for index in indexes}
+            data_info_all[name_of_run].update({index: format_cutoff(cutoffs[index][i]) for index in cutoffs})
+
     print(len(data_info_all))           
     df = pd.DataFrame.from_dict(data_info_all)
     df.to_csv(output, sep=';')
@@ -22,12 +22,44 @@ except ImportError:
     subprocess.check_call([sys.executable, "-m", "pip", "install", "portalocker"])
     import portalocker
 
-from flask import Flask, render_template_string, jsonify
+try:
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    ds = pq = None  # Parquet campaigns are skipped without pyarrow
+
+try:
+    from matplotlib.figure import Figure  # rendered with the headless Agg/SVG backends, no display needed
+except ImportError:
+    Figure = None  # /plot is not available without matplotlib
+
+from flask import Flask, Response, abort, render_template_string, jsonify, request
 import argparse
+import bisect
 import csv
+from functools import lru_cache
+import glob
+import gzip
+import json
+import queue
+import re
+import threading
+import zlib
 
 app = Flask(__name__)
 CSV_PATH = ""
+CAMPAIGN_SCAN_INTERVAL = 5  # seconds between scans of the campaign directory or glob
+PLOT_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+PLOT_CACHE_SIZE = 256  # rendered plots kept in memory
+SHELL_FILES_COLUMNS = ('Shell files', 'shell_files')  # prefix of the _CCstar.dat/_Rsplit.dat files of a run
+METRICS_SUFFIX = '_metrics.json'  # state file main.py publishes next to the results table
+WATCH_INTERVAL = 0.1  # seconds between checks of the watched files
+KEEPALIVE_INTERVAL = 15  # seconds between comments keeping idle streams open
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+FORMATS = ('records', 'columnar')  # list of dicts, or the column names once plus one array per column
+ENCODINGS = ('gzip', 'deflate')
+COMPRESS_MIN_SIZE = 1024  # bytes, smaller bodies are sent uncompressed
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -37,14 +69,18 @@ HTML_TEMPLATE = """
     <style>
         body { font-family: sans-serif; padding: 1em; background: #f9f9f9; }
         table { border-collapse: collapse; width: 100%; margin-top: 10px; }
-        th, td { border: 1px solid #ccc; padding: 6px 10px; text-align: left; }
-        th { background-color: #eee; }
+        th, td { border: 1px solid #ccc; padding: 0 10px; text-align: left; height: 27px; white-space: nowrap; }
+        th { background-color: #eee; position: sticky; top: 0; }
         tr:nth-child(even) { background-color: #f2f2f2; }
+        tr.spacer, tr.spacer td { border: none; padding: 0; background: none; }
         #table-container { height: 70vh; overflow-y: auto; border: 1px solid #ccc; }
+        #tabs button { padding: 4px 12px; margin-right: 4px; border: 1px solid #ccc; background: #eee; cursor: pointer; }
+        #tabs button.active { background: #fff; font-weight: bold; }
     </style>
 </head>
 <body>
     <h1>Live CSV Viewer</h1>
+    <div id="tabs"></div>
     <div id="table-container">
         <table id="csv-table">
             <thead></thead>
@@ -53,50 +89,219 @@ HTML_TEMPLATE = """
     </div>
 
     <script>
-        function fetchCSV() {
-            fetch('/data')
+        // Virtual scrolling: only the visible rows (plus a margin) are in the DOM, and
+        // rows are fetched page by page from /data?offset=&limit=. The stream only tells
+        // how many rows there are and pushes the appended ones.
+        // When several campaigns are served, every campaign has a tab (requests get
+        // &campaign=<name>) and the Summary tab shows one row per campaign.
+        const ROW_HEIGHT = 28;
+        const PAGE_SIZE = 200;
+        const MARGIN = 20;
+        const container = document.getElementById("table-container");
+        let columns = [];
+        let total = 0;
+        let version = null;
+        let pages = new Map();     // page number -> array of rows
+        let requested = new Set();
+        let follow = true;         // keep the newest rows in view while at the bottom
+        let campaign = null;       // null: the single served file, "" : the summary tab
+        let source = null;
+        let summaryTimer = null;
+        let plotColumn = null;     // run column linking to the plots, if the table records shell files
+        let shellColumn = null;
+
+        function campaignQuery() {
+            return campaign ? `&campaign=${encodeURIComponent(campaign)}` : "";
+        }
+
+        function renderHeader() {
+            const thead = document.querySelector("#csv-table thead");
+            thead.innerHTML = "";
+            const headerRow = document.createElement("tr");
+            columns.forEach(key => {
+                const th = document.createElement("th");
+                th.textContent = key;
+                headerRow.appendChild(th);
+            });
+            thead.appendChild(headerRow);
+        }
+
+        function spacer(height) {
+            const tr = document.createElement("tr");
+            tr.className = "spacer";
+            tr.style.height = `${height}px`;
+            const td = document.createElement("td");
+            td.colSpan = Math.max(columns.length, 1);
+            tr.appendChild(td);
+            return tr;
+        }
+
+        function rowAt(index) {
+            const page = pages.get(Math.floor(index / PAGE_SIZE));
+            return page ? page[index % PAGE_SIZE] : undefined;
+        }
+
+        function loadPage(page) {
+            if (requested.has(page)) return;
+            requested.add(page);
+            fetch(`/data?offset=${page * PAGE_SIZE}&limit=${PAGE_SIZE}&format=columnar${campaignQuery()}`)
                 .then(response => response.json())
                 .then(data => {
-                    const thead = document.querySelector("#csv-table thead");
-                    const tbody = document.querySelector("#csv-table tbody");
-
-                    // Clear current content
-                    thead.innerHTML = "";
-                    tbody.innerHTML = "";
-
-                    if (data.length === 0) return;
-
-                    // Header
-                    const headerRow = document.createElement("tr");
-                    Object.keys(data[0]).forEach(key => {
-                        const th = document.createElement("th");
-                        th.textContent = key;
-                        headerRow.appendChild(th);
-                    });
-                    thead.appendChild(headerRow);
-
-                    // Rows
-                    data.forEach(row => {
-                        const tr = document.createElement("tr");
-                        Object.values(row).forEach(val => {
-                            const td = document.createElement("td");
-                            td.textContent = val;
-                            tr.appendChild(td);
+                    requested.delete(page);
+                    if (data.version !== version) return;  // the table was replaced meanwhile
+                    const rows = pages.get(page) || [];
+                    for (let i = 0; i < data.count; i++) {
+                        const row = {};
+                        data.columns.forEach((col, j) => { row[col] = data.data[j][i]; });
+                        rows[i] = row;
+                    }
+                    pages.set(page, rows);
+                    render();
+                });
+        }
+
+        function render() {
+            const first = Math.max(0, Math.floor(container.scrollTop / ROW_HEIGHT) - MARGIN);
+            const last = Math.min(total, first + Math.ceil(container.clientHeight / ROW_HEIGHT) + 2 * MARGIN);
+            const tbody = document.querySelector("#csv-table tbody");
+            const fragment = document.createDocumentFragment();
+            fragment.appendChild(spacer(first * ROW_HEIGHT));
+            for (let index = first; index < last; index++) {
+                const row = rowAt(index);
+                if (row === undefined) loadPage(Math.floor(index / PAGE_SIZE));
+                const tr = document.createElement("tr");
+                columns.forEach(key => {
+                    const td = document.createElement("td");
+                    const value = row === undefined ? "" : row[key];
+                    if (key === plotColumn && value && row[shellColumn] !== "") {
+                        // the CC*/Rsplit plot of the run is rendered on demand by the server
+                        const link = document.createElement("a");
+                        link.href = `/plot?run=${encodeURIComponent(value)}${campaignQuery()}`;
+                        link.target = "_blank";
+                        link.textContent = value;
+                        td.appendChild(link);
+                    } else {
+                        td.textContent = value;
+                    }
+                    tr.appendChild(td);
+                });
+                fragment.appendChild(tr);
+            }
+            fragment.appendChild(spacer((total - last) * ROW_HEIGHT));
+            tbody.replaceChildren(fragment);
+        }
+
+        function applyEvent(data) {
+            if (data.reset) {
+                columns = data.columns;
+                shellColumn = ["Shell files", "shell_files"].find(c => columns.includes(c)) || null;
+                plotColumn = shellColumn ? (columns.includes("Run") ? "Run" : columns[0]) : null;
+                version = data.version;
+                pages = new Map();
+                requested = new Set();
+                total = 0;
+                renderHeader();
+            }
+            data.rows.forEach(row => {
+                const page = Math.floor(total / PAGE_SIZE);
+                if (!pages.has(page)) pages.set(page, []);
+                pages.get(page)[total % PAGE_SIZE] = row;
+                total += 1;
+            });
+            total = data.total;
+            render();
+            if (follow) container.scrollTop = container.scrollHeight;
+        }
+
+        container.addEventListener("scroll", () => {
+            follow = container.scrollTop + container.clientHeight >= container.scrollHeight - ROW_HEIGHT;
+            render();
+        });
+
+        // Rows are pushed by the server as they are appended; polling is the fallback
+        function connect() {
+            if (window.EventSource) {
+                source = new EventSource(`/stream?rows=0${campaignQuery()}`);
+                source.addEventListener("reset", event => applyEvent(JSON.parse(event.data)));
+                source.addEventListener("append", event => applyEvent(JSON.parse(event.data)));
+            } else {
+                const polled = campaign;
+                source = {close() {}};
+                const timer = setInterval(() => {
+                    if (campaign !== polled) return clearInterval(timer);
+                    fetch(`/data?offset=0&limit=0${campaignQuery()}`)
+                        .then(response => response.json())
+                        .then(data => {
+                            if (data.version !== version) {
+                                applyEvent({reset: true, columns: data.columns, version: data.version, rows: [], total: data.total});
+                            } else if (data.total !== total) {
+                                pages.delete(Math.floor(total / PAGE_SIZE));  // refetch the partial last page
+                                applyEvent({reset: false, rows: [], total: data.total});
+                            }
                         });
-                        tbody.appendChild(tr);
-                    });
+                }, 3000);  // Refresh every 3 seconds
+            }
+        }
 
-                    autoScroll();
+        function loadSummary() {
+            fetch("/summary")
+                .then(response => response.json())
+                .then(data => {
+                    if (campaign !== "") return;
+                    applyEvent({reset: true, columns: data.columns, version: "summary", rows: data.rows, total: data.rows.length});
                 });
         }
 
-        function autoScroll() {
-            const container = document.getElementById("table-container");
-            container.scrollTop = container.scrollHeight;
+        function select(name) {
+            if (source) source.close();
+            source = null;
+            clearInterval(summaryTimer);
+            campaign = name;
+            version = null;
+            document.querySelectorAll("#tabs button").forEach(button => {
+                button.classList.toggle("active", button.dataset.campaign === name);
+            });
+            if (name === "") {
+                loadSummary();
+                summaryTimer = setInterval(loadSummary, 5000);
+            } else {
+                connect();
+            }
+        }
+
+        function renderTabs(names) {
+            const tabs = document.getElementById("tabs");
+            tabs.replaceChildren();
+            ["", ...names].forEach(name => {
+                const button = document.createElement("button");
+                button.textContent = name === "" ? "Summary" : name;
+                button.dataset.campaign = name;
+                button.classList.toggle("active", name === campaign);
+                button.addEventListener("click", () => select(name));
+                tabs.appendChild(button);
+            });
         }
 
-        setInterval(fetchCSV, 3000);  // Refresh every 3 seconds
-        window.onload = fetchCSV;
+        let known = "";
+        function loadCampaigns() {
+            fetch("/campaigns")
+                .then(response => response.json())
+                .then(data => {
+                    const names = data.campaigns.map(c => c.name);
+                    if (names.length === 0) {
+                        if (campaign === null && source === null) connect();  // a single file is served
+                        return;
+                    }
+                    if (JSON.stringify(names) !== known) {
+                        known = JSON.stringify(names);
+                        renderTabs(names);
+                    }
+                    if (campaign === null) select("");
+                });
+        }
+
+        loadCampaigns();
+        setInterval(loadCampaigns, 10000);  // new result files appear during the beamtime
     </script>
 </body>
 </html>
@@ -106,30 +311,1018 @@ HTML_TEMPLATE = """
 def index():
     return render_template_string(HTML_TEMPLATE)
 
+def _read_csv_since(csv_path, since=0, version=None):
+    with open(csv_path, "rb") as f:
+        portalocker.lock(f, portalocker.LOCK_SH)  # Shared lock for reading
+        try:
+            size = os.fstat(f.fileno()).st_size
+            inode = os.fstat(f.fileno()).st_ino
+            header_line = f.readline()
+            header_end = f.tell()
+            if not header_line.endswith(b"\n"):
+                header_line, header_end = b"", 0  # header is still being written
+            current_version = f"{inode:x}-{zlib.crc32(header_line):08x}"
+            reset = version != current_version or since < header_end or since > size
+            start = header_end if reset else since
+            f.seek(start)
+            chunk = f.read(size - start) if header_end else b""
+        finally:
+            portalocker.unlock(f)
+
+    chunk = chunk[:chunk.rfind(b"\n") + 1]  # complete lines only
+    columns = next(csv.reader([header_line.decode("utf-8")], delimiter=';'), [])
+    reader = csv.DictReader(io.StringIO(chunk.decode("utf-8")), fieldnames=columns, delimiter=';')
+    rows = [{k: (v if v is not None else "") for k, v in row.items()} for row in reader]
+
+    # byte offset after every row, unless quoted fields span several lines
+    lines = chunk.splitlines(keepends=True)
+    row_ends = None
+    if len(lines) == len(rows):
+        row_ends, position = [], start
+        for line in lines:
+            position += len(line)
+            row_ends.append(position)
+    result = {
+        'version': current_version,
+        'cursor': start + len(chunk),
+        'reset': reset,
+        'columns': columns,
+        'rows': rows
+    }
+    return result, header_end, row_ends
+
+
+def read_csv_since(csv_path, since=0, version=None):
+    """
+    Read the rows appended to the CSV file after the byte offset `since`.
+
+    `version` identifies the file the offset belongs to (inode and header checksum).
+    If it does not match, or the file is shorter than `since`, the file was replaced,
+    truncated or got a new header and all rows are returned with reset=True. Only
+    complete lines are returned; the returned cursor points right after the last one.
+
+    Returns:
+        dict: {'version', 'cursor', 'reset', 'columns', 'rows'}
+    """
+    return _read_csv_since(csv_path, since, version)[0]
+
+
+def to_columnar(payload):
+    """Replace payload['rows'] (list of dicts) by 'data', one array of values per column."""
+    rows = payload.pop('rows')
+    payload['count'] = len(rows)
+    payload['data'] = [[row.get(col, "") for row in rows] for col in payload['columns']]
+    return payload
+
+
+def accepted_encoding():
+    """Compression the client accepts (gzip preferred over deflate), or None."""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    if encoding == 'deflate':
+        return zlib.compress(body, 6)  # 'deflate' in HTTP is the zlib format
+    return body
+
+
+def _encode_json(payload):
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def json_response(body, encoding=None):
+    """Response with a JSON body already compressed with `encoding` (None for uncompressed)."""
+    response = Response(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
 @app.route('/data')
 def data():
-    rows = []
+    """All rows as a list of dicts, or with ?since=<cursor>&version=<version> only the new ones.
+
+    With ?offset=&limit=&cols= a page of rows is returned, projected on the given
+    comma-separated columns, together with the total number of rows.
+
+    With ?format=columnar the rows are sent as the column names once plus one array
+    per column ('data', and 'count' rows). Bodies are compressed with gzip or deflate
+    when the client accepts it.
+
+    Both are served from the shared in-memory table; the full list is serialized (and
+    compressed) once per version of the file and answered with 304 when the client
+    already has it.
+    """
+    since = request.args.get('since', type=int)
+    csv_path = table_path()
+    fmt = request.args.get('format', 'records')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}"}), 400
+    version = request.args.get('version')
+    table = watcher.table(csv_path)
     max_attempts = 3
     attempt = 0
 
     while attempt < max_attempts:
         try:
-            if os.path.isfile(CSV_PATH):
-                with open(CSV_PATH, "r", newline='') as f:
-                    portalocker.lock(f, portalocker.LOCK_SH)  # Shared lock for reading
-                    content = f.read()
-                    portalocker.unlock(f)
-                    reader = csv.DictReader(io.StringIO(content), delimiter=';')
-                    for row in reader:
-                        clean_row = {k: (v if v is not None else "") for k, v in row.items()}
-                        rows.append(clean_row)
+            watcher.refresh(csv_path)
             break
-        except (csv.Error, OSError) as e:
+        except (csv.Error, OSError, UnicodeDecodeError, ValueError) as e:
             attempt += 1
             time.sleep(0.2)  # brief pause before retry
             if attempt == max_attempts:
                 print(f"[WARNING] Failed to read CSV after {max_attempts} attempts: {e}")
-    return jsonify(rows)
+
+    if 'offset' in request.args or 'limit' in request.args:
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = min(max(0, request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)), MAX_PAGE_SIZE)
+        cols = [c for c in request.args.get('cols', '').split(',') if c]
+        payload = table.page(offset, limit, cols)
+    elif since is not None:
+        payload = table.rows_since(since, version)
+    else:
+        encoding = accepted_encoding()
+        body, etag = table.rows_json(fmt, encoding)
+        response = json_response(body, encoding)
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    body = _encode_json(to_columnar(payload) if fmt == 'columnar' else payload)
+    encoding = accepted_encoding() if len(body) >= COMPRESS_MIN_SIZE else None
+    return json_response(compress(body, encoding), encoding)
+
+
+class LiveTable:
+    """In-memory copy of a CSV file shared by all requests and streams.
+
+    A refresh only stats the file while its (inode, mtime, size) is unchanged, and
+    otherwise reads just the appended bytes (or everything after a rewrite). The JSON
+    of the full table is serialized once per version, format and encoding.
+
+    A row appended for a Run that is already in the table (the result writer appends
+    updated records again) replaces the earlier row in place; such a change is a reset
+    for the clients. Tables without a Run column keep every row.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.columns = []
+        self.rows = []
+        self.line_ends = []    # byte offset after every line read, None if unknown
+        self.line_counts = []  # number of rows after every line read
+        self.replaced_at = 0   # byte offset after the last line that replaced a row
+        self.index = {}        # Run -> position in rows
+        self.header_end = 0
+        self.version = None
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self._stat_key = None
+        self._payloads = {}  # (format, encoding) -> body of the full table
+        self._payloads_etag = None
+        self._columnar = None
+
+    def refresh(self):
+        """Read what was appended since the last refresh; returns the change or None."""
+        with self.lock:
+            try:
+                stat = os.stat(self.csv_path)
+            except FileNotFoundError:
+                return None
+            stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stat_key == self._stat_key:
+                return None
+            change, self.header_end, line_ends = _read_csv_since(self.csv_path, self.cursor, self.version)
+            self._stat_key = stat_key
+            if not change['reset'] and not change['rows']:
+                return None
+            if change['reset']:
+                self.rows, self.line_ends, self.line_counts, self.replaced_at, self.index = [], [], [], 0, {}
+            if line_ends is None:
+                self.line_ends = None
+            columns = change['columns']
+            run_column = 'Run' if 'Run' in columns else None  # tables without runs keep every row
+            replaced = False
+            for i, row in enumerate(change['rows']):
+                run = row.get(run_column) if run_column else None
+                if run and run in self.index:
+                    self.rows[self.index[run]] = row
+                    replaced = True
+                    self.replaced_at = line_ends[i] if line_ends is not None else change['cursor']
+                else:
+                    if run:
+                        self.index[run] = len(self.rows)
+                    self.rows.append(row)
+                if self.line_ends is not None:
+                    self.line_ends.append(line_ends[i])
+                    self.line_counts.append(len(self.rows))
+            if change['reset'] or replaced:
+                change.update(reset=True, rows=list(self.rows))
+            self.columns = columns
+            self.version, self.cursor = change['version'], change['cursor']
+            self._payloads = {}
+            change['total'] = len(self.rows)
+            return change
+
+    def snapshot(self):
+        with self.lock:
+            return {'version': self.version, 'cursor': self.cursor, 'reset': True,
+                    'columns': self.columns, 'rows': list(self.rows), 'total': len(self.rows)}
+
+    def rows_since(self, since, version):
+        """Rows after the byte offset `since`, or the whole table (reset) if it is not a row
+        boundary or rows before it were replaced since."""
+        with self.lock:
+            if version == self.version and self.line_ends is not None and since >= self.replaced_at:
+                if since == self.header_end:
+                    start = 0
+                else:
+                    i = bisect.bisect_left(self.line_ends, since)
+                    start = self.line_counts[i] if i < len(self.line_ends) and self.line_ends[i] == since else None
+                if start is not None:
+                    return {'version': self.version, 'cursor': self.cursor, 'reset': False,
+                            'columns': self.columns, 'rows': self.rows[start:], 'total': len(self.rows)}
+        return self.snapshot()
+
+    def page(self, offset, limit, cols=None):
+        """Rows offset..offset+limit, projected on the columns in cols (all if empty)."""
+        with self.lock:
+            columns = [c for c in cols if c in self.columns] if cols else self.columns
+            rows = self.rows[offset:offset + limit]
+            if cols:
+                rows = [{c: row.get(c, "") for c in columns} for row in rows]
+            return {'version': self.version, 'cursor': self.cursor, 'total': len(self.rows),
+                    'offset': offset, 'columns': columns, 'rows': rows}
+
+    def rows_json(self, fmt='records', encoding=None):
+        """(JSON of all rows, ETag) of the current version in the format, compressed with the encoding.
+
+        The records format is the bare list of rows, the columnar one the snapshot
+        payload with the rows as column arrays (see to_columnar).
+        """
+        with self.lock:
+            etag = f"{self.version}-{self.cursor}"
+            if self._payloads_etag != etag:
+                self._payloads, self._payloads_etag = {}, etag
+            key = (fmt, encoding)
+            if key not in self._payloads:
+                if fmt == 'columnar':
+                    payload = to_columnar({'version': self.version, 'cursor': self.cursor, 'total': len(self.rows),
+                                           'columns': self.columns, 'rows': self.rows})
+                else:
+                    payload = self.rows
+                self._payloads[key] = compress(_encode_json(payload), encoding)
+            # every representation has its own tag
+            return self._payloads[key], f"{etag}-{fmt}-{encoding or 'identity'}"
+
+    def columnar(self):
+        """Typed ColumnarTable of the current version, built once per version."""
+        with self.lock:
+            etag = f"{self.version}-{self.cursor}"
+            if self._columnar is None or self._columnar[1] != etag:
+                self._columnar = (ColumnarTable(self.columns, self.rows), etag)
+            return self._columnar[0]
+
+
+def _parquet_files(path):
+    """Data files of a Parquet file or dataset directory, without hidden (in-progress) files."""
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for folder, folders, names in os.walk(path):
+        folders[:] = sorted(name for name in folders if not name.startswith(('.', '_')))
+        files.extend(os.path.join(folder, name) for name in sorted(names)
+                     if name.endswith('.parquet') and not name.startswith(('.', '_')))
+    return files
+
+
+def _cell(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+class ParquetTable(LiveTable):
+    """LiveTable of a Parquet file or dataset (e.g. the one written by ResultSink).
+
+    A refresh reads only the data files added since the previous one and merges their
+    records by run: records of a run written again later (refinement back-fill) replace
+    the earlier ones. A change that only adds runs is an append, otherwise a reset. A
+    changed or removed file, or a new one sorting before files already read, makes the
+    whole dataset be read again.
+    """
+
+    def __init__(self, csv_path):
+        super().__init__(csv_path)
+        self.line_ends = None
+        self._files = {}  # data file already read -> (mtime_ns, size)
+
+    def refresh(self):
+        with self.lock:
+            try:
+                stats = {}
+                for name in _parquet_files(self.csv_path):
+                    stat = os.stat(name)
+                    stats[name] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                return None  # a file was renamed meanwhile, read on the next refresh
+            if not stats or stats == self._files:
+                return None
+            files = list(stats)
+            read = list(self._files)
+            reset = not read or files[:len(read)] != read or any(stats[name] != self._files[name] for name in read)
+            table = self._read(files if reset else files[len(read):])
+            columns = table.column_names
+            if not reset and columns != self.columns:
+                reset = True
+                table = self._read(files)
+            if reset:
+                self.rows, self.index = [], {}
+                self.version = f"pq{zlib.crc32(repr(sorted(stats.items())).encode()):08x}"
+            key = 'run' if 'run' in columns else None  # datasets without runs keep every record
+            added = len(self.rows)
+            for record in table.to_pylist():
+                row = {name: _cell(record[name]) for name in columns}
+                run = record[key] if key else None
+                if run is not None and run in self.index:
+                    self.rows[self.index[run]] = row  # the last record of a run wins
+                    reset = reset or self.index[run] < added
+                else:
+                    if run is not None:
+                        self.index[run] = len(self.rows)
+                    self.rows.append(row)
+            self._files = stats
+            self.columns = columns
+            self.header_end = 0
+            self.cursor = len(self.rows)
+            self._payloads = {}
+            return {'version': self.version, 'cursor': self.cursor, 'reset': reset, 'columns': self.columns,
+                    'rows': list(self.rows) if reset else self.rows[added:], 'total': len(self.rows)}
+
+    def _read(self, files):
+        if os.path.isfile(self.csv_path):
+            return pq.read_table(self.csv_path)
+        # the date= partition column comes from the folder names below the dataset root
+        return ds.dataset(files, format='parquet', partitioning='hive',
+                          partition_base_dir=self.csv_path).to_table()
+
+
+def is_parquet(path):
+    return path.endswith('.parquet') or os.path.isdir(path)
+
+
+class CsvWatcher:
+    """One background thread watching all served files and pushing changes to subscribers.
+
+    Tables are refreshed outside the watcher lock, each under its own lock so that a
+    change is handed to the subscribers before another refresh or subscription of the
+    same table; requests refresh through `refresh` so no change is lost for the streams.
+    """
+
+    def __init__(self, interval=WATCH_INTERVAL):
+        self.interval = interval
+        self._tables = {}       # csv path -> LiveTable
+        self._subscribers = {}  # csv path -> list of queues
+        self._checks = {}       # csv path -> lock held while refreshing and notifying
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def table(self, csv_path):
+        with self._lock:
+            if csv_path not in self._tables:
+                self._tables[csv_path] = (ParquetTable if is_parquet(csv_path) else LiveTable)(csv_path)
+                self._subscribers[csv_path] = []
+                self._checks[csv_path] = threading.Lock()
+            return self._tables[csv_path]
+
+    def refresh(self, csv_path):
+        """Refresh the table and send its change to the subscribers; returns the table."""
+        table = self.table(csv_path)
+        with self._checks[csv_path]:
+            self._notify(csv_path, table.refresh())
+        return table
+
+    def subscribe(self, csv_path):
+        """Return (queue of change events, snapshot of the table) for a new client."""
+        table = self.table(csv_path)
+        events = queue.Queue()
+        with self._checks[csv_path]:
+            self._check(csv_path)  # deliver pending rows to the others before the snapshot
+            with self._lock:
+                self._subscribers[csv_path].append(events)
+            snapshot = table.snapshot()
+        self.start()
+        return events, snapshot
+
+    def start(self):
+        """Start the watcher thread if it is not running."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='csv-watcher', daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, csv_path, events):
+        with self._lock:
+            if events in self._subscribers.get(csv_path, []):
+                self._subscribers[csv_path].remove(events)
+
+    def _notify(self, csv_path, change):
+        if change is None:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers[csv_path])
+        for events in subscribers:
+            events.put(change)
+
+    def _check(self, csv_path):
+        try:
+            self._notify(csv_path, self._tables[csv_path].refresh())
+        except (csv.Error, OSError, UnicodeDecodeError, ValueError) as e:
+            print(f"[WARNING] Failed to read {csv_path}: {e}")
+
+    def _run(self):
+        while True:
+            # files of new campaigns are watched as soon as they appear
+            for csv_path in campaigns.discover().values():
+                self.table(csv_path)
+            with self._lock:
+                checks = list(self._checks.items())
+            for csv_path, lock in checks:
+                with lock:
+                    self._check(csv_path)
+            time.sleep(self.interval)
+
+
+class Campaigns:
+    """Result files served as campaigns: CSV files and Parquet files or datasets.
+
+    `source` is a directory, whose result files and dataset folders are taken, or a
+    glob pattern. The source is scanned at most every CAMPAIGN_SCAN_INTERVAL seconds.
+    Campaigns are named after their file without the .csv extension.
+    """
+
+    def __init__(self, source="", interval=CAMPAIGN_SCAN_INTERVAL):
+        self.source = source
+        self.interval = interval
+        self._found = {}
+        self._scanned = (None, 0)  # (source, time) of the last scan
+        self._lock = threading.Lock()
+
+    def discover(self):
+        """Return {campaign name: path}, scanning the source if the last scan is too old."""
+        with self._lock:
+            if not self.source:
+                return {}
+            if self._scanned[0] == self.source and time.monotonic() - self._scanned[1] < self.interval:
+                return self._found
+            if os.path.isdir(self.source) and not _is_dataset(self.source):
+                paths = glob.glob(os.path.join(self.source, '*'))
+            else:
+                paths = glob.glob(self.source)
+            found = {}
+            for path in sorted(paths):
+                if not (path.endswith('.csv') and os.path.isfile(path)) and not (
+                        pq is not None and (path.endswith('.parquet') or os.path.isdir(path) and _is_dataset(path))):
+                    continue
+                name = os.path.basename(path)
+                name = name[:-len('.csv')] if name.endswith('.csv') else name
+                found[name if name not in found else os.path.basename(path)] = path
+            self._found = found
+            self._scanned = (self.source, time.monotonic())
+            return found
+
+    def path(self, name):
+        return self.discover().get(name)
+
+
+def _is_dataset(folder):
+    """The folder holds Parquet files or date= partitions of them."""
+    try:
+        return any(name.endswith('.parquet') or name.startswith('date=') for name in os.listdir(folder))
+    except OSError:
+        return False
+
+
+campaigns = Campaigns()
+watcher = CsvWatcher()
+
+
+def table_path():
+    """Path of the table of the request: ?campaign=<name>, or the single served file."""
+    name = request.args.get('campaign')
+    if not name:
+        return CSV_PATH
+    path = campaigns.path(name)
+    if path is None:
+        abort(Response(json.dumps({'error': f"Unknown campaign '{name}'"}), 404, mimetype='application/json'))
+    return path
+
+
+# (label, aggregate, column in the CSV table, column in the Parquet dataset)
+SUMMARY_METRICS = (
+    ('Best CC1/2', 'max', 'CC1/2', 'overall_CC'),
+    ('Best run', 'argmax', 'CC1/2', 'overall_CC'),
+    ('Best CC*', 'max', 'CC*', 'overall_CCstar'),
+    ('Lowest Rsplit(%)', 'min', 'Rsplit(%)', 'overall_Rsplit'),
+    ('Best resolution SNR=1', 'min', 'Resolution SNR=1', 'd_snr_one'),
+)
+
+
+def summary_row(name, table):
+    """One summary row of a campaign table: number of runs and the best values."""
+    columnar = table.columnar()
+    indices = list(range(columnar.size))
+    row = {'Campaign': name, 'Runs': columnar.size}
+    for label, function, *candidates in SUMMARY_METRICS:
+        column = next((c for c in candidates if c in columnar.numbers), None)
+        row[label] = columnar.aggregate(function, column, indices) if column else None
+    row['Updated'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_modified(table.csv_path)))
+    return row
+
+
+def last_modified(path):
+    """Latest modification time of the file, or of the data files of a Parquet dataset."""
+    paths = _parquet_files(path) if is_parquet(path) else [path]
+    return max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=0)
+
+
+@app.route('/campaigns')
+def campaign_list():
+    """Served campaigns with their number of rows; empty when a single file is served."""
+    result = []
+    for name, path in campaigns.discover().items():
+        table = watcher.table(path)
+        result.append({'name': name, 'kind': 'parquet' if is_parquet(path) else 'csv',
+                       'total': len(table.rows), 'version': table.version})
+    return jsonify({'campaigns': result})
+
+
+@app.route('/summary')
+def summary():
+    """One row per campaign with the best values, and a last row over all campaigns."""
+    rows = []
+    for name, path in campaigns.discover().items():
+        table = watcher.table(path)
+        try:
+            watcher.refresh(path)
+        except (csv.Error, OSError, UnicodeDecodeError, ValueError) as e:
+            print(f"[WARNING] Failed to read {path}: {e}")
+        rows.append(summary_row(name, table))
+
+    if rows:
+        total = {'Campaign': 'All campaigns', 'Runs': sum(row['Runs'] for row in rows)}
+        for label, function, *_ in SUMMARY_METRICS:
+            values = [row[label] for row in rows if row[label] is not None]
+            if function == 'max':
+                total[label] = max(values, default=None)
+            elif function == 'min':
+                total[label] = min(values, default=None)
+        # the best run overall is the best run of the campaign with the best CC1/2
+        best = [row for row in rows if row['Best CC1/2'] is not None]
+        total['Best run'] = max(best, key=lambda row: row['Best CC1/2'])['Best run'] if best else None
+        total['Updated'] = max(row['Updated'] for row in rows)
+        rows.append(total)
+    columns = ['Campaign', 'Runs'] + [label for label, *_ in SUMMARY_METRICS] + ['Updated']
+    return jsonify({'columns': columns, 'rows': [{c: _cell(row[c]) for c in columns} for row in rows]})
+
+
+# === Query engine ===
+NUMBER = re.compile(r'^\s*([-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)')
+# Groups derived from run names, e.g. xg-new_FAKP_F2X_chipH_grid_fly_009_window_10_offset_0_0
+RUN_TOKENS = {
+    'chip': re.compile(r'chip_?([A-Za-z0-9]+?)(?=_|$)'),
+    'window': re.compile(r'window_?(\d+)'),
+    'fly': re.compile(r'fly_?(\d+)'),
+    'offset': re.compile(r'offset_([\d_]+)$'),
+}
+OPERATORS = ('<=', '>=', '!=', '=', '<', '>', '~')
+AGGREGATES = ('count', 'min', 'max', 'mean', 'median', 'sum', 'argmin', 'argmax')
+
+
+def _number(value):
+    """Leading number of a cell, e.g. 15.34 for '15.34 (93.45)'; None if there is none."""
+    m = NUMBER.match(value) if value else None
+    return float(m.group(1)) if m else None
+
+
+class ColumnarTable:
+    """Column-oriented copy of the rows with a numeric view of every numeric column.
+
+    A column is numeric when every non-empty cell starts with a number; for cells like
+    '15.34 (93.45)' (overall and outer shell) the overall value is used.
+    """
+
+    def __init__(self, columns, rows):
+        self.names = list(columns)
+        self.size = len(rows)
+        self.text = {name: [row.get(name, "") for row in rows] for name in self.names}
+        self.numbers = {}
+        for name, values in self.text.items():
+            numbers = [_number(value) for value in values]
+            if any(value for value in values) and all(
+                    number is not None for number, value in zip(numbers, values) if value):
+                self.numbers[name] = numbers
+        self.run_column = 'Run' if 'Run' in self.text else (self.names[0] if self.names else None)
+
+    def column_prefix(self, expression):
+        """Longest column name the expression starts with (names may contain operators)."""
+        names = [name for name in self.names if expression.startswith(name)]
+        if not names:
+            raise ValueError(f"Unknown column in '{expression}'")
+        return max(names, key=len)
+
+    def key_values(self, key):
+        """Values of a column, or of a token parsed from the run names (chip, window, ...)."""
+        if key in self.text:
+            return self.text[key]
+        if key in RUN_TOKENS and self.run_column:
+            matches = (RUN_TOKENS[key].search(run) for run in self.text[self.run_column])
+            return [m.group(1) if m else "" for m in matches]
+        raise ValueError(f"Unknown column or run token '{key}'")
+
+    def filter(self, expression, indices):
+        name = self.column_prefix(expression)
+        rest = expression[len(name):]
+        op = next((op for op in OPERATORS if rest.startswith(op)), None)
+        if op is None:
+            raise ValueError(f"Expected one of {' '.join(OPERATORS)} after '{name}'")
+        target = rest[len(op):]
+        if op == '~':
+            values = self.text[name]
+            return [i for i in indices if target in values[i]]
+        number = _number(target)
+        if name in self.numbers and number is not None:
+            values, target = self.numbers[name], number
+            indices = [i for i in indices if values[i] is not None]
+        else:
+            values = self.text[name]
+        compare = {
+            '<=': lambda a: a <= target, '>=': lambda a: a >= target,
+            '!=': lambda a: a != target, '=': lambda a: a == target,
+            '<': lambda a: a < target, '>': lambda a: a > target,
+        }[op]
+        return [i for i in indices if compare(values[i])]
+
+    def sort(self, keys, indices):
+        for key in reversed(keys):
+            descending = key.startswith('-')
+            name = key.lstrip('-+')
+            if name not in self.text:
+                raise ValueError(f"Unknown column '{name}'")
+            if name in self.numbers:
+                values = self.numbers[name]
+                # rows without a value go last in both directions
+                present = sorted((i for i in indices if values[i] is not None),
+                                 key=lambda i: values[i], reverse=descending)
+                indices = present + [i for i in indices if values[i] is None]
+            else:
+                values = self.text[name]
+                indices = sorted(indices, key=lambda i: values[i], reverse=descending)
+        return indices
+
+    def aggregate(self, function, name, indices):
+        if function == 'count':
+            return len(indices)
+        if name not in self.numbers:
+            raise ValueError(f"Column '{name}' is not numeric")
+        values = self.numbers[name]
+        present = [i for i in indices if values[i] is not None]
+        if not present:
+            return None
+        if function in ('argmin', 'argmax'):
+            best = (min if function == 'argmin' else max)(present, key=lambda i: values[i])
+            return self.text[self.run_column][best]
+        numbers = sorted(values[i] for i in present)
+        if function == 'min':
+            return numbers[0]
+        if function == 'max':
+            return numbers[-1]
+        if function == 'sum':
+            return sum(numbers)
+        if function == 'mean':
+            return sum(numbers) / len(numbers)
+        middle = len(numbers) // 2
+        return numbers[middle] if len(numbers) % 2 else (numbers[middle - 1] + numbers[middle]) / 2
+
+
+def _parse_aggregates(specs):
+    aggregates = []
+    for spec in specs:
+        function, _, name = spec.partition(':')
+        if function not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{function}', expected one of {', '.join(AGGREGATES)}")
+        if function != 'count' and not name:
+            raise ValueError(f"Aggregate '{function}' needs a column, e.g. {function}:CC1/2")
+        aggregates.append((function, name))
+    return aggregates or [('count', '')]
+
+
+def run_query(table, filters=(), sort=(), group=None, aggregates=(), cols=(), offset=0, limit=None):
+    """
+    Filter, sort, group and aggregate a ColumnarTable.
+
+    Args:
+        table (ColumnarTable): Table to query.
+        filters (list of str): Conditions like 'Rsplit(%)<20' or 'Run~chipH' (substring).
+        sort (list of str): Columns to sort by, '-' in front for descending.
+        group (str): Column or run token (chip, window, fly, offset) to group by.
+        aggregates (list of str): 'count', or 'min|max|mean|median|sum|argmin|argmax:<column>'.
+        cols (list of str): Columns to return (ungrouped queries), all if empty.
+        offset, limit (int): Slice of the result rows.
+    Returns:
+        dict: {'total': number of result rows, 'columns', 'rows'}
+    """
+    indices = list(range(table.size))
+    for expression in filters:
+        indices = table.filter(expression, indices)
+
+    if group:
+        keys = table.key_values(group)
+        groups = {}
+        for i in indices:
+            groups.setdefault(keys[i], []).append(i)
+        aggregates = _parse_aggregates(aggregates)
+        columns = [group] + [f"{function}:{name}" if name else function for function, name in aggregates]
+        rows = [
+            dict(zip(columns, [key] + [table.aggregate(function, name, members) for function, name in aggregates]))
+            for key, members in groups.items()
+        ]
+        for key in reversed(list(sort)):
+            name = key.lstrip('-+')
+            if name not in columns:
+                raise ValueError(f"Unknown column '{name}'")
+            rows.sort(key=lambda row: (row[name] is None, row[name] if row[name] is not None else 0),
+                      reverse=key.startswith('-'))
+    else:
+        indices = table.sort(list(sort), indices)
+        columns = [name for name in cols if name in table.text] if cols else table.names
+        rows = [{name: table.text[name][i] for name in columns} for i in indices]
+
+    total = len(rows)
+    rows = rows[offset:offset + limit] if limit is not None else rows[offset:]
+    return {'total': total, 'columns': columns, 'rows': rows}
+
+
+@app.route('/query')
+def query():
+    """
+    Filter, sort and aggregate the table on the server, e.g.
+    /query?filter=Rsplit(%)<20&sort=-CC1/2 or /query?group=chip&agg=max:CC1/2&agg=argmax:CC1/2
+    """
+    table = watcher.refresh(table_path())
+    try:
+        result = run_query(
+            table.columnar(),
+            filters=request.args.getlist('filter'),
+            sort=[key for value in request.args.getlist('sort') for key in value.split(',') if key],
+            group=request.args.get('group'),
+            aggregates=[a for value in request.args.getlist('agg') for a in value.split(',') if a],
+            cols=[c for c in request.args.get('cols', '').split(',') if c],
+            offset=max(0, request.args.get('offset', 0, type=int)),
+            limit=request.args.get('limit', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result['version'] = table.version
+    return jsonify(result)
+
+
+def _read_dat_columns(dat_file):
+    """First two numeric columns of a CrystFEL shell file: 1/d (shell centre, 1/nm) and the value."""
+    x, y = [], []
+    with open(dat_file) as f:
+        for line in f:
+            parts = line.split()
+            try:
+                x_value, y_value = float(parts[0]), float(parts[1])
+            except (IndexError, ValueError):
+                continue  # header
+            x.append(x_value)
+            y.append(y_value)
+    return x, y
+
+
+def _upper_limit(values):
+    # the limits many_plots-upt-v2.py used: percentages up to 110, fractions up to 1.1
+    upper = max(values, default=0.)
+    return 110. if upper > 100. else 1.1 if upper < 1. else upper
+
+
+@lru_cache(maxsize=PLOT_CACHE_SIZE)
+def _render_shell_plot(CCstar_dat_file, CCstar_key, Rsplit_dat_file, Rsplit_key, fmt, title):
+    figure = Figure()
+    ax = figure.subplots()
+    ax2 = ax.twinx()
+    x, y = _read_dat_columns(CCstar_dat_file)
+    ax.plot(x, y, marker='.', color='b', label='CC*')
+    x2, y2 = _read_dat_columns(Rsplit_dat_file)
+    ax2.plot(x2, y2, marker='.', color='r', label='Rsplit')
+    ax.set_xlabel('1/d 1/nm')
+    ax.set_ylabel('CC*')
+    ax2.set_ylabel('Rsplit/%')
+    ax.set_ylim(min([0.] + y), _upper_limit(y))
+    ax2.set_ylim(min([0.] + y2), _upper_limit(y2))
+    ax.set_title(title)
+    figure.legend(loc='center left', bbox_to_anchor=(0.12, 0.5))
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def render_shell_plot(output_base, fmt='png'):
+    """
+    Plot CC* and Rsplit over 1/d from `{output_base}_CCstar.dat` and `{output_base}_Rsplit.dat`.
+
+    Plots are rendered once per (path, mtime, size) of both files and format; the
+    statistics jobs do not render them anymore.
+
+    Returns:
+        tuple: (image bytes, ETag)
+    """
+    files = (f"{output_base}_CCstar.dat", f"{output_base}_Rsplit.dat")
+    keys = []
+    for dat_file in files:
+        stat = os.stat(dat_file)
+        keys.append((stat.st_mtime_ns, stat.st_size))
+    body = _render_shell_plot(files[0], keys[0], files[1], keys[1], fmt, os.path.basename(output_base))
+    return body, f"{zlib.crc32(repr((files, keys, fmt)).encode()):08x}"
+
+
+@app.route('/plot')
+def plot():
+    """CC*/Rsplit plot of a run: /plot?run=<Run>[&campaign=<name>][&format=png|svg].
+
+    Only shell files recorded in the served table (column 'Shell files') are read.
+    """
+    fmt = request.args.get('format', 'png')
+    if fmt not in PLOT_FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}', expected one of {', '.join(PLOT_FORMATS)}"}), 400
+    if Figure is None:
+        return jsonify({'error': 'matplotlib is not installed'}), 501
+    run = request.args.get('run', '')
+    table = watcher.refresh(table_path())
+    with table.lock:
+        run_column = 'Run' if 'Run' in table.columns else (table.columns[0] if table.columns else None)
+        column = next((c for c in SHELL_FILES_COLUMNS if c in table.columns), None)
+        output_base = next((row.get(column) for row in reversed(table.rows)
+                            if column and row.get(run_column) == run), None)
+    if not output_base:
+        return jsonify({'error': f"No shell files recorded for run '{run}'"}), 404
+    try:
+        body, etag = render_shell_plot(output_base, fmt)
+    except OSError as e:
+        return jsonify({'error': str(e)}), 404
+    response = Response(body, mimetype=PLOT_FORMATS[fmt])
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # revalidate, the plot changes with the shell files
+    return response.make_conditional(request)
+
+
+def metrics_path(csv_path):
+    """State file published by main.py for the results table csv_path (see PipelineMetrics)."""
+    return os.path.splitext(csv_path)[0] + METRICS_SUFFIX
+
+
+def read_pipeline_state(csv_path):
+    try:
+        with open(metrics_path(csv_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _campaign_tables():
+    """(campaign name, table path) of every served table."""
+    found = campaigns.discover()
+    if found:
+        return list(found.items())
+    return [(os.path.splitext(os.path.basename(CSV_PATH))[0], CSV_PATH)] if CSV_PATH else []
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+def _histogram_samples(name, histogram, **labels):
+    samples = [(f"{name}_bucket", {**labels, 'le': f"{bound:g}"}, count)
+               for bound, count in zip(histogram['buckets'], histogram['counts'])]
+    samples.append((f"{name}_bucket", {**labels, 'le': '+Inf'}, histogram['count']))
+    samples.append((f"{name}_sum", labels, histogram['sum']))
+    samples.append((f"{name}_count", labels, histogram['count']))
+    return samples
+
+
+def render_prometheus(metrics):
+    """Prometheus text exposition of the /metrics JSON, one family per metric over all campaigns."""
+    families = {
+        'pipeline_runs': ('gauge', 'Runs of the campaign by state', []),
+        'pipeline_queue_wait_seconds': ('histogram', 'Time statistics jobs waited in the SLURM queue', []),
+        'pipeline_run_seconds': ('histogram', 'Run time of the statistics jobs', []),
+        'pipeline_stage_seconds': ('histogram', 'Latency of the pipeline stages', []),
+        'pipeline_stream_bytes_total': ('counter', 'Bytes of stream files parsed', []),
+        'pipeline_stream_parse_seconds_total': ('counter', 'Time spent parsing stream files', []),
+        'pipeline_stream_bytes_per_second': ('gauge', 'Stream parsing throughput', []),
+        'pipeline_state_age_seconds': ('gauge', 'Seconds since the pipeline published its state', []),
+        'viewer_table_rows': ('gauge', 'Rows in the served results table', []),
+    }
+    now = time.time()
+    for name, campaign in metrics['campaigns'].items():
+        families['viewer_table_rows'][2].append(('viewer_table_rows', {'campaign': name}, campaign['rows']))
+        state = campaign['state']
+        if state is None:
+            continue
+        for run_state, count in state['runs'].items():
+            families['pipeline_runs'][2].append(('pipeline_runs', {'campaign': name, 'state': run_state}, count))
+        for family in ('queue_wait_seconds', 'run_seconds'):
+            families[f'pipeline_{family}'][2].extend(
+                _histogram_samples(f'pipeline_{family}', state[family], campaign=name))
+        for stage, histogram in state['stage_seconds'].items():
+            families['pipeline_stage_seconds'][2].extend(
+                _histogram_samples('pipeline_stage_seconds', histogram, campaign=name, stage=stage))
+        stream = state['stream']
+        families['pipeline_stream_bytes_total'][2].append(('pipeline_stream_bytes_total', {'campaign': name}, stream['bytes']))
+        families['pipeline_stream_parse_seconds_total'][2].append(
+            ('pipeline_stream_parse_seconds_total', {'campaign': name}, stream['seconds']))
+        families['pipeline_stream_bytes_per_second'][2].append(
+            ('pipeline_stream_bytes_per_second', {'campaign': name}, stream['bytes_per_second']))
+        families['pipeline_state_age_seconds'][2].append(
+            ('pipeline_state_age_seconds', {'campaign': name}, max(0., now - state['updated'])))
+
+    lines = []
+    for family, (kind, description, samples) in families.items():
+        if not samples:
+            continue
+        lines.append(f"# HELP {family} {description}.")
+        lines.append(f"# TYPE {family} {kind}")
+        lines.extend(f"{name}{{{_labels(**labels)}}} {value:g}" for name, labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+@app.route('/metrics')
+def metrics():
+    """Progress of the campaigns: Prometheus text format, or JSON with ?format=json.
+
+    The pipeline state comes from the file main.py publishes next to each results
+    table (`<table>_metrics.json`); campaigns without one only report their rows.
+    """
+    result = {'campaigns': {}}
+    for name, path in _campaign_tables():
+        table = watcher.table(path)
+        try:
+            watcher.refresh(path)
+        except (csv.Error, OSError, UnicodeDecodeError, ValueError) as e:
+            print(f"[WARNING] Failed to read {path}: {e}")
+        result['campaigns'][name] = {
+            'rows': len(table.rows),
+            'state': None if is_parquet(path) else read_pipeline_state(path)
+        }
+    fmt = request.args.get('format') or request.accept_mimetypes.best_match(
+        ['text/plain', 'application/json'], default='text/plain').split('/')[-1]
+    if fmt == 'json':
+        return jsonify(result)
+    return Response(render_prometheus(result), content_type='text/plain; version=0.0.4')
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/stream')
+def stream():
+    """Server-Sent Events: a 'reset' event with the table, then an event per change.
+
+    With ?rows=0 the reset events only carry the columns and the number of rows, for
+    clients that fetch rows page by page.
+    """
+    csv_path = table_path()
+    with_rows = request.args.get('rows', '1') != '0'
+    events, snapshot = watcher.subscribe(csv_path)
+
+    def generate():
+        try:
+            yield _sse('reset', snapshot if with_rows else dict(snapshot, rows=[]))
+            while True:
+                try:
+                    change = events.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if change['reset']:
+                    yield _sse('reset', change if with_rows else dict(change, rows=[]))
+                else:
+                    yield _sse('append', change)
+        finally:
+            watcher.unsubscribe(csv_path, events)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 def wait_for_file(csv_path, timeout_hours=6, check_interval=2):
     timeout_seconds = timeout_hours * 3600
@@ -149,12 +1342,21 @@ def wait_for_file(csv_path, timeout_hours=6, check_interval=2):
 def main():
     global CSV_PATH
     parser = argparse.ArgumentParser(description="Live CSV Table Viewer")
-    parser.add_argument('--csv', required=True, help='Path to the CSV file to monitor')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help='Path to the CSV file to monitor')
+    source.add_argument('--campaigns', help='Directory or glob of result CSV files and Parquet datasets '
+                                            'to serve as campaigns, each in its own tab')
     parser.add_argument('--port', type=int, default=5000, help='Port to serve on (default: 5000)')
     args = parser.parse_args()
 
+    if args.campaigns:
+        campaigns.source = args.campaigns
+        watcher.start()
+        print(f"Serving live view of the campaigns in '{args.campaigns}' at http://localhost:{args.port}")
+        app.run(debug=False, use_reloader=False, port=args.port)
+        return
+
     CSV_PATH = args.csv
-    print(157)
     wait_for_file(csv_path=CSV_PATH)
 
     print(f"Serving live view of '{CSV_PATH}' at http://localhost:{args.port}")
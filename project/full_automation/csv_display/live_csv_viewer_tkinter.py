@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 
+import io
 import os
+import csv
 import sys
+import zlib
 import subprocess
 import time
 import argparse
 import tkinter as tk
 from tkinter import ttk
-import pandas as pd
 
 REFRESH_INTERVAL_MS = 3000  # Refresh every 3 seconds
 
@@ -15,7 +17,11 @@ class CSVViewerApp:
     def __init__(self, root, csv_path):
         self.root = root
         self.csv_path = csv_path
-        self.dataframe = pd.DataFrame()
+        self.columns = []
+        self.key_index = 0
+        self.items = {}  # Run -> (Treeview item, values)
+        self.offset = 0  # byte offset after the last complete line read
+        self.version = None  # (inode, header checksum) of the file the offset belongs to
 
         self.setup_ui()
         self.wait_for_file()  # Check for the file before proceeding
@@ -58,44 +64,84 @@ class CSVViewerApp:
             time.sleep(check_interval)  # Wait for check_interval seconds
 
         print(f"[INFO] File found: {self.csv_path}")
-        self.load_and_display_csv()  # Load the file once it is found
-
-    def load_and_display_csv(self):
-        # Try to load the CSV file
+        self.refresh()  # Load the file once it is found
+
+    def read_new_rows(self):
+        """
+        Read the rows appended since the last call.
+
+        The file is read from the byte offset after the last complete line. If it was
+        replaced (new inode, e.g. the atomic rewrite of the result writer), truncated or
+        got a new header, it is read again from the first row and reset is True.
+
+        Returns:
+            tuple: (reset, columns, rows) with rows as lists of strings, or None if the
+            header is not complete yet.
+        """
+        with open(self.csv_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            header_line = f.readline()
+            if not header_line.endswith(b"\n"):
+                return None
+            header_end = f.tell()
+            version = (stat.st_ino, zlib.crc32(header_line))
+            reset = version != self.version or not header_end <= self.offset <= stat.st_size
+            f.seek(header_end if reset else self.offset)
+            chunk = f.read(stat.st_size - f.tell())
+
+        chunk = chunk[:chunk.rfind(b"\n") + 1]  # complete lines only
+        self.version = version
+        self.offset = (header_end if reset else self.offset) + len(chunk)
+        columns = next(csv.reader([header_line.decode("utf-8")], delimiter=';'), [])
+        rows = list(csv.reader(io.StringIO(chunk.decode("utf-8")), delimiter=';'))
+        return reset, columns, rows
+
+    def refresh(self):
+        # Apply the rows appended or changed since the last refresh to the table
         try:
-            df = pd.read_csv(self.csv_path, delimiter=';')
-            self.dataframe = df
-        except Exception as e:
+            changes = self.read_new_rows()
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
             print(f"[ERROR] Failed to load CSV: {e}")
-            self.dataframe = pd.DataFrame()  # Empty DataFrame on error
-
-        self.update_table()
-
-    def update_table(self):
-        # Update the table with the new DataFrame
-        df_to_display = self.dataframe
-
-        self.tree.delete(*self.tree.get_children())  # Clear existing rows
-        self.tree["columns"] = []  # Reset the columns
-
-        if df_to_display.empty:
             return
-
-        # Set new columns based on the DataFrame
-        columns = list(df_to_display.columns)
+        if changes is None:
+            return
+        reset, columns, rows = changes
+
+        if columns != self.columns:
+            self.rebuild_columns(columns)
+        seen = set()
+        for values in rows:
+            values = (values + [""] * len(self.columns))[:len(self.columns)]
+            key = values[self.key_index] if self.columns else None
+            seen.add(key)
+            if key in self.items:
+                item, old_values = self.items[key]
+                if values != old_values:
+                    self.tree.item(item, values=values)
+                    self.items[key] = (item, values)
+            else:
+                self.items[key] = (self.tree.insert("", "end", values=values), values)
+
+        if reset:
+            # the file was rewritten, rows that are gone from it are removed
+            for key in [key for key in self.items if key not in seen]:
+                self.tree.delete(self.items.pop(key)[0])
+
+    def rebuild_columns(self, columns):
+        # Set new columns based on the header; existing rows are dropped and read again
+        self.tree.delete(*self.tree.get_children())
+        self.items = {}
+        self.columns = columns
+        self.key_index = columns.index("Run") if "Run" in columns else 0
         self.tree["columns"] = columns
 
         for col in columns:
             self.tree.heading(col, text=col)  # Set column headers
             self.tree.column(col, width=250, anchor="w")  # Set column widths
 
-        # Insert new rows
-        for _, row in df_to_display.iterrows():
-            self.tree.insert("", "end", values=list(row))
-
     def schedule_refresh(self):
         # Refresh data every REFRESH_INTERVAL_MS milliseconds
-        self.load_and_display_csv()
+        self.refresh()
         self.root.after(REFRESH_INTERVAL_MS, self.schedule_refresh)
 
 
@@ -6,9 +6,11 @@ import requests
 import os
 import sys
 import multiprocessing
+import json
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from life_csv_web_viewer import app, wait_for_file  # replace 'your_script' with your actual filename (no .py)
+import life_csv_web_viewer as viewer
 
 # Enable test mode
 app.config["TESTING"] = True
@@ -66,3 +68,298 @@ def test_flask_csv_viewer(temp_csv_file):
     finally:
         proc.terminate()
         proc.join()
+
+
+# --- In-process tests through the Flask test client ---
+
+
+@pytest.fixture
+def client(temp_csv_file, monkeypatch):
+    monkeypatch.setattr(viewer, "CSV_PATH", temp_csv_file)
+    return app.test_client()
+
+
+def append_rows(csv_path, rows):
+    with open(csv_path, 'a', newline='', encoding='utf-8') as f:
+        csv.writer(f, delimiter=';').writerows(rows)
+
+
+def test_data_since_returns_only_appended_rows(client, temp_csv_file):
+    append_rows(temp_csv_file, [['a', '1']])
+    first = client.get('/data?since=0').get_json()
+    assert first['reset'] is True
+    assert first['columns'] == ['name', 'value']
+    assert first['rows'] == [{'name': 'a', 'value': '1'}]
+
+    append_rows(temp_csv_file, [['b', '2'], ['c', '3']])
+    second = client.get(f"/data?since={first['cursor']}&version={first['version']}").get_json()
+    assert second['reset'] is False
+    assert [row['name'] for row in second['rows']] == ['b', 'c']
+
+    third = client.get(f"/data?since={second['cursor']}&version={second['version']}").get_json()
+    assert third['rows'] == []
+    assert third['cursor'] == second['cursor']
+
+
+def test_data_since_resets_when_file_is_rewritten(client, temp_csv_file):
+    append_rows(temp_csv_file, [['a', '1'], ['b', '2']])
+    first = client.get('/data?since=0').get_json()
+
+    with open(temp_csv_file, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f, delimiter=';').writerows([['name', 'value', 'comment'], ['a', '1', 'new']])
+    second = client.get(f"/data?since={first['cursor']}&version={first['version']}").get_json()
+    assert second['reset'] is True
+    assert second['columns'] == ['name', 'value', 'comment']
+    assert second['rows'] == [{'name': 'a', 'value': '1', 'comment': 'new'}]
+
+
+def test_data_since_skips_incomplete_last_line(client, temp_csv_file):
+    with open(temp_csv_file, 'a', encoding='utf-8') as f:
+        f.write('a;1\nb;')
+    data = client.get('/data?since=0').get_json()
+    assert data['rows'] == [{'name': 'a', 'value': '1'}]
+    assert client.get('/data').get_json() == [{'name': 'a', 'value': '1'}]
+
+
+def read_sse_event(chunks):
+    event = next(chunks)
+    event = event.decode() if isinstance(event, bytes) else event
+    lines = dict(line.split(': ', 1) for line in event.strip().splitlines())
+    return lines['event'], json.loads(lines['data'])
+
+
+def test_stream_pushes_appended_rows(client, temp_csv_file):
+    append_rows(temp_csv_file, [['a', '1']])
+    response = client.get('/stream', buffered=False)
+    chunks = iter(response.response)
+    try:
+        event, data = read_sse_event(chunks)
+        assert event == 'reset'
+        assert data['rows'] == [{'name': 'a', 'value': '1'}]
+
+        append_rows(temp_csv_file, [['b', '2']])
+        event, data = read_sse_event(chunks)
+        assert event == 'append'
+        assert data['rows'] == [{'name': 'b', 'value': '2'}]
+    finally:
+        response.close()
+
+
+def test_data_etag_not_modified_until_file_changes(client, temp_csv_file):
+    append_rows(temp_csv_file, [['a', '1']])
+    first = client.get('/data')
+    etag = first.headers['ETag']
+    assert client.get('/data', headers={'If-None-Match': etag}).status_code == 304
+
+    append_rows(temp_csv_file, [['b', '2']])
+    second = client.get('/data', headers={'If-None-Match': etag})
+    assert second.status_code == 200
+    assert [row['name'] for row in second.get_json()] == ['a', 'b']
+
+
+def test_data_page_with_column_projection(client, temp_csv_file):
+    append_rows(temp_csv_file, [[f'run{i}', str(i)] for i in range(10)])
+    page = client.get('/data?offset=4&limit=3&cols=value').get_json()
+    assert page['total'] == 10
+    assert page['offset'] == 4
+    assert page['columns'] == ['value']
+    assert page['rows'] == [{'value': '4'}, {'value': '5'}, {'value': '6'}]
+
+    empty = client.get('/data?offset=0&limit=0').get_json()
+    assert empty['total'] == 10
+    assert empty['columns'] == ['name', 'value']
+    assert empty['rows'] == []
+
+
+def test_query_filter_and_sort_numeric_cells(client, temp_csv_file):
+    append_rows(temp_csv_file, [['r1', '15.3 (93.4)'], ['r2', '8.1 (40.2)'], ['r3', '30 (99)'], ['r4', '']])
+    result = client.get('/query?filter=value<20&sort=-value').get_json()
+    assert result['total'] == 2
+    assert [row['name'] for row in result['rows']] == ['r1', 'r2']
+
+    assert client.get('/query?filter=missing<1').status_code == 400
+
+
+def test_query_group_by_run_token(client, temp_csv_file):
+    append_rows(temp_csv_file, [
+        ['lyso_chipA_window_1', '0.91'], ['lyso_chipA_window_2', '0.95'], ['lyso_chipB_window_1', '0.80'],
+    ])
+    result = client.get('/query?group=chip&agg=count,max:value,argmax:value&sort=chip').get_json()
+    assert result['columns'] == ['chip', 'count', 'max:value', 'argmax:value']
+    assert result['rows'] == [
+        {'chip': 'A', 'count': 2, 'max:value': 0.95, 'argmax:value': 'lyso_chipA_window_2'},
+        {'chip': 'B', 'count': 1, 'max:value': 0.80, 'argmax:value': 'lyso_chipB_window_1'},
+    ]
+
+
+def test_data_columnar_format(client, temp_csv_file):
+    append_rows(temp_csv_file, [['a', '1'], ['b', '2'], ['c', '3']])
+    page = client.get('/data?offset=1&limit=5&format=columnar').get_json()
+    assert page['columns'] == ['name', 'value']
+    assert page['count'] == 2
+    assert page['data'] == [['b', 'c'], ['2', '3']]
+
+    full = client.get('/data?format=columnar').get_json()
+    assert full['total'] == 3
+    assert full['data'] == [['a', 'b', 'c'], ['1', '2', '3']]
+    assert client.get('/data?format=xml').status_code == 400
+
+
+def test_data_gzip_when_accepted(client, temp_csv_file):
+    import gzip
+    append_rows(temp_csv_file, [[f'run{i}', str(i)] for i in range(200)])
+    plain = client.get('/data')
+    assert 'Content-Encoding' not in plain.headers
+
+    compressed = client.get('/data', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    assert len(compressed.data) < len(plain.data)
+
+
+@pytest.fixture
+def campaign_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(viewer.campaigns, 'source', str(tmp_path))
+    for name, rows in (('lyso', [['r1', '0.91'], ['r2', '0.95']]), ('thaum', [['t1', '0.80']])):
+        with open(tmp_path / f'{name}.csv', 'w', newline='') as f:
+            csv.writer(f, delimiter=';').writerows([['Run', 'CC1/2']] + rows)
+    (tmp_path / 'notes.txt').write_text('not a campaign')
+    return tmp_path
+
+
+def test_campaigns_are_served_from_one_process(client, campaign_dir):
+    names = [c['name'] for c in client.get('/campaigns').get_json()['campaigns']]
+    assert names == ['lyso', 'thaum']
+    page = client.get('/data?offset=0&limit=10&campaign=thaum').get_json()
+    assert page['rows'] == [{'Run': 't1', 'CC1/2': '0.80'}]
+    assert client.get('/data?campaign=missing').status_code == 404
+
+
+def test_summary_over_csv_and_parquet_campaigns(client, campaign_dir):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    dataset = campaign_dir / 'chips' / 'date=2026-01-01'
+    dataset.mkdir(parents=True)
+    pq.write_table(pa.table({'run': ['c1', 'c2'], 'overall_CC': [0.5, 0.6]}), dataset / 'part-1.parquet')
+    pq.write_table(pa.table({'run': ['c1'], 'overall_CC': [0.99]}), dataset / 'part-2.parquet')
+
+    result = client.get('/summary').get_json()
+    rows = {row['Campaign']: row for row in result['rows']}
+    assert set(rows) == {'chips', 'lyso', 'thaum', 'All campaigns'}
+    assert rows['chips']['Runs'] == '2'
+    assert rows['chips']['Best run'] == 'c1'
+    assert rows['lyso']['Best CC1/2'] == '0.95'
+    assert rows['All campaigns']['Runs'] == '5'
+    assert rows['All campaigns']['Best run'] == 'c1'
+
+
+def test_parquet_table_reads_only_new_files(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    from life_csv_web_viewer import ParquetTable
+    folder = tmp_path / 'date=2026-01-01'
+    folder.mkdir()
+    pq.write_table(pa.table({'run': ['c1', 'c2'], 'overall_CC': [0.5, 0.6]}), folder / 'part-1.parquet')
+    table = ParquetTable(str(tmp_path))
+    change = table.refresh()
+    assert change['reset'] and [row['run'] for row in change['rows']] == ['c1', 'c2']
+    assert change['rows'][0]['date'] == '2026-01-01'
+    assert table.refresh() is None
+
+    pq.write_table(pa.table({'run': ['c3'], 'overall_CC': [0.7]}), folder / 'part-2.parquet')
+    change = table.refresh()
+    assert not change['reset'] and [row['run'] for row in change['rows']] == ['c3']
+    assert change['version'] == table.version and change['total'] == 3
+
+    pq.write_table(pa.table({'run': ['c1'], 'overall_CC': [0.99]}), folder / 'part-3.parquet')
+    change = table.refresh()
+    assert change['reset'] and [row['run'] for row in change['rows']] == ['c1', 'c2', 'c3']
+    assert change['rows'][0]['overall_CC'] == '0.99'
+
+
+def write_shell_files(base):
+    for kind, values in (('CCstar', (0.99, 0.95, 0.6)), ('Rsplit', (5.0, 12.0, 60.0))):
+        with open(f'{base}_{kind}.dat', 'w') as f:
+            f.write(f'  1/d centre  {kind}  nref  d / A  min 1/nm  max 1/nm\n')
+            for i, value in enumerate(values):
+                f.write(f'  {1.5 + i:.3f}  {value}  100  {10 / (1.5 + i):.2f}  1.0  2.0\n')
+
+
+def test_plot_rendered_on_demand_and_cached(client, temp_csv_file, tmp_path):
+    pytest.importorskip('matplotlib')
+    with open(temp_csv_file, 'w', newline='') as f:
+        csv.writer(f, delimiter=';').writerows([['Run', 'Shell files'], ['r1', str(tmp_path / 'r1')], ['r2', '']])
+    write_shell_files(tmp_path / 'r1')
+
+    png = client.get('/plot?run=r1')
+    assert png.status_code == 200
+    assert png.data.startswith(b'\x89PNG')
+    assert client.get('/plot?run=r1', headers={'If-None-Match': png.headers['ETag']}).status_code == 304
+
+    svg = client.get('/plot?run=r1&format=svg')
+    assert svg.mimetype == 'image/svg+xml'
+    assert client.get('/plot?run=r2').status_code == 404
+
+
+def test_metrics_from_published_state(client, temp_csv_file):
+    append_rows(temp_csv_file, [['a', '1'], ['b', '2']])
+    state = {
+        'updated': time.time(), 'started': time.time() - 60, 'pid': 1,
+        'runs': {'discovered': 5, 'prepared': 4, 'submitted': 4, 'running': 1, 'completed': 2},
+        'queue_wait_seconds': {'buckets': [10, 60], 'counts': [1, 2], 'sum': 50.0, 'count': 2},
+        'run_seconds': {'buckets': [10, 60], 'counts': [0, 2], 'sum': 80.0, 'count': 2},
+        'stage_seconds': {'prepare': {'buckets': [1], 'counts': [4], 'sum': 0.5, 'count': 4}},
+        'stream': {'bytes': 2000, 'seconds': 0.5, 'bytes_per_second': 4000.0},
+    }
+    with open(viewer.metrics_path(temp_csv_file), 'w') as f:
+        json.dump(state, f)
+    campaign = os.path.splitext(os.path.basename(temp_csv_file))[0]
+    try:
+        text = client.get('/metrics').get_data(as_text=True)
+        assert f'pipeline_runs{{campaign="{campaign}",state="running"}} 1' in text
+        assert f'pipeline_queue_wait_seconds_bucket{{campaign="{campaign}",le="+Inf"}} 2' in text
+        assert f'pipeline_stage_seconds_count{{campaign="{campaign}",stage="prepare"}} 4' in text
+        assert f'viewer_table_rows{{campaign="{campaign}"}} 2' in text
+        assert text.count('# TYPE pipeline_runs gauge') == 1
+
+        data = client.get('/metrics?format=json').get_json()
+        assert data['campaigns'][campaign]['state']['runs']['completed'] == 2
+        assert data['campaigns'][campaign]['rows'] == 2
+    finally:
+        os.remove(viewer.metrics_path(temp_csv_file))
+
+
+@pytest.fixture
+def runs_csv_file(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'runs.csv'
+    append_rows(csv_path, [['Run', 'value']])
+    monkeypatch.setattr(viewer, "CSV_PATH", str(csv_path))
+    return csv_path
+
+
+def test_appended_row_of_known_run_replaces_it(client, runs_csv_file):
+    append_rows(runs_csv_file, [['a', '1'], ['b', '2']])
+    first = client.get('/data?since=0').get_json()
+
+    append_rows(runs_csv_file, [['a', '10']])
+    update = client.get(f"/data?since={first['cursor']}&version={first['version']}").get_json()
+    assert update['reset'] is True
+    assert update['rows'] == [{'Run': 'a', 'value': '10'}, {'Run': 'b', 'value': '2'}]
+
+    append_rows(runs_csv_file, [['c', '3']])
+    after = client.get(f"/data?since={update['cursor']}&version={update['version']}").get_json()
+    assert after['reset'] is False
+    assert after['rows'] == [{'Run': 'c', 'value': '3'}]
+    assert after['total'] == 3
+
+
+def test_table_without_run_column_keeps_duplicate_rows(client, temp_csv_file):
+    append_rows(temp_csv_file, [['a', '1'], ['b', '2']])
+    first = client.get('/data?since=0').get_json()
+
+    append_rows(temp_csv_file, [['a', '10']])
+    update = client.get(f"/data?since={first['cursor']}&version={first['version']}").get_json()
+    assert update['reset'] is False
+    assert update['rows'] == [{'name': 'a', 'value': '10'}]
+    assert update['total'] == 3
@@ -4,19 +4,20 @@
 
 import os
 import sys
-import csv
 import glob
-import re
-import pandas as pd
-import numpy as np
 import argparse
-from collections import defaultdict
 import subprocess
 import shlex
 import time
 import concurrent.futures
-from run_processing_utils.preparation_for_statistics_calculation import prep_for_calculating_overall_statistics
-from partialator_utils.partialator_execution import run_partialator
+from run_processing_utils.preparation_for_statistics_calculations import prep_for_calculating_overall_statistics, build_hkl_context
+from run_processing_utils.processing_files import processing_statistics_for_run, DAT_FILES_TIMEOUT
+from run_processing_utils.result_sink import ResultSink
+from run_processing_utils.mtz_conversion import get_mtz_conversion_stage, MTZ_WORKERS
+from refinment_utils.refinement_queue import RefinementQueue, REFINEMENT_WORKERS, BACKENDS
+from run_processing_utils.pipeline_metrics import get_pipeline_metrics, get_metrics_path
+from partialator_utils.wait_for_file import get_readiness_service
+from partialator_utils.resolution_cutoff_search import search_resolution_cutoff, CRITERIA
 
 
 os.nice(0)
@@ -24,8 +25,7 @@ indexes = ['Num. patterns/hits', 'Indexed patterns/crystals', 'Resolution', 'Rsp
 
 USER='galchenm'
 SLEEP_TIME = 10
-data_info_all = defaultdict(dict)
-
+SEARCH_WORKERS = 64  # cut-off searches waiting for their statistics jobs at the same time
 class CustomFormatter(argparse.RawDescriptionHelpFormatter,
                       argparse.ArgumentDefaultsHelpFormatter):
     pass
@@ -47,6 +47,15 @@ def parse_cmdline_args():
     parser.add_argument('-s', '--single', action='store_true', help='Process a single .hkl file (use with -p or specify exact path)')
     parser.add_argument('--online', action='store_true', help='Monitor folder and process each new .hkl file as it appears')
     parser.add_argument('--offline', action='store_true', help='Process all .hkl files at once (default behavior)')
+    parser.add_argument('--auto-cutoff', choices=CRITERIA, default=None,
+                        help='Search the high resolution cut-off automatically until CC1/2=0.3 (cc), <SNR>=1 (snr) or CC*=Rsplit (ccstar_rsplit); replaces --offset')
+    parser.add_argument('--parquet', type=str, default=None, help='Folder of a partitioned Parquet dataset to write the numeric results to as well')
+    parser.add_argument('--mtz-workers', default=MTZ_WORKERS, type=int, help='Number of parallel hkl to mtz conversions')
+    parser.add_argument('--refine-workers', default=REFINEMENT_WORKERS, type=int, help='Number of DIMPLE refinements running in parallel with --r')
+    parser.add_argument('--refine-backend', choices=BACKENDS, default='local', help='Run DIMPLE as local processes or as SLURM job steps (srun)')
+    parser.add_argument('-j', '--workers', default=32, type=int, help='Number of threads preparing and submitting jobs in parallel')
+    parser.add_argument('--search-workers', default=SEARCH_WORKERS, type=int, help='Number of cut-off searches with --auto-cutoff running in parallel')
+    parser.add_argument('--metrics', type=str, default=None, help='State file with the progress metrics served by the web viewer on /metrics (default: <output>_metrics.json)')
     return parser.parse_args()
 
 
@@ -61,6 +70,116 @@ def discover_hkl_files():
         hkl_files = list(filter(lambda x: pattern in x, hkl_files))
     return [f for f in hkl_files if os.path.exists(f)]
 
+def get_run_name(hkl_file, offset):
+    return hkl_file.split('.')[0] + f'_{str(offset).replace(".", "p")}'
+
+
+def safe_build_hkl_context(hkl_file):
+    try:
+        return build_hkl_context(hkl_file, cell_path, Rfree_Rwork_path)
+    except Exception as e:
+        print(f"[ERROR] prep failed for {hkl_file}: {e}")
+        return None
+
+
+def prep_run(context, offset):
+    hkl_file = context.hkl_input_file
+    try:
+        with metrics.stage('prepare'):
+            results = prep_for_calculating_overall_statistics(
+                hkl_file, offset, cell_path, Rfree_Rwork_path, nsh, context=context)
+    except Exception as e:
+        print(f"[ERROR] prep failed for {hkl_file} offset {offset}: {e}")
+        return None
+    run_name = get_run_name(hkl_file, offset)
+    metrics.add('prepared')
+    if results[0]:
+        metrics.submitted(run_name, results[0][:-len('_CCstar.dat')])
+    return (run_name, {
+        'hkl_file': hkl_file,
+        'data': {
+            'CCstar_dat_file': results[0],
+            'error_file': results[1],
+            'Rwork': results[2],
+            'Rfree': results[3],
+            'resolution_cut_off_high': results[4],
+            'resolution_low': results[5]
+        }
+    })
+
+
+def search_run(context):
+    """Search the cut-off of an hkl file and report the statistics of the best evaluation."""
+    hkl_file = context.hkl_input_file
+    # the run counts as submitted while its search runs; every job of the search is
+    # timed by evaluate_cutoff when it is actually submitted
+    metrics.add('prepared')
+    metrics.add('submitted')
+    try:
+        with metrics.stage('cutoff_search'):
+            highres, output_base = search_resolution_cutoff(context, auto_criterion, nsh)
+    except Exception as e:
+        print(f"[ERROR] cut-off search failed for {hkl_file}: {e}")
+        return None
+    run_name = hkl_file.split('.')[0] + f'_auto_{auto_criterion}'
+    return (run_name, {
+        'hkl_file': hkl_file,
+        'data': {
+            'CCstar_dat_file': f"{output_base}_CCstar.dat",
+            'error_file': f"{output_base}.err",
+            'Rwork': context.Rwork,
+            'Rfree': context.Rfree,
+            'resolution_cut_off_high': highres,
+            'resolution_low': context.resolution_low
+        }
+    })
+
+
+def prepare_runs(hkl_files):
+    """Build the offset-independent context of every hkl file once and fan it out over all offsets."""
+    submission_data = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=prep_workers) as executor:
+        contexts = [context for context in executor.map(safe_build_hkl_context, hkl_files) if context]
+        if auto_criterion:
+            # a search mostly waits for its statistics jobs (hours each), so it runs outside the
+            # preparation pool, in a pool of its own bounding the jobs submitted at once
+            search_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, min(search_workers, len(contexts))), thread_name_prefix='cutoff-search')
+            futures = [search_executor.submit(search_run, context) for context in contexts]
+        else:
+            search_executor = None
+            futures = [executor.submit(prep_run, context, offset) for context in contexts for offset in offsets]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if result:
+                run_name, run_info = result
+                submission_data[run_name] = run_info
+    if search_executor is not None:
+        search_executor.shutdown()
+    return submission_data
+
+
+def iterate_ready_runs(submission_data):
+    """Yield submitted runs in the order their shell statistics files land; runs that time out are skipped."""
+    service = get_readiness_service()
+    pending = {}
+    for run_name, item in submission_data.items():
+        CCstar_dat_file = item['data']['CCstar_dat_file']
+        if not CCstar_dat_file:
+            yield run_name, item
+            continue
+        # check_hkl writes the SNR file after all compare_hkl shell files
+        SNR_dat_file = CCstar_dat_file.replace("_CCstar.dat", "_SNR.dat")
+        pending[service.submit(SNR_dat_file, timeout=DAT_FILES_TIMEOUT)] = run_name
+    for future in concurrent.futures.as_completed(pending):
+        run_name = pending[future]
+        if not future.result():
+            # the job failed or is still queued; its statistics would time out again
+            print(f"[ERROR] Shell files of {run_name} did not appear within {DAT_FILES_TIMEOUT} s, skipping")
+            continue
+        yield run_name, submission_data[run_name]
+
+
 def wait_for_jobs_to_finish():
     while True:
         pending_command = f'squeue -u {USER} -t pending'
@@ -70,30 +189,24 @@ def wait_for_jobs_to_finish():
         time.sleep(SLEEP_TIME)
 
 
-def append_to_csv(data_dict, output_file):
-    file_exists = os.path.isfile(output_file)
-    
-    with open(output_file, 'a', newline='') as csvfile:
-        fieldnames = ['Run'] + list(next(iter(data_dict.values())).keys())
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        if not file_exists:
-            writer.writeheader()
-        
-        for run_name, data in data_dict.items():
-            row = {'Run': run_name}
-            row.update(data)
-            writer.writerow(row)
-
-def write_to_csv(all_data_info, output_file):
-    all_flattened = []
-    for run_name, data in all_data_info.items():
-        row = {'Run': run_name}
-        row.update(data)
-        all_flattened.append(row)
-    df = pd.DataFrame(all_flattened)
-    df.to_csv(output_file, index=False)
-    print(f"Results written to {output_file}")
+def collect_run(run_name, run_info, hkl_file):
+    """Collect the statistics of a run whose job finished and add them to the results."""
+    with metrics.stage('statistics'):
+        stats = processing_statistics_for_run(
+            run_name, {run_name: run_info['data']},
+            hkl_file, main_path, is_extended, cell_path, is_refining, refinement_queue)
+    metrics.completed(run_name)
+    sink.add(stats)
+
+
+def finish():
+    """Wait for the background refinements and conversions and write the remaining results."""
+    if refinement_queue is not None:
+        refinement_queue.shutdown()
+    sink.close()
+    print(f"Results written to {output}")
+    mtz_stage.shutdown()
+    metrics.close()
 
 
 if __name__ == "__main__":
@@ -118,54 +231,28 @@ if __name__ == "__main__":
     is_single = args.single
     is_online = args.online
     is_offline = args.offline or not is_online  # default to offline
+    prep_workers = args.workers
+    search_workers = args.search_workers
+    auto_criterion = args.auto_cutoff
 
-    data_info_all = defaultdict(dict)
+    metrics = get_pipeline_metrics(args.metrics or get_metrics_path(output))
+    metrics.start()
+    sink = ResultSink(output, args.parquet, is_extended, append=is_online)
+    mtz_stage = get_mtz_conversion_stage(args.mtz_workers)
+    refinement_queue = RefinementQueue(args.refine_workers, args.refine_backend, on_result=sink.update) if is_refining else None
 
     if is_single:
         hkl_files = discover_hkl_files()
         if not hkl_files:
             print("No .hkl files found.")
             sys.exit(1)
-        hkl_file = hkl_files[0]
-        submission_data = {}
-
-        def prep_wrapper(offset):
-            run_name = hkl_file.split('.')[0] + f'_{str(offset).replace(".", "p")}'
-            try:
-                results = prep_for_calculating_overall_statistics(
-                    hkl_file, offset, cell_path, Rfree_Rwork_path, nsh)
-                return (run_name, {
-                    'hkl_file': hkl_file,
-                    'data': {
-                        'CCstar_dat_file': results[0],
-                        'error_file': results[1],
-                        'Rwork': results[2],
-                        'Rfree': results[3],
-                        'resolution_cut_off_high': results[4],
-                        'resolution_low': results[5]
-                    }
-                })
-            except Exception as e:
-                print(f"[ERROR] prep failed for offset {offset}: {e}")
-                return None
-
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(prep_wrapper, offset) for offset in offsets]
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    run_name, run_info = result
-                    submission_data[run_name] = run_info
-
-        wait_for_jobs_to_finish()
-
-        for run_name, item in submission_data.items():
-            run_data = processing_statistics_for_run(
-                run_name, {run_name: item['data']},
-                item['hkl_file'], main_path, is_extended, cell_path, is_refining)
-            data_info_all.update(run_data)
-
-        write_to_csv(data_info_all, output)
+        metrics.add('discovered')
+        submission_data = prepare_runs(hkl_files[:1])
+
+        for run_name, item in iterate_ready_runs(submission_data):
+            collect_run(run_name, item, item['hkl_file'])
+
+        finish()
 
     elif is_online:
         seen = set()
@@ -174,30 +261,27 @@ if __name__ == "__main__":
             while True:
                 hkl_files = discover_hkl_files()
                 new_files = [f for f in hkl_files if f not in seen]
+                metrics.add('discovered', len(new_files))
                 for hkl_file in new_files:
                     seen.add(hkl_file)
-                    for offset in offsets:
-                        run_name = hkl_file.split('.')[0] + f'_{str(offset).replace(".", "p")}'
-                        CCstar_dat_file, error_file, Rwork, Rfree, resolution_cut_off_high, resolution_low = prep_for_calculating_overall_statistics(
-                            hkl_file, offset, cell_path, Rfree_Rwork_path, nsh)
-                        data_info = {
-                            'CCstar_dat_file': CCstar_dat_file,
-                            'error_file': error_file,
-                            'Rwork': Rwork,
-                            'Rfree': Rfree,
-                            'resolution_cut_off_high': resolution_cut_off_high,
-                            'resolution_low': resolution_low
-                        }
+                    context = safe_build_hkl_context(hkl_file)
+                    if context is None:
+                        continue
+                    # with --auto-cutoff the searched cut-off replaces the offsets
+                    for offset in ([None] if auto_criterion else offsets):
+                        result = search_run(context) if auto_criterion else prep_run(context, offset)
+                        if result is None:
+                            continue
+                        run_name, run_info = result
                         wait_for_jobs_to_finish()
-                        run_data = processing_statistics_for_run(run_name, {run_name: data_info},
-                                                                 hkl_file, main_path,
-                                                                 is_extended, cell_path, is_refining)
-                        append_to_csv(run_data, output)
-                        data_info_all.update(run_data)
+                        collect_run(run_name, run_info, hkl_file)
+                sink.flush()
 
                 time.sleep(SLEEP_TIME)
         except KeyboardInterrupt:
             print("Exiting online mode.")
+        finally:
+            finish()
 
     elif is_offline:
         hkl_files = discover_hkl_files()
@@ -205,43 +289,9 @@ if __name__ == "__main__":
             print("No .hkl files found.")
             sys.exit(1)
 
-        submission_data = {}
-
-        def prep_wrapper_offline(args):
-            hkl_file, offset = args
-            run_name = hkl_file.split('.')[0] + f'_{str(offset).replace(".", "p")}'
-            try:
-                results = prep_for_calculating_overall_statistics(
-                    hkl_file, offset, cell_path, Rfree_Rwork_path, nsh)
-                return (run_name, {
-                    'hkl_file': hkl_file,
-                    'data': {
-                        'CCstar_dat_file': results[0],
-                        'error_file': results[1],
-                        'Rwork': results[2],
-                        'Rfree': results[3],
-                        'resolution_cut_off_high': results[4],
-                        'resolution_low': results[5]
-                    }
-                })
-            except Exception as e:
-                print(f"[ERROR] prep failed for {hkl_file} offset {offset}: {e}")
-                return None
-
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(prep_wrapper_offline, (hkl_file, offset)) for hkl_file in hkl_files for offset in offsets]
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    run_name, run_info = result
-                    submission_data[run_name] = run_info
-
-        wait_for_jobs_to_finish()
-
-        for run_name, item in submission_data.items():
-            run_data = processing_statistics_for_run(
-                run_name, {run_name: item['data']},
-                item['hkl_file'], main_path, is_extended, cell_path, is_refining)
-            data_info_all.update(run_data)
-        data_info_all = data_info_all.T
-        write_to_csv(data_info_all, output)
+        metrics.add('discovered', len(hkl_files))
+        submission_data = prepare_runs(hkl_files)
+
+        for run_name, item in iterate_ready_runs(submission_data):
+            collect_run(run_name, item, item['hkl_file'])
+        finish()
@@ -0,0 +1,74 @@
+import os
+import time
+import bisect
+import threading
+
+INDEX_MAX_AGE = 60  # seconds before a miss triggers a rebuild of the index
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class ErrFileIndex:
+    """Sorted index of the partialator .err files found under a processing folder.
+
+    Used for trees processed before the .err path was carried through the pipeline:
+    the folder is walked once and every `{prefix}*.err` lookup is a binary search over
+    the sorted basenames instead of a recursive glob per run.
+
+    Args:
+        root (str): Path to the folder to index.
+        max_age (float): Age of the index in seconds after which a miss rebuilds it.
+    """
+
+    def __init__(self, root, max_age=INDEX_MAX_AGE):
+        self.root = root
+        self.max_age = max_age
+        self._names = []
+        self._paths = []
+        self._built_at = 0.
+        self._lock = threading.Lock()
+        self.rebuild()
+
+    def rebuild(self):
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            entries.extend(
+                (filename, os.path.join(dirpath, filename))
+                for filename in filenames
+                if filename.endswith('.err') and not filename.startswith('.')
+            )
+        entries.sort()
+        with self._lock:
+            self._names = [name for name, _ in entries]
+            self._paths = [path for _, path in entries]
+            self._built_at = time.monotonic()
+
+    def _lookup(self, prefix):
+        with self._lock:
+            start = bisect.bisect_left(self._names, prefix)
+            matches = []
+            for name, path in zip(self._names[start:], self._paths[start:]):
+                if not name.startswith(prefix):
+                    break
+                matches.append(path)
+        existing = [path for path in matches if os.path.exists(path)]
+        return max(existing, key=os.path.getctime) if existing else None
+
+    def latest(self, prefix):
+        """Return the newest `{prefix}*.err` file under the indexed folder, or None."""
+        err_file = self._lookup(prefix)
+        if err_file is None and time.monotonic() - self._built_at > self.max_age:
+            self.rebuild()
+            err_file = self._lookup(prefix)
+        return err_file
+
+
+def get_err_file_index(root):
+    """Return the shared ErrFileIndex for the given processing folder."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = ErrFileIndex(root)
+        return _indexes[root]
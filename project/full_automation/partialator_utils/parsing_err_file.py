@@ -1,14 +1,102 @@
 import os
 import re
-import time
-from partialator_utils.resolution_cutoff_determination import get_d_at_snr_one, get_d_at_cc_threshold
-from stream_utils.parsing_stream import parse_stream
-from partialator_utils.wait_for_file import wait_for_line
-from collections import defaultdict
-from partialator_utils.resolution_cutoff_determination import calculating_max_res_from_Rsplit_CCstar_dat
-from partialator_utils.resolution_cutoff_determination import get_UC
+import numpy as np
+from collections import namedtuple
+from functools import lru_cache
+from partialator_utils.wait_for_file import get_readiness_service, wait_for_line
 from partialator_utils.wait_for_file import wait_for_file
-from unit_cell_utils.parsing_UC_files import parse_UC_file
+from partialator_utils.parsing_shell_files import read_shell_file, shell_column
+from run_processing_utils.run_stats import ShellStats
+
+ERR_TAIL_CHUNK = 64 * 1024
+ERR_TAIL_LIMIT = 16 * 1024 * 1024  # the compare_hkl/check_hkl summary is a few KB at the end of the log
+SUMMARY_TIMEOUT = 20  # seconds to wait for the Wilson B-factor line
+
+# One precompiled pattern for every summary line; the matched key selects the field
+SUMMARY_LINE = re.compile(
+    r'(?:Overall (?P<overall>CC\*|Rsplit|CCano|CC|<snr>|redundancy|completeness) =\s*(?P<value>\d+\.\d+)'
+    r'|(?P<wilson>B) =\s*(?P<B>\d+\.\d+)'
+    r'|(?P<total>\d+) (?P<kind>measurements|reflections) in total\.'
+    r'|Fixed resolution range:.*\((?P<low>\d+\.?\d*) to (?P<high>\d+\.?\d*) Angstroms\))'
+)
+OVERALL_FIELDS = {
+    'CC*': 'CCstar', 'Rsplit': 'Rsplit', 'CC': 'CC', 'CCano': 'CCano', '<snr>': 'snr',
+    'redundancy': 'multiplicity', 'completeness': 'completeness'
+}
+TOTAL_FIELDS = {'measurements': 'total_measurements', 'reflections': 'unique_reflections'}
+# the job script runs compare_hkl --fom=CCstar first, so its result opens the summary block
+SUMMARY_START_FIELD = 'CCstar'
+
+ErrMetrics = namedtuple('ErrMetrics', [
+    'CCstar', 'Rsplit', 'CC', 'CCano', 'snr', 'completeness', 'multiplicity',
+    'total_measurements', 'unique_reflections', 'Wilson_B_factor',
+    'resolution_low', 'resolution_high'
+], defaults=(None,) * 12)
+
+
+def _parse_summary_lines(lines):
+    fields = {}
+    for line in lines:
+        m = SUMMARY_LINE.match(line)
+        if m is None:
+            continue
+        if m.group('overall'):
+            fields[OVERALL_FIELDS[m.group('overall')]] = float(m.group('value'))
+        elif m.group('wilson'):
+            fields['Wilson_B_factor'] = float(m.group('B'))
+        elif m.group('total'):
+            fields[TOTAL_FIELDS[m.group('kind')]] = int(m.group('total'))
+        else:
+            fields['resolution_low'] = float(m.group('low'))
+            fields['resolution_high'] = float(m.group('high'))
+    return fields
+
+
+@lru_cache(maxsize=1024)
+def _read_err_summary(filename, mtime_ns, size):
+    chunk = ERR_TAIL_CHUNK
+    with open(filename, 'rb') as f:
+        while True:
+            start = max(0, size - chunk)
+            f.seek(start)
+            lines = f.read(size - start).decode('utf-8', errors='replace').splitlines()
+            if start > 0:
+                lines = lines[1:]  # first line is most likely cut
+            fields = _parse_summary_lines(lines)
+            # values missing from the whole block (e.g. CCano of non-anomalous data) do not grow the window
+            if SUMMARY_START_FIELD in fields or start == 0 or chunk >= ERR_TAIL_LIMIT:
+                return ErrMetrics(**fields)
+            chunk *= 4
+
+
+def read_err_summary(filename):
+    """Parse the overall statistics compare_hkl and check_hkl write at the end of the .err file.
+
+    Only the tail of the file is read (growing from 64 KiB until the start of the
+    summary block is inside it, at most ERR_TAIL_LIMIT), and each line goes through one precompiled
+    pattern. When a value is reported several times the last one wins. Results are
+    cached per (path, mtime, size).
+
+    Args:
+        filename (str): Path to the .err file.
+    Returns:
+        ErrMetrics: Overall values as float (counts as int); missing values are None.
+    """
+    stat = os.stat(filename)
+    return _read_err_summary(os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+
+
+def err_summary_is_complete(filename):
+    """Readiness check: the Wilson B-factor, the last line check_hkl writes, is in the summary.
+
+    The check parses the same tail as read_err_summary (cached per path, mtime and
+    size), so a file is only read again when it changed.
+    """
+    try:
+        return read_err_summary(filename).Wilson_B_factor is not None
+    except OSError:
+        return False
+
 
 def outer_shell(CCstar_dat_file, is_extended=False):
     """
@@ -19,184 +107,87 @@ def outer_shell(CCstar_dat_file, is_extended=False):
         is_extended (bool): Currently unused but preserved for interface compatibility.
 
     Returns:
-        tuple: (
-            shell, CCstar_shell, Rsplit_shell, CC_shell,
-            max_shell, min_shell, SNR_shell, Completeness_shell,
-            unique_refs_shell, multiplicity_shell
-        )
+        ShellStats: Values of the outer shell; entries that cannot be read are None.
     """
 
     def wait_for_file_ready(filepath, check_line=''):
         """Waits for file existence and optional specific content."""
         if check_line:
             return wait_for_line(filepath, check_line, max_attempts=20, delay=2.0)
-        while not os.path.exists(filepath) or os.stat(filepath).st_size == 0:
-            time.sleep(2)
-
-    def read_single_value(filepath, value_index, shell_index=None):
-        with open(filepath, 'r') as f:
-            for line in f:
-                parts = re.sub(r' +', ' ', line.strip()).split()
-                try:
-                    value = round(float(parts[value_index]), 3)
-                    shell = parts[shell_index] if shell_index is not None else ''
-                    return value, shell
-                except (IndexError, ValueError):
-                    continue
-        return '', ''
+        return wait_for_file(filepath)
+
+    def read_single_value(filepath, value_index):
+        table = read_shell_file(filepath)
+        if len(table) == 0 or len(table.dtype.names) <= value_index:
+            return None
+        return float(shell_column(table, value_index)[0])
+
+    shell = ShellStats()
 
     # Wait and parse CCstar
     wait_for_file_ready(CCstar_dat_file)
-    CCstar_shell, shell = read_single_value(CCstar_dat_file, 1, shell_index=3)
+    shell.CCstar = read_single_value(CCstar_dat_file, 1)
 
     # Wait and parse Rsplit
     rsplit_file = CCstar_dat_file.replace("CCstar", "Rsplit")
     wait_for_file_ready(rsplit_file)
-    Rsplit_shell, _ = read_single_value(rsplit_file, 1)
+    shell.Rsplit = read_single_value(rsplit_file, 1)
 
     # Wait and parse CC
     cc_file = CCstar_dat_file.replace("CCstar", "CC")
     wait_for_file_ready(cc_file)
-    CC_shell, _ = read_single_value(cc_file, 1)
+    shell.CC = read_single_value(cc_file, 1)
 
     # Wait and parse SNR and related values
     snr_file = CCstar_dat_file.replace("CCstar", "SNR")
     wait_for_file_ready(snr_file)
 
-    max_shell = min_shell = SNR_shell = Completeness_shell = unique_refs_shell = multiplicity_shell = ''
-    with open(snr_file, 'r') as f:
-        for line in f:
-            parts = re.sub(r' +', ' ', line.strip()).split()
-            try:
-                unique_refs_shell = parts[1]
-                Completeness_shell = round(float(parts[3]), 3)
-                multiplicity_shell = round(float(parts[5]), 3)
-                SNR_shell = round(float(parts[6]), 3)
-                max_shell = round(10 / float(parts[-2]), 2)
-                min_shell = round(10 / float(parts[-1]), 2)
-                break
-            except (IndexError, ValueError, ZeroDivisionError):
+    snr_table = read_shell_file(snr_file)
+    if len(snr_table.dtype.names) >= 7:
+        for row in snr_table.tolist():
+            if np.isnan([row[1], row[3], row[5], row[6], row[-2], row[-1]]).any() or 0. in (row[-2], row[-1]):
                 continue
+            shell.unique_reflections = int(row[1])
+            shell.completeness = row[3]
+            shell.multiplicity = row[5]
+            shell.snr = row[6]
+            shell.d_max = 10 / row[-2]
+            shell.d_min = 10 / row[-1]
+            break
 
-    return (
-        shell,
-        CCstar_shell,
-        Rsplit_shell,
-        CC_shell,
-        max_shell,
-        min_shell,
-        SNR_shell,
-        Completeness_shell,
-        unique_refs_shell,
-        multiplicity_shell
-    )
+    return shell
 
-def parse_err(data_info, name_of_run, filename, CCstar_dat_file, is_extended=False):
+def parse_err(stats, filename, CCstar_dat_file):
     """
-    Parses the error file to extract overall statistics and updates the data_info dictionary.
+    Parses the error file to extract overall statistics and fills them into the run record.
 
     Args:
-        data_info (dict): Dictionary to store parsed data.
-        name_of_run (str): Name of the run used as a key in data_info.
+        stats (RunStats): Record of the run to update.
         filename (str): Path to the error file.
         CCstar_dat_file (str): Path to the CCstar.dat file.
-        is_extended (bool): If True, includes additional statistics.
 
     Returns:
-        dict: Updated data_info dictionary with parsed statistics.
+        RunStats: The updated record.
     """
-
-    def extract_value(line, pattern):
-        match = re.match(pattern, line)
-        return str(round(float(match.group(1)), 4)) if match else ''
-
-    if not wait_for_line(filename, "B =", max_attempts=10, delay=2.0):
+    if not get_readiness_service().wait(filename, check=err_summary_is_complete, timeout=SUMMARY_TIMEOUT):
         print("The file is not updating, and the required line did not appear. Exiting function.")
-        data_info[name_of_run]['Comment'] = 'Something odd happened with calculation overall statistics. Did not finish calculating B-factor'
-        return data_info
-
-    # Initialize variables
-    metrics = {
-        'CCstar': '', 'Rsplit': '', 'CC': '', 'CCano': '', 'snr': '',
-        'completeness': '', 'multiplicity': '', 'total_measurements': '',
-        'unique_reflections': '', 'Wilson_B_factor': '', 'resolution': ''
-    }
-
-    with open(filename, 'r') as file:
-        for line in file:
-            if line.startswith('Overall CC* ='):
-                metrics['CCstar'] = extract_value(line, r'Overall CC\* =\s*(\d+\.\d+)')
-            elif line.startswith('Overall Rsplit ='):
-                metrics['Rsplit'] = extract_value(line, r'Overall Rsplit =\s*(\d+\.\d+)')
-            elif line.startswith('Overall CC ='):
-                metrics['CC'] = extract_value(line, r'Overall CC =\s*(\d+\.\d+)')
-            elif line.startswith('Overall CCano ='):
-                metrics['CCano'] = extract_value(line, r'Overall CCano =\s*(\d+\.\d+)')
-            elif line.startswith('Fixed resolution range:'):
-                metrics['resolution'] = line.split('(')[1].split(')')[0].replace('to', '-').replace('Angstroms', '').strip()
-            elif ' measurements in total.' in line:
-                m = re.match(r'(\d+) measurements in total\.', line)
-                if m:
-                    metrics['total_measurements'] = m.group(1)
-            elif ' reflections in total.' in line:
-                m = re.match(r'(\d+) reflections in total\.', line)
-                if m:
-                    metrics['unique_reflections'] = m.group(1)
-            elif line.startswith('Overall <snr> ='):
-                metrics['snr'] = extract_value(line, r'Overall <snr> =\s*(\d+\.\d+)')
-            elif line.startswith('Overall redundancy ='):
-                metrics['multiplicity'] = extract_value(line, r'Overall redundancy =\s*(\d+\.\d+)')
-            elif line.startswith('Overall completeness ='):
-                metrics['completeness'] = extract_value(line, r'Overall completeness =\s*(\d+\.\d+)')
-            elif line.startswith('B ='):
-                metrics['Wilson_B_factor'] = extract_value(line, r'B =\s*(\d+\.\d+)')
-
-    # File paths for extra data
-    SNR_dat_file = CCstar_dat_file.replace("CCstar", "SNR")
-    CC_dat_file = CCstar_dat_file.replace("CCstar", "CC")
-
-    # Shell statistics
-    shell, CCstar_shell, Rsplit_shell, CC_shell, max_shell, min_shell, \
-    SNR_shell, Completeness_shell, unique_refs_shell, multiplicity_shell = outer_shell(CCstar_dat_file, is_extended)
-
-    # Populate primary data
-    run_data = {
-        'Resolution': f"{metrics['resolution']} ({max_shell} - {min_shell})",
-        'Rsplit(%)': f"{metrics['Rsplit']} ({Rsplit_shell})",
-        'CC1/2': f"{metrics['CC']} ({CC_shell})",
-        'CC*': f"{metrics['CCstar']} ({CCstar_shell})",
-        'CCano': metrics['CCano'],
-        'SNR': f"{metrics['snr']} ({SNR_shell})",
-        'Completeness(%)': f"{metrics['completeness']} ({Completeness_shell})",
-        'Multiplicity': f"{metrics['multiplicity']} ({multiplicity_shell})",
-        'Total Measurements': metrics['total_measurements'],
-        'Unique Reflections': f"{metrics['unique_reflections']} ({unique_refs_shell})",
-        'Wilson B-factor': metrics['Wilson_B_factor'],
-        'Resolution CC>=0.3': get_d_at_cc_threshold(CC_dat_file),
-        'Resolution SNR=1': get_d_at_snr_one(SNR_dat_file)
-    }
-    data_info[name_of_run].update(run_data)
-
-    # Extended stats if needed
-    if is_extended:
-        extended = {
-            'Resolution_overall': metrics['resolution'],
-            'Rsplit(%)_overall': metrics['Rsplit'],
-            'CC1/2_overall': metrics['CC'],
-            'CC*_overall': metrics['CCstar'],
-            'SNR_overall': metrics['snr'],
-            'Completeness(%)_overall': metrics['completeness'],
-            'Multiplicity_overall': metrics['multiplicity'],
-            'Unique Reflections_overall': metrics['unique_reflections'],
-            'Resolution_outer_shell': f'{max_shell} - {min_shell}',
-            'Rsplit(%)_outer_shell': Rsplit_shell,
-            'CC1/2_outer_shell': CC_shell,
-            'CC*_outer_shell': CCstar_shell,
-            'SNR_outer_shell': SNR_shell,
-            'Completeness(%)_outer_shell': Completeness_shell,
-            'Multiplicity_outer_shell': multiplicity_shell,
-            'Unique_Reflections_outer_shell': unique_refs_shell
-        }
-        data_info[name_of_run].update(extended)
-
-    return data_info
+        stats.comment = 'Something odd happened with calculation overall statistics. Did not finish calculating B-factor'
+        return stats
+
+    summary = read_err_summary(filename)
+    stats.overall = ShellStats(
+        d_max=summary.resolution_low,
+        d_min=summary.resolution_high,
+        CCstar=summary.CCstar,
+        Rsplit=summary.Rsplit,
+        CC=summary.CC,
+        snr=summary.snr,
+        completeness=summary.completeness,
+        multiplicity=summary.multiplicity,
+        unique_reflections=summary.unique_reflections
+    )
+    stats.CCano = summary.CCano
+    stats.total_measurements = summary.total_measurements
+    stats.Wilson_B_factor = summary.Wilson_B_factor
+    stats.outer = outer_shell(CCstar_dat_file)
+    return stats
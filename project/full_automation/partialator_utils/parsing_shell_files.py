@@ -0,0 +1,72 @@
+import os
+from functools import lru_cache
+import numpy as np
+
+# The same clean-up get_xy has always applied to the header of CrystFEL shell files,
+# e.g. '1/d centre  CC*  nref  d / A  min 1/nm  max 1/nm' -> 1/d, CC*, nref, d, min, max
+HEADER_REPLACEMENTS = ('1/nm', '# ', 'centre', '/ A', ' dev', '(A)')
+
+
+def _to_float(token):
+    try:
+        return float(token)
+    except ValueError:
+        return np.nan
+
+
+def _clean_header(line):
+    for old in HEADER_REPLACEMENTS:
+        line = line.replace(old, '')
+    return line.split()
+
+
+@lru_cache(maxsize=1024)
+def _read_shell_file(file_path, mtime_ns, size):
+    header = []
+    rows = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            values = [_to_float(part) for part in parts]
+            if all(np.isnan(value) for value in values):
+                if not rows and not header:
+                    header = _clean_header(line)
+                continue
+            rows.append(values)
+
+    n_columns = max((len(row) for row in rows), default=len(header))
+    table = np.full((len(rows), n_columns), np.nan)
+    for i, row in enumerate(rows):
+        table[i, :len(row)] = row
+
+    if len(header) == n_columns and len(set(header)) == n_columns:
+        names = header
+    else:
+        names = [f'f{i}' for i in range(n_columns)]
+    records = np.rec.fromarrays(table.T, names=names) if n_columns else np.rec.array([], dtype=[])
+    records.flags.writeable = False  # shared between all callers through the cache
+    return records
+
+
+def read_shell_file(file_path):
+    """Parse a CrystFEL shell file (_CCstar.dat, _Rsplit.dat, _CC.dat, _SNR.dat, ...).
+
+    The file is read once per (path, mtime, size); every later call returns the same
+    read-only record array.
+
+    Args:
+        file_path (str): Path to the shell file.
+    Returns:
+        numpy.recarray: One record per shell with float fields named after the cleaned
+        header (e.g. 'd', 'CC*', 'Rsplit/%'), or f0, f1, ... if the header does not
+        match the data columns. Non-numeric values are NaN.
+    """
+    stat = os.stat(file_path)
+    return _read_shell_file(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+def shell_column(table, index):
+    """Return the column at the given position, whatever its name is."""
+    return table[table.dtype.names[index]]
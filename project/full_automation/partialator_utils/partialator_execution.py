@@ -1,5 +1,6 @@
 import os
 import sys
+import subprocess
 
 USER='galchenm'
 
@@ -22,6 +23,18 @@ def find_script(script_name, search_path):
             return os.path.join(root, script_name)
     return None
 
+def get_output_base(hkl_input_file, suffix=''):
+    """Return the absolute path prefix of the files run_partialator writes for this suffix.
+
+    Example: /path/run_offset_0_5 for /path/run.hkl and suffix '0.5';
+    the shell files are then /path/run_offset_0_5_CCstar.dat etc.
+    """
+    path = os.path.dirname(os.path.abspath(hkl_input_file))
+    data = os.path.basename(hkl_input_file).split('.')[0]
+    data_output_name = data if len(suffix) == 0 else f"{data}_offset_{suffix.replace('.', '_')}"
+    return os.path.join(path, data_output_name)
+
+
 def run_partialator(hkl_input_file, highres, pg, pdb, nsh=10, suffix=''):
     """Run the partialator to compare two hkl files and generate statistics.
     This function prepares a job script to run the `compare_hkl` and `check_hkl` commands
@@ -29,7 +42,8 @@ def run_partialator(hkl_input_file, highres, pg, pdb, nsh=10, suffix=''):
     with the specified number of shells. It generates output files for various statistics
     such as CCstar, Rsplit, CC, CCano, SNR, and Wilson
     statistics. The job script is submitted to the SLURM scheduler.
-    It also generates a plot combining the CCstar and Rsplit statistics.
+    The CCstar/Rsplit plot is not rendered by the job, the web viewer renders it
+    on demand from the shell files (/plot).
     If the hkl1 and hkl2 files already exist, it uses them directly.
     If the files do not exist, it will not run the job and will print a message.
     This function assumes that the necessary modules for `compare_hkl` and `check_hkl`
@@ -67,14 +81,17 @@ def run_partialator(hkl_input_file, highres, pg, pdb, nsh=10, suffix=''):
     """
     
     path = os.path.dirname(os.path.abspath(hkl_input_file))
-    os.chdir(path)
-    print(f'We are in {os.getcwd()}')
     data = os.path.basename(hkl_input_file).split('.')[0]
-    data_output_name = data if len(suffix) == 0 else f"{data}_offset_{suffix.replace('.', '_')}"
 
-    if os.path.exists(f'{data}.hkl1') and os.path.exists(f'{data}.hkl2'):
+    # Everything is addressed by absolute path: this function runs concurrently in threads,
+    # so it must not depend on (or change) the process-wide working directory.
+    data_path = os.path.join(path, data)
+    output_path = get_output_base(hkl_input_file, suffix)
+    data_output_name = os.path.basename(output_path)
+
+    if os.path.exists(f'{data_path}.hkl1') and os.path.exists(f'{data_path}.hkl2'):
         
-        job_file = os.path.join(path, "%s.sh" % data_output_name)
+        job_file = f"{output_path}.sh"
         
         with open(job_file, 'w+') as fh:
             fh.writelines("#!/bin/sh\n")
@@ -84,8 +101,11 @@ def run_partialator(hkl_input_file, highres, pg, pdb, nsh=10, suffix=''):
             fh.writelines("#SBATCH --nodes=1\n")
             fh.writelines("#SBATCH --nice=100\n")
             fh.writelines("#SBATCH --mem=500000\n")
-            fh.writelines("#SBATCH --output=%s.out\n" % data_output_name)
-            fh.writelines("#SBATCH --error=%s.err\n" % data_output_name)
+            fh.writelines("#SBATCH --chdir=%s\n" % path)
+            fh.writelines("#SBATCH --output=%s.out\n" % output_path)
+            fh.writelines("#SBATCH --error=%s.err\n" % output_path)
+            # start time of the job, the queue wait and run time are measured from it (PipelineMetrics)
+            fh.writelines("date +%%s > %s.started\n" % output_path)
             fh.writelines("source /etc/profile.d/modules.sh\n")
             fh.writelines("module load xray\n")
 
@@ -94,51 +114,28 @@ def run_partialator(hkl_input_file, highres, pg, pdb, nsh=10, suffix=''):
             fh.writelines("module load maxwell crystfel\n")
             fh.writelines("export QT_QPA_PLATFORM=offscreen\n") 
 
-            command = f"compare_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --fom=CCstar --shell-file={data_output_name}_CCstar.dat {data}.hkl1 {data}.hkl2\n"
+            command = f"compare_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --fom=CCstar --shell-file={output_path}_CCstar.dat {data_path}.hkl1 {data_path}.hkl2\n"
             fh.writelines(command)
 
-            command = f"compare_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --fom=Rsplit --shell-file={data_output_name}_Rsplit.dat {data}.hkl1 {data}.hkl2\n"
+            command = f"compare_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --fom=Rsplit --shell-file={output_path}_Rsplit.dat {data_path}.hkl1 {data_path}.hkl2\n"
             fh.writelines(command)
 
-            command = f"compare_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --fom=CC --shell-file={data_output_name}_CC.dat {data}.hkl1 {data}.hkl2\n"
+            command = f"compare_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --fom=CC --shell-file={output_path}_CC.dat {data_path}.hkl1 {data_path}.hkl2\n"
             fh.writelines(command)
 
-            command = f"compare_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --fom=CCano --shell-file={data_output_name}_CCano.dat {data}.hkl1 {data}.hkl2\n"
+            command = f"compare_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --fom=CCano --shell-file={output_path}_CCano.dat {data_path}.hkl1 {data_path}.hkl2\n"
             fh.writelines(command)
 
-            command = f"check_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --shell-file={data_output_name}_SNR.dat {data}.hkl\n"
+            command = f"check_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --shell-file={output_path}_SNR.dat {data_path}.hkl\n"
             fh.writelines(command)
 
-            command = f"check_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --wilson --shell-file={data_output_name}_Wilson.dat {data}.hkl\n"
+            command = f"check_hkl -p {pdb} -y {pg} --highres={highres} --nshells={nsh} --wilson --shell-file={output_path}_Wilson.dat {data_path}.hkl\n"
             fh.writelines(command)
-            
-            max_dd = round(10./highres,3)
-            
-            # Get the directory where the current script is located
-            current_script_dir = os.path.dirname(os.path.abspath(__file__))
-
-            # Script to search for
-            script_name = "many_plots-upt-v2.py"
-
-            # Search starting from the current script's directory
-            script_path = find_script(script_name, current_script_dir)
-
-            if script_path:
-                command = (
-                    f"python3 {script_path} -i {data_output_name}_CCstar.dat "
-                    f"-x '1/d' -y 'CC*' -o {data_output_name}.png "
-                    f"-add_nargs {data_output_name}_Rsplit.dat -yad 'Rsplit/%' "
-                    f"-x_lim_dw 1. -x_lim_up {max_dd} -t {data_output_name} "
-                    f"-legend {data_output_name} >> output.err\n"
-                )
-                fh.writelines(command)
-            else:
-                print(f"Could not find {script_name} under {current_script_dir}. Skipping execution.")
 
         print(f'The {job_file} is going to be submitted')    
-        os.system("sbatch %s" % job_file)
+        subprocess.run(["sbatch", f"--chdir={path}", job_file], cwd=path)
         
-        return "%s_CCstar.dat" % os.path.join(path, data_output_name), "%s.err" % os.path.join(path, data_output_name)
+        return f"{output_path}_CCstar.dat", f"{output_path}.err"
     else:
         print(f'You do not have hkl1 and/or hkl2 files for {hkl_input_file}')
         return None, None
@@ -1,12 +1,152 @@
 import os
 import sys
 import numpy as np
-import pandas as pd
+from partialator_utils.parsing_shell_files import read_shell_file, shell_column
 
 x_arg_name = 'd'
 y_arg_name = 'CC*'
 y_arg_name2 = 'Rsplit/%'
 
+def pad_columns(columns):
+    """Stack 1-D arrays of different lengths into a 2-D array padded with NaN."""
+    columns = [np.asarray(column, dtype=float) for column in columns]
+    width = max((len(column) for column in columns), default=0)
+    stacked = np.full((len(columns), width), np.nan)
+    for i, column in enumerate(columns):
+        stacked[i, :len(column)] = column
+    return stacked
+
+
+def d_at_threshold_batch(values, d_values, target):
+    """
+    Vectorized search of d(A) at which a decreasing statistic reaches the target value.
+
+    Every row is one shell table. Shells are kept only while the statistic keeps
+    decreasing (a shell is dropped unless it is below every shell kept before it),
+    then the first kept shell equal to the target is returned as is, or the crossing
+    between two neighbouring kept shells is linearly interpolated.
+
+    :param values: 2-D array (tables x shells) of the statistic, NaN-padded.
+    :param d_values: 2-D array of the same shape with d(A) of the shells.
+    :param target: Value of the statistic to look for (e.g. SNR=1, CC=0.3).
+    :return: 1-D array with d(A) per table, NaN where the target is not crossed.
+    """
+    y, d, n_kept = _monotone_shells(values, d_values)
+    n_tables, n_shells = y.shape
+    result = np.full(n_tables, np.nan)
+    if n_shells < 2:
+        return result
+
+    # Kept values strictly decrease, so all shells above the target come first
+    n_above = (y > target).sum(axis=1)
+    rows = np.arange(n_tables)
+    at = np.minimum(n_above, n_shells - 1)
+    before = np.maximum(n_above - 1, 0)
+
+    exact = (n_above <= n_kept - 2) & (y[rows, at] == target)
+    result[exact] = d[rows, at][exact]
+
+    crossing = (n_above >= 1) & (n_above <= n_kept - 1) & (y[rows, at] < target)
+    # interpolated on Python floats and rounded with round(), as the per-shell loop did
+    result[crossing] = [
+        round(d1 + (d2 - d1) * (target - y1) / (y2 - y1), 3)
+        for y1, y2, d1, d2 in zip(y[rows, before][crossing].tolist(), y[rows, at][crossing].tolist(),
+                                  d[rows, before][crossing].tolist(), d[rows, at][crossing].tolist())
+    ]
+    return result
+
+
+def holds_to_edge_batch(values, d_values, target):
+    """
+    Whether the statistic still reaches the target in the outermost shell, judged on the
+    same shells as d_at_threshold_batch (so never where a crossing was found).
+
+    :param values: 2-D array (tables x shells) of the statistic, NaN-padded.
+    :param d_values: 2-D array of the same shape with d(A) of the shells.
+    :param target: Value of the statistic to look for (e.g. SNR=1, CC=0.3).
+    :return: 1-D boolean array per table.
+    """
+    y, _, n_kept = _monotone_shells(values, d_values)
+    last = y[np.arange(len(y)), np.maximum(n_kept - 1, 0)] if y.shape[1] else np.full(len(y), np.nan)
+    return (n_kept > 0) & (last >= target) & np.isnan(d_at_threshold_batch(values, d_values, target))
+
+
+def _monotone_shells(values, d_values):
+    """The shells kept by the monotone filter moved to the front: (values, d, number kept)."""
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    d_values = np.atleast_2d(np.asarray(d_values, dtype=float))
+    n_tables, n_shells = values.shape
+
+    # Monotone filter: keep a shell if it is below the running minimum of the shells before it
+    valid = ~(np.isnan(values) | np.isnan(d_values))
+    masked = np.where(valid, values, np.inf)
+    previous_min = np.concatenate(
+        [np.full((n_tables, 1), np.inf), np.minimum.accumulate(masked, axis=1)[:, :-1]], axis=1
+    )
+    kept = valid & (masked < previous_min)
+
+    # Move the kept shells to the front of every row, in their original order
+    order = np.argsort(~kept, axis=1, kind='stable')
+    n_kept = kept.sum(axis=1)
+    y = np.take_along_axis(values, order, axis=1)
+    d = np.take_along_axis(d_values, order, axis=1)
+    y[np.arange(n_shells) >= n_kept[:, None]] = np.nan
+    return y, d, n_kept
+
+
+def _as_optional_float(value):
+    return None if np.isnan(value) else float(value)
+
+
+def snr_columns(SNR_tables):
+    """
+    (SNR, d(A)) shell columns of many parsed SNR.dat tables (see read_shell_file), NaN-padded.
+
+    :param SNR_tables: Iterable of record arrays of SNR.dat files.
+    :return: Two 2-D arrays (tables x shells).
+    """
+    SNR_tables = [table for table in SNR_tables]
+    usable = [len(table.dtype.names) >= 9 for table in SNR_tables]
+    snr = pad_columns([shell_column(t, 6) if ok else [] for t, ok in zip(SNR_tables, usable)])
+    d = pad_columns([shell_column(t, 8) if ok else [] for t, ok in zip(SNR_tables, usable)])
+    return snr, d
+
+
+def cc_columns(CC_tables):
+    """
+    (CC, d(A)) shell columns of many parsed CC.dat tables (see read_shell_file), NaN-padded.
+
+    :param CC_tables: Iterable of record arrays of CC.dat files.
+    :return: Two 2-D arrays (tables x shells).
+    """
+    CC_tables = [table for table in CC_tables]
+    usable = [len(table.dtype.names) >= 5 for table in CC_tables]
+    cc = pad_columns([shell_column(t, 1) if ok else [] for t, ok in zip(CC_tables, usable)])
+    d = pad_columns([shell_column(t, 3) if ok else [] for t, ok in zip(CC_tables, usable)])
+    return cc, d
+
+
+def get_d_at_snr_one_batch(SNR_tables):
+    """
+    Get resolution at SNR=1 for many parsed SNR.dat tables (see read_shell_file) in one call.
+
+    :param SNR_tables: Iterable of record arrays of SNR.dat files.
+    :return: 1-D array of d(A) values, NaN where SNR=1 is not reached.
+    """
+    return d_at_threshold_batch(*snr_columns(SNR_tables), 1.0)
+
+
+def get_d_at_cc_threshold_batch(CC_tables, target_cc=0.3):
+    """
+    Get resolution at the target CC for many parsed CC.dat tables (see read_shell_file) in one call.
+
+    :param CC_tables: Iterable of record arrays of CC.dat files.
+    :param target_cc: The CC value for which d(A) is required. Default is 0.3.
+    :return: 1-D array of d(A) values, NaN where the target CC is not reached.
+    """
+    return d_at_threshold_batch(*cc_columns(CC_tables), target_cc)
+
+
 def get_d_at_snr_one(file_path):
     """
     Get resolution at SNR=1 using 
@@ -16,38 +156,7 @@ def get_d_at_snr_one(file_path):
     :param file_path: Path to the SNR.dat file.
     :return: The d(A) value at SNR=1, or None if not
             found or data is insufficient."""
-    data = []
-    
-    # Read data from file
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-        for line in lines[1:]:
-            parts = line.split()
-            if len(parts) < 9:
-                continue
-            try:
-                snr = float(parts[6])
-                d_value = float(parts[8])
-                data.append((snr, d_value))
-            except ValueError:
-                continue
-
-    # Filter only monotonically decreasing SNR
-    filtered_data = []
-    for i, (snr, d_value) in enumerate(data):
-        if i == 0 or snr < filtered_data[-1][0]:  # SNR must decrease
-            filtered_data.append((snr, d_value))
-
-    # Find d(A) at SNR=1 using linear interpolation
-    for i in range(len(filtered_data) - 1):
-        snr1, d1 = filtered_data[i]
-        snr2, d2 = filtered_data[i + 1]
-        if snr1 == 1.0:
-            return d1
-        if snr1 > 1.0 > snr2:  # Interpolate
-            return round(d1 + (d2 - d1) * (1.0 - snr1) / (snr2 - snr1), 3)
-
-    return None  # Return None if SNR=1 not found or data insufficient
+    return _as_optional_float(get_d_at_snr_one_batch([read_shell_file(file_path)])[0])
 
 
 def get_d_at_cc_threshold(file_path, target_cc=0.3):
@@ -58,39 +167,7 @@ def get_d_at_cc_threshold(file_path, target_cc=0.3):
     :param target_cc: The CC value for which d(A) is required. Default is 0.3.
     :return: The d(A) value corresponding to the target CC.
     """
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    # Skip the header and parse the rows
-    data = []
-    for line in lines[1:]:  # Skip the header
-        parts = line.split()
-        if len(parts) < 5:  # Ensure there are enough columns
-            continue
-        try:
-            cc = float(parts[1])  # CC column
-            d_value = float(parts[3])  # d(A) column
-            data.append((cc, d_value))
-        except ValueError:
-            continue
-
-    # Filter only monotonically decreasing CC values
-    filtered_data = []
-    for i, (cc, d_value) in enumerate(data):
-        if i == 0 or cc < filtered_data[-1][0]:  # CC must decrease
-            filtered_data.append((cc, d_value))
-
-    # Find the exact or interpolate for the target CC
-    for i in range(len(filtered_data) - 1):
-        cc1, d1 = filtered_data[i]
-        cc2, d2 = filtered_data[i + 1]
-        
-        if cc1 == target_cc:  # Exact match
-            return d1
-        if cc1 > target_cc > cc2:  # Interpolation
-            # Linear interpolation formula: d = d1 + (d2 - d1) * (target_cc - cc1) / (cc2 - cc1)
-            return round(d1 + (d2 - d1) * (target_cc - cc1) / (cc2 - cc1), 3)
-    return None  # Return None if target CC is out of range
+    return _as_optional_float(get_d_at_cc_threshold_batch([read_shell_file(file_path)], target_cc)[0])
 
 def get_xy(file_name, x_arg_name, y_arg_name):
     """
@@ -99,40 +176,115 @@ def get_xy(file_name, x_arg_name, y_arg_name):
     :param x_arg_name: Name of the x argument (e.g., 'd(A)').
     :param y_arg_name: Name of the y argument (e.g., 'CC').
     :return: Two numpy arrays containing the x and y values.
-    This function reads a file, extracts the x and y values based on the provided argument names,
-    and returns them as numpy arrays. It handles cases where the values might be NaN or zero.
-    It also constructs a DataFrame from the extracted values, ensuring that only valid entries are retained.
+    This function takes the x and y columns of the parsed shell file (see read_shell_file)
+    by the provided argument names and returns them as numpy arrays. NaN values are
+    replaced by zero and only entries with non-negative y are retained.
     
     """
     
-    x = []
-    y = []
-
-    with open(file_name, 'r') as stream:
-        for line in stream:
-            if y_arg_name in line:
-                tmp = line.replace('1/nm', '').replace('# ', '').replace('centre', '').replace('/ A', '').replace(' dev','').replace('(A)','')
-                tmp = tmp.split()
-                y_index = tmp.index(y_arg_name)
-                x_index = tmp.index(x_arg_name)
-
-            else:
-                tmp = line.split()
-                
-                x.append(float(tmp[x_index]) if not np.isnan(float(tmp[x_index])) else 0. )
-                y.append(float(tmp[y_index]) if not np.isnan(float(tmp[y_index])) else 0. )
-
-    x = np.array(x)
-    y = np.array(y)
-
-    list_of_tuples = list(zip(x, y))
-    
-    df = pd.DataFrame(list_of_tuples, 
-                columns = [x_arg_name, y_arg_name])
-    
-    df = df[df[y_arg_name].notna()]
-    df = df[df[y_arg_name] >= 0.]
-    return df[x_arg_name], df[y_arg_name]
+    return _xy(read_shell_file(file_name), x_arg_name, y_arg_name)
+
+def _xy(table, x_arg_name, y_arg_name):
+    x = np.nan_to_num(table[x_arg_name], nan=0.)
+    y = np.nan_to_num(table[y_arg_name], nan=0.)
+    valid = y >= 0.
+    return x[valid], y[valid]
+
+
+def max_res_from_Rsplit_CCstar_batch(d_CCstar, CCstar, Rsplit):
+    """
+    Vectorized CC*/Rsplit crossing for many shell tables.
+
+    For every row the first shell where Rsplit reaches CC* (in %) is found; if they
+    are equal there, its d(A) is returned, otherwise both curves are approximated by
+    lines through that shell and the previous one (or the origin for the first shell)
+    and their intersection is returned, scaled by 0.98.
+
+    :param d_CCstar: 2-D array (tables x shells) of d(A), NaN-padded.
+    :param CCstar: 2-D array of CC* values in %.
+    :param Rsplit: 2-D array of Rsplit values in %.
+    :return: 1-D array of resolutions, -1000 where the curves do not cross.
+    """
+    d = np.atleast_2d(np.asarray(d_CCstar, dtype=float))
+    C = np.atleast_2d(np.asarray(CCstar, dtype=float))
+    R = np.atleast_2d(np.asarray(Rsplit, dtype=float))
+    n_tables = d.shape[0]
+    n_shells = min(d.shape[1], C.shape[1], R.shape[1])
+    result = np.full(n_tables, -1000.)
+    if n_shells == 0:
+        return result
+    d, C, R = d[:, :n_shells], C[:, :n_shells], R[:, :n_shells]
+
+    defined = ~(np.isnan(d) | np.isnan(C) | np.isnan(R))
+    length = np.where(defined.all(axis=1), n_shells, np.argmin(defined, axis=1))
+    reached = R >= C
+    reached[:, 0] = R[:, 0] > C[:, 0]
+    reached &= np.arange(n_shells) < length[:, None]
+
+    found = reached.any(axis=1)
+    s = np.argmax(reached, axis=1)
+    rows = np.arange(n_tables)
+    C2, d2, R2 = C[rows, s], d[rows, s], R[rows, s]
+    previous = np.maximum(s - 1, 0)
+    first = s == 0
+    C1 = np.where(first, 0., C[rows, previous])
+    d1 = np.where(first, 0., d[rows, previous])
+    R1 = np.where(first, 0., R[rows, previous])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k1 = np.round((C2 - C1) / (d2 - d1), 3)
+        b1 = np.round((C1 * d2 - C2 * d1) / (d2 - d1), 3)
+        k2 = np.round((R2 - R1) / (d2 - d1), 3)
+        b2 = np.round((R1 * d2 - R2 * d1) / (d2 - d1), 3)
+        intersection = np.round(0.98 * (b2 - b1) / (k1 - k2), 3)
+
+    equal = ~first & (R2 == C2)
+    result[found] = np.where(equal, d2, intersection)[found]
+    return result
+
+
+def calculating_max_res_batch(CCstar_tables, Rsplit_tables):
+    """
+    CC*/Rsplit crossing for many parsed CCstar.dat/Rsplit.dat pairs (see read_shell_file) in one call.
+
+    :param CCstar_tables: Iterable of record arrays of CCstar.dat files.
+    :param Rsplit_tables: Iterable of record arrays of the matching Rsplit.dat files.
+    :return: 1-D array of resolutions, -1000 where the curves do not cross.
+    """
+    d_columns, CCstar_columns, Rsplit_columns = [], [], []
+    for CCstar_table, Rsplit_table in zip(CCstar_tables, Rsplit_tables):
+        d_CCstar, CCstar = _xy(CCstar_table, x_arg_name, y_arg_name)
+        _, Rsplit = _xy(Rsplit_table, x_arg_name, y_arg_name2)
+        d_columns.append(d_CCstar)
+        CCstar_columns.append(CCstar * 100)
+        Rsplit_columns.append(Rsplit)
+    return max_res_from_Rsplit_CCstar_batch(
+        pad_columns(d_columns), pad_columns(CCstar_columns), pad_columns(Rsplit_columns)
+    )
+
+
+def resolution_cutoffs_batch(CCstar_dat_files, target_cc=0.3):
+    """
+    Compute all resolution cut-offs for many runs in one call.
+
+    :param CCstar_dat_files: Paths to CCstar.dat files; the matching Rsplit, CC and SNR
+            files are expected next to them.
+    :param target_cc: The CC value for the CC cut-off. Default is 0.3.
+    :return: dict with 1-D arrays 'Resolution SNR=1', 'Resolution CC>=0.3' and
+            'CC* intersects with Rsplit at', in the order of CCstar_dat_files.
+    """
+    bases = [f[:-len("_CCstar.dat")] if f.endswith("_CCstar.dat") else os.path.splitext(f)[0]
+             for f in CCstar_dat_files]
+    CCstar_tables = [read_shell_file(f) for f in CCstar_dat_files]
+    Rsplit_tables = [read_shell_file(f"{base}_Rsplit.dat") for base in bases]
+    CC_tables = [read_shell_file(f"{base}_CC.dat") for base in bases]
+    SNR_tables = [read_shell_file(f"{base}_SNR.dat") for base in bases]
+    return {
+        'Resolution SNR=1': get_d_at_snr_one_batch(SNR_tables),
+        'Resolution CC>=0.3': get_d_at_cc_threshold_batch(CC_tables, target_cc),
+        'CC* intersects with Rsplit at': calculating_max_res_batch(CCstar_tables, Rsplit_tables),
+    }
+
 
 def calculating_max_res_from_Rsplit_CCstar_dat(CCstar_dat_file, Rsplit_dat_file):
     
@@ -147,36 +299,6 @@ def calculating_max_res_from_Rsplit_CCstar_dat(CCstar_dat_file, Rsplit_dat_file)
     It uses linear interpolation to find the resolution at which the CCstar value is equal to the Rsplit value.
     If the CCstar value is not found or the data is insufficient, it returns -1000.
     """
-    
-    d_CCstar, CCstar = get_xy(CCstar_dat_file, x_arg_name, y_arg_name)
-    CCstar *= 100
-    
-    d_Rsplit, Rsplit = get_xy(Rsplit_dat_file, x_arg_name, y_arg_name2)
-    
-    i = 0
-
-    CC2, d2 = CCstar[0], d_CCstar[0]
-    CC1, d1 = 0., 0.
-
-    Rsplit2 = Rsplit[0]
-    Rsplit1 = 0.
-
-    while Rsplit[i]<=CCstar[i] and i < len(d_CCstar):
-        CC1, d1, Rsplit1 = CC2, d2, Rsplit2
-        i+=1
-        try:
-            CC2, d2, Rsplit2 = CCstar[i], d_CCstar[i], Rsplit[i]
-        except:
-            return -1000            
-        if Rsplit[i]==CCstar[i]:
-            resolution = d_CCstar[i]
-            return resolution
-            
-    k1 = round((CC2-CC1)/(d2-d1),3)
-    b1 = round((CC1*d2-CC2*d1)/(d2-d1),3)     
-
-    k2 = round((Rsplit2-Rsplit1)/(d2-d1),3)
-    b2 = round((Rsplit1*d2-Rsplit2*d1)/(d2-d1),3)
-
-    resolution = round(0.98*(b2-b1)/(k1-k2),3)
-    return resolution
+    return float(calculating_max_res_batch(
+        [read_shell_file(CCstar_dat_file)], [read_shell_file(Rsplit_dat_file)]
+    )[0])
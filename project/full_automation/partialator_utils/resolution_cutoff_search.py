@@ -0,0 +1,197 @@
+import os
+import hashlib
+from functools import lru_cache
+import numpy as np
+
+from partialator_utils.partialator_execution import run_partialator, get_output_base
+from partialator_utils.parsing_shell_files import read_shell_file
+from partialator_utils.resolution_cutoff_determination import (
+    d_at_threshold_batch, holds_to_edge_batch, snr_columns, cc_columns,
+    calculating_max_res_from_Rsplit_CCstar_dat
+)
+from partialator_utils.wait_for_file import wait_for_files
+from run_processing_utils.pipeline_metrics import get_pipeline_metrics
+
+CRITERIA = ('cc', 'snr', 'ccstar_rsplit')
+TARGET_CC = 0.3
+TARGET_SNR = 1.0
+TOLERANCE = 0.03  # Angstrom
+INITIAL_STEP = 0.2  # Angstrom, first move towards higher resolution if the criterion is not reached
+MAX_EVALUATIONS = 4
+EVALUATION_TIMEOUT = 12 * 3600  # seconds, the wall time of the statistics job
+
+
+def criterion_resolution(criterion, output_base):
+    """
+    Evaluate a cut-off criterion on the shell files of one statistics run.
+
+    Args:
+        criterion (str): 'cc' (CC1/2 = 0.3), 'snr' (<SNR> = 1) or 'ccstar_rsplit' (CC* = Rsplit).
+        output_base (str): Path prefix of the shell files (see get_output_base).
+    Returns:
+        tuple: (d, extends) where d is the resolution in Angstrom at which the criterion
+        is met inside the computed shells (None if it is not), and extends is True if the
+        outermost shell still satisfies the criterion, i.e. the data go beyond the cut-off.
+        Both come from the same shells and columns as the reported resolutions (see
+        get_d_at_snr_one and get_d_at_cc_threshold).
+    """
+    if criterion == 'ccstar_rsplit':
+        d = calculating_max_res_from_Rsplit_CCstar_dat(f"{output_base}_CCstar.dat", f"{output_base}_Rsplit.dat")
+        if d == -1000:
+            return None, True
+        return (float(d) if np.isfinite(d) else None), False  # NaN if the fits do not intersect
+
+    if criterion == 'cc':
+        (values, d_values), target = cc_columns([read_shell_file(f"{output_base}_CC.dat")]), TARGET_CC
+    elif criterion == 'snr':
+        (values, d_values), target = snr_columns([read_shell_file(f"{output_base}_SNR.dat")]), TARGET_SNR
+    else:
+        raise ValueError(f"Unknown criterion {criterion}, expected one of {CRITERIA}")
+
+    d = d_at_threshold_batch(values, d_values, target)[0]
+    extends = holds_to_edge_batch(values, d_values, target)[0]
+    return (None if np.isnan(d) else float(d)), bool(extends)
+
+
+@lru_cache(maxsize=256)
+def _settings_digest(pdb, mtime_ns, size, pg, nsh):
+    digest = hashlib.sha256(f"{pg}:{nsh}:".encode())
+    if pdb:
+        with open(pdb, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:8]
+
+
+def evaluation_suffix(context, highres, nsh):
+    """
+    Suffix of the statistics files of one evaluation.
+
+    Besides the cut-off it holds the number of shells and a digest of the pdb content and
+    the point group, so files of a run with other settings are never taken for up to date.
+    """
+    if context.pdb and os.path.exists(context.pdb):
+        stat = os.stat(context.pdb)
+        key = (os.path.abspath(context.pdb), stat.st_mtime_ns, stat.st_size)
+    else:
+        key = (None, 0, 0)
+    return f"auto_{highres}_nsh{nsh}_{_settings_digest(*key, context.pg, nsh)}"
+
+
+def _is_up_to_date(output_base, hkl_input_file):
+    """Statistics of a previous evaluation at the same cut-off can be reused."""
+    files = [f"{output_base}_{kind}.dat" for kind in ('CCstar', 'Rsplit', 'CC', 'SNR')]
+    try:
+        hkl_mtime = os.path.getmtime(hkl_input_file)
+        return all(os.path.getsize(f) > 0 and os.path.getmtime(f) >= hkl_mtime for f in files)
+    except OSError:
+        return False
+
+
+def evaluate_cutoff(context, highres, criterion, nsh=10, evaluations=None):
+    """
+    Compute statistics with the given high resolution cut-off and evaluate the criterion.
+
+    Results are cached in `evaluations` by cut-off, and statistics already on disk for the
+    same cut-off, number of shells, pdb and point group are reused without submitting a
+    new job (see evaluation_suffix).
+
+    Returns:
+        tuple: (d, extends, output_base), see criterion_resolution.
+    """
+    highres = round(highres, 3)
+    if evaluations is not None and highres in evaluations:
+        return evaluations[highres]
+
+    suffix = evaluation_suffix(context, highres, nsh)
+    output_base = get_output_base(context.hkl_input_file, suffix)
+    metrics = get_pipeline_metrics()
+    if not _is_up_to_date(output_base, context.hkl_input_file):
+        CCstar_dat_file, _ = run_partialator(
+            context.hkl_input_file, highres, context.pg, context.pdb, nsh, suffix
+        )
+        if CCstar_dat_file is None:
+            raise FileNotFoundError(f"Statistics cannot be calculated for {context.hkl_input_file}")
+        # every evaluation is its own job, timed under its output base
+        metrics.job_submitted(output_base, output_base)
+
+    shell_files = [f"{output_base}_{kind}.dat" for kind in ('CCstar', 'Rsplit', 'CC', 'SNR')]
+    if not wait_for_files(shell_files, timeout=EVALUATION_TIMEOUT):
+        raise TimeoutError(f"Shell files did not appear for {output_base}")
+    metrics.job_finished(output_base)
+
+    result = (*criterion_resolution(criterion, output_base), output_base)
+    if evaluations is not None:
+        evaluations[highres] = result
+    return result
+
+
+def search_resolution_cutoff(context, criterion='cc', nsh=10, start=None,
+                             tolerance=TOLERANCE, max_evaluations=MAX_EVALUATIONS):
+    """
+    Find the high resolution cut-off at which the criterion is met in a few statistics jobs.
+
+    Starting from the Phenix or fallback cut-off of the hkl context, every evaluation either
+    meets the criterion inside the shells (the cut-off is too ambitious; the crossing is the
+    next guess) or not at all (the cut-off is conservative; move to higher resolution, or
+    bisect once both sides are known). The search stops when the crossing lies within
+    `tolerance` of the cut-off, when the bracket is narrower than `tolerance`, or after
+    `max_evaluations` jobs.
+
+    Args:
+        context (HklContext): Per-hkl context from build_hkl_context.
+        criterion (str): 'cc', 'snr' or 'ccstar_rsplit'.
+        nsh (int): Number of shells.
+        start (float): Initial cut-off; defaults to context.resolution_cut_off_high.
+        tolerance (float): Convergence tolerance in Angstrom.
+        max_evaluations (int): Maximum number of statistics jobs.
+    Returns:
+        tuple: (highres, output_base) of the best evaluated cut-off; the shell files and the
+        .err file of that evaluation are `{output_base}_*.dat` and `{output_base}.err`.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion {criterion}, expected one of {CRITERIA}")
+
+    highres = start if start is not None else context.resolution_cut_off_high
+    evaluations = {}
+    conservative = None  # (highres, output_base) where the criterion holds up to the edge
+    ambitious = None     # largest cut-off known to go beyond the criterion
+    latest = None        # (highres, output_base) of the latest evaluation going beyond the criterion
+    crossing = None      # latest predicted crossing of the criterion
+    step = INITIAL_STEP
+
+    for _ in range(max_evaluations):
+        d, extends, output_base = evaluate_cutoff(context, highres, criterion, nsh, evaluations)
+        print(f"{context.run_name}: highres {highres} -> {criterion} crossing {d}")
+
+        if extends:
+            conservative = (highres, output_base)
+            if crossing is not None and abs(crossing - highres) <= tolerance:
+                # evaluated at the predicted crossing and the criterion holds up to it
+                break
+            if ambitious is None:
+                next_highres = highres - step
+                step *= 2
+            else:
+                next_highres = (highres + ambitious) / 2
+        elif d is None:
+            # the criterion is not met even in the lowest resolution shell, nothing to refine
+            latest = latest or (highres, output_base)
+            break
+        else:
+            if d - highres <= tolerance:
+                return highres, output_base
+            if conservative is not None and abs(d - conservative[0]) <= tolerance:
+                break
+            ambitious = highres if ambitious is None else max(ambitious, highres)
+            latest = (highres, output_base)
+            crossing = next_highres = d
+            if conservative is not None and next_highres >= conservative[0]:
+                next_highres = (conservative[0] + ambitious) / 2
+
+        if conservative is not None and ambitious is not None and conservative[0] - ambitious < tolerance:
+            break
+        if next_highres <= 0:
+            break
+        highres = round(next_highres, 3)
+
+    return conservative if conservative is not None else latest
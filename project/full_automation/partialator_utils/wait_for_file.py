@@ -0,0 +1,294 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from concurrent.futures import Future
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO  # a file is only handed over once completely written
+
+EVENT_HEADER = struct.Struct('iIII')
+POLL_INTERVAL = 2.0  # seconds; files written from other nodes (GPFS/NFS) are only seen by polling
+
+
+def _inotify_init():
+    if not sys.platform.startswith('linux'):
+        return None, -1
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None, -1
+    return (libc, fd) if fd >= 0 else (None, -1)
+
+
+def file_is_ready(filepath):
+    """Default readiness check: the file exists and is not empty.
+
+    The service additionally requires the file to be completely written (see
+    FileReadinessService), so a file is never parsed while it is still being written.
+    """
+    try:
+        return os.stat(filepath).st_size > 0
+    except OSError:
+        return False
+
+
+class LineAppeared:
+    """Readiness check for a line appearing in a growing file.
+
+    Only the bytes appended since the previous check are read, so a log that is
+    checked many times is still read once in total.
+    """
+
+    def __init__(self, line_for_checking):
+        self.needle = line_for_checking.encode()
+        self.offset = 0
+        self.tail = b''
+
+    def __call__(self, filepath):
+        try:
+            with open(filepath, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < self.offset:  # truncated or replaced
+                    self.offset, self.tail = 0, b''
+                f.seek(self.offset)
+                chunk = f.read(size - self.offset)
+        except OSError:
+            return False
+        self.offset += len(chunk)
+        data = self.tail + chunk
+        if self.needle in data:
+            return True
+        self.tail = data[-len(self.needle):]
+        return False
+
+
+class _Waiter:
+    __slots__ = ('path', 'check', 'deadline', 'future', 'size')
+
+    def __init__(self, path, check, deadline):
+        self.path = path
+        self.check = check
+        self.deadline = deadline
+        self.future = Future()
+        self.size = None  # size at the previous poll
+
+
+class FileReadinessService:
+    """Shared watcher that resolves futures as soon as awaited files are ready.
+
+    One background thread serves every waiter. On Linux it sleeps on inotify
+    (IN_CLOSE_WRITE and IN_MOVED_TO on the parent folders of the awaited files) and
+    re-checks the affected files only; every `poll_interval` seconds, and on platforms
+    without inotify, all pending files are checked as a fallback.
+
+    With the default check a file is ready once it is not empty and completely written:
+    it was closed after writing or moved into place, or (files written on other nodes,
+    platforms without inotify) its size did not change between two polls or it was last
+    modified at least `poll_interval` seconds ago. Other checks, e.g. LineAppeared, are
+    evaluated as they are.
+
+    Args:
+        poll_interval (float): Seconds between fallback checks of all pending files.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._libc, self._fd = _inotify_init()
+        self._watches = {}    # folder -> watch descriptor
+        self._wd_folders = {}  # watch descriptor -> folder
+        self._waiters = {}    # folder -> list of _Waiter
+        self._lock = threading.Lock()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._thread = None
+
+    def _add_watch(self, folder):
+        if self._libc is None or folder in self._watches:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+        if wd >= 0:
+            self._watches[folder] = wd
+            self._wd_folders[wd] = folder
+
+    def _remove_watch(self, folder):
+        wd = self._watches.pop(folder, None)
+        if wd is not None:
+            self._wd_folders.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def submit(self, filepath, check=file_is_ready, timeout=None):
+        """Return a Future resolved with True once check(filepath) holds, or False on timeout."""
+        filepath = os.path.abspath(filepath)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        waiter = _Waiter(filepath, check, deadline)
+        if self._ready(waiter, polled=True):
+            waiter.future.set_result(True)
+            return waiter.future
+
+        folder = os.path.dirname(filepath)
+        with self._lock:
+            self._waiters.setdefault(folder, []).append(waiter)
+            self._add_watch(folder)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='file-readiness', daemon=True)
+                self._thread.start()
+        os.write(self._wakeup_w, b'\0')
+        return waiter.future
+
+    def wait(self, filepath, check=file_is_ready, timeout=None):
+        """Block until check(filepath) holds; return False if the timeout expired first."""
+        return self.submit(filepath, check, timeout).result()
+
+    def wait_all(self, filepaths, check=file_is_ready, timeout=None):
+        """Block until all files are ready; return False if any of them timed out."""
+        futures = [self.submit(filepath, check, timeout) for filepath in filepaths]
+        return all(future.result() for future in futures)
+
+    def _ready(self, waiter, closed=(), polled=False):
+        if waiter.check is not file_is_ready:
+            return waiter.check(waiter.path)
+        try:
+            stat = os.stat(waiter.path)
+        except OSError:
+            return False
+        stable = polled and stat.st_size == waiter.size
+        if polled:
+            waiter.size = stat.st_size
+        return stat.st_size > 0 and (
+            waiter.path in closed or stable or time.time() - stat.st_mtime >= self.poll_interval
+        )
+
+    def _read_events(self):
+        """Folders with events and the paths of the files closed after writing or moved in."""
+        folders, closed = set(), set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            offset = 0
+            while offset < len(buffer):
+                wd, _, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                name = buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += EVENT_HEADER.size + length
+                if wd in self._wd_folders:
+                    folder = self._wd_folders[wd]
+                    folders.add(folder)
+                    if name:
+                        closed.add(os.path.join(folder, os.fsdecode(name)))
+        return folders, closed
+
+    def _check(self, folders, now, closed=(), polled=False):
+        resolved = []
+        with self._lock:
+            for folder in folders:
+                pending = []
+                for waiter in self._waiters.get(folder, []):
+                    if self._ready(waiter, closed, polled):
+                        resolved.append((waiter, True))
+                    elif waiter.deadline is not None and now >= waiter.deadline:
+                        resolved.append((waiter, False))
+                    else:
+                        pending.append(waiter)
+                if pending:
+                    self._waiters[folder] = pending
+                    self._add_watch(folder)  # the folder may not have existed before
+                else:
+                    self._waiters.pop(folder, None)
+                    self._remove_watch(folder)
+        for waiter, result in resolved:
+            waiter.future.set_result(result)
+
+    def _next_timeout(self, now):
+        with self._lock:
+            deadlines = [
+                waiter.deadline for waiters in self._waiters.values()
+                for waiter in waiters if waiter.deadline is not None
+            ]
+        return max(0., min([self.poll_interval] + [deadline - now for deadline in deadlines]))
+
+    def _run(self):
+        last_poll = time.monotonic()
+        while True:
+            now = time.monotonic()
+            readable_fds = [self._wakeup_r] + ([self._fd] if self._libc is not None else [])
+            readable, _, _ = select.select(readable_fds, [], [], self._next_timeout(now))
+            if self._wakeup_r in readable:
+                os.read(self._wakeup_r, 4096)
+            folders, closed = self._read_events() if self._fd in readable else (set(), set())
+
+            now = time.monotonic()
+            polled = now - last_poll >= self.poll_interval
+            if polled:
+                with self._lock:
+                    folders = set(self._waiters)
+                last_poll = now
+            else:
+                with self._lock:
+                    folders |= {
+                        folder for folder, waiters in self._waiters.items()
+                        if any(waiter.deadline is not None and now >= waiter.deadline for waiter in waiters)
+                    }
+            self._check(folders, now, closed, polled)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_readiness_service():
+    """Return the process-wide FileReadinessService."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = FileReadinessService()
+        return _service
+
+
+def wait_for_file(filepath, timeout=None):
+    """
+    Waits until the file exists, is not empty and is completely written.
+
+    Args:
+        filepath (str): Path to the file being awaited.
+        timeout (float): Maximum time to wait in seconds, None to wait forever.
+
+    Returns:
+        bool: True if the file is ready, False if the timeout expired.
+    """
+    return get_readiness_service().wait(filepath, timeout=timeout)
+
+
+def wait_for_files(filepaths, timeout=None):
+    """Waits until all files exist, are not empty and are completely written; False if any of them timed out."""
+    return get_readiness_service().wait_all(filepaths, timeout=timeout)
+
+
+def wait_for_line(filename, line_for_checking, max_attempts=10, delay=2.0):
+    """
+    Waits for a specific line to appear in the file. Stops after max_attempts * delay seconds.
+
+    Args:
+        filename (str): Path to the file being monitored.
+        line_for_checking (str): The line to look for in the file.
+        max_attempts (int): Kept for compatibility, together with delay defines the timeout.
+        delay (float): Kept for compatibility, together with max_attempts defines the timeout.
+
+    Returns:
+        bool: True if the line is found, False if the line does not appear in time.
+    """
+    found = get_readiness_service().wait(
+        filename, check=LineAppeared(line_for_checking), timeout=max_attempts * delay
+    )
+    if not found:
+        print(f"Line '{line_for_checking}' not found after {max_attempts * delay} seconds. Exiting.")
+    return found
@@ -1,39 +1,101 @@
 import os
 import subprocess
 import re
+import tempfile
+import concurrent.futures
 from pathlib import Path
 
-def generate_density_image(pdb_path, map_path, output_image):
-    script = f"""
+from run_processing_utils.mtz_conversion import get_mtz_conversion_stage, get_mtz_path
+
+RENDER_PROCESSES = 2
+
+DENSITY_SCRIPT = """
+reinitialize
 load {pdb_path}, model
 load {map_path}, map
 isomesh mesh, map, level=1.0, carve=1.6, model
 orient
 ray 800, 600
 png {output_image}
-quit
 """
-    with open("pymol_script.pml", "w") as f:
-        f.write(script)
 
-    subprocess.run(["pymol", "-cq", "pymol_script.pml"])
-    os.remove("pymol_script.pml")
+
+def _is_rendered(pdb_path, map_path, output_image):
+    try:
+        return os.path.getmtime(output_image) >= max(os.path.getmtime(pdb_path), os.path.getmtime(map_path))
+    except OSError:
+        return False
+
+
+def _run_pymol_session(tasks, folder):
+    """Render tasks one after another in a single PyMOL process."""
+    task_scripts = []
+    for pdb_path, map_path, output_image in tasks:
+        fd, task_script = tempfile.mkstemp(suffix='.pml', dir=folder)
+        with os.fdopen(fd, 'w') as f:
+            f.write(DENSITY_SCRIPT.format(pdb_path=pdb_path, map_path=map_path, output_image=output_image))
+        task_scripts.append(task_script)
+    fd, session_script = tempfile.mkstemp(suffix='.pml', dir=folder)
+    with os.fdopen(fd, 'w') as f:
+        f.writelines(f"@{task_script}\n" for task_script in task_scripts)
+        f.write("quit\n")
+    try:
+        return subprocess.run(["pymol", "-cq", session_script]).returncode
+    finally:
+        for script in task_scripts + [session_script]:
+            os.remove(script)
+
+
+def render_density_images(tasks, processes=RENDER_PROCESSES):
+    """
+    Render density images for many refinements in a few long-lived PyMOL sessions.
+
+    Tasks whose image is newer than its model and map are skipped. The rest is split
+    over `processes` PyMOL processes running at the same time; each task gets its own
+    temporary script, so concurrent renders never share a file.
+
+    :param tasks: iterable of (pdb_path, map_path, output_image)
+    :param processes: number of PyMOL processes
+    :returns: list of the output images that were rendered
+    """
+    pending = [tuple(map(str, task)) for task in tasks if not _is_rendered(*task)]
+    if not pending:
+        return []
+    processes = max(1, min(processes, len(pending)))
+    chunks = [pending[i::processes] for i in range(processes)]
+    with tempfile.TemporaryDirectory(prefix='pymol_') as folder:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(lambda chunk: _run_pymol_session(chunk, folder), chunks))
+    return [output_image for _, _, output_image in pending if os.path.exists(output_image)]
+
+
+def generate_density_image(pdb_path, map_path, output_image):
+    render_density_images([(pdb_path, map_path, output_image)], processes=1)
+
+
+def density_image_task(mtz, pdb):
+    """(pdb, map, output image) of the density image for the DIMPLE run of this mtz."""
+    base = Path(mtz).stem
+    out_dir = Path(mtz).parent / f"{base}_dimple_out"
+    return pdb, out_dir / f"{base}_map_coefficients.mtz", out_dir / f"{base}_density_image.png"
 
 
-def dimple_execution(mtz, pdb, highres_cutoff=None):
+def dimple_execution(mtz, pdb, highres_cutoff=None, launcher=None, render=True):
     """
     Run DIMPLE rough refinement on input MTZ + PDB files.
 
     :param hkl_input_file: path to .mtz file
     :param highres_cutoff: optional resolution cutoff (Å), e.g. 2.0
+    :param launcher: optional command prefix to run DIMPLE with, e.g. ['srun', ...]
+    :param render: render the density image right away (see render_density_images for batches)
     :returns: (rwork, rfree, resolution_high, resolution_low)
     """
 
     if mtz.endswith('.hkl'):
-        # Convert to MTZ if UC file exists
-        mtz_file = mtz.replace("hkl", "mtz")
-        mtz_command = f'get_hkl -i {mtz} -p {pdb} -o {mtz_file} --output-format=mtz | tee conversion_log.txt'
-        os.system(mtz_command)
+        # Convert to MTZ through the shared conversion stage (skipped if up to date)
+        mtz_file, returncode = get_mtz_conversion_stage().submit(mtz, pdb, get_mtz_path(mtz)).result()
+        if returncode != 0:
+            raise RuntimeError(f"Conversion of {mtz} to mtz failed")
         mtz = mtz_file
 
     
@@ -44,7 +106,7 @@ def dimple_execution(mtz, pdb, highres_cutoff=None):
     out_dir = Path(mtz).parent / f"{base}_dimple_out"
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    cmd = ['dimple', '--mapconvert=1', '--no-cleanup', '--loglevel=debug']
+    cmd = list(launcher or []) + ['dimple', '--mapconvert=1', '--no-cleanup', '--loglevel=debug']
     if highres_cutoff:
         cmd.append(f'--highres={highres_cutoff}')
     cmd += [mtz, pdb, str(out_dir)]
@@ -79,6 +141,7 @@ def dimple_execution(mtz, pdb, highres_cutoff=None):
                 if m:
                     res_lo = float(m.group(1))
                     res_hi = float(m.group(2))
-    generate_density_image(pdb, out_dir / f"{base}_map_coefficients.mtz", out_dir / f"{base}_density_image.png")
+    if render:
+        generate_density_image(*density_image_task(mtz, pdb))
     
     return rwork, rfree, res_hi, res_lo
@@ -0,0 +1,120 @@
+import os
+import time
+import threading
+
+INDEX_MAX_AGE = 60  # seconds before a lookup triggers an incremental refresh
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class PhenixResultsIndex:
+    """Index of the newest Phenix .pdb/.log file per refinement folder.
+
+    The refinement area (Rfree_Rwork_path) is laid out as one top-level folder per run,
+    e.g. `{Rfree_Rwork_path}/*{run}*/**/*.pdb`. Instead of globbing this tree for every run,
+    the index walks it once and keeps, for every top-level folder, the newest pdb and log
+    (by ctime) together with the mtimes of all directories it visited. A refresh only
+    re-walks the folders whose directories changed since the last walk.
+
+    Args:
+        root (str): Path to the folder with refinement results.
+        max_age (float): Age of the index in seconds after which a lookup refreshes it.
+    """
+
+    def __init__(self, root, max_age=INDEX_MAX_AGE):
+        self.root = root
+        self.max_age = max_age
+        self._newest = {}      # folder name -> {'pdb': (ctime, path), 'log': (ctime, path)}
+        self._dir_mtimes = {}  # folder name -> {dirpath: st_mtime_ns}
+        self._matches = {}     # run name -> tuple of folder names containing it
+        self._refreshed_at = 0.
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _scan_folder(self, name):
+        newest = {}
+        dir_mtimes = {}
+        for dirpath, dirnames, filenames in os.walk(os.path.join(self.root, name)):
+            # glob('**') does not descend into hidden folders, neither do we
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            try:
+                dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            for filename in filenames:
+                ext = os.path.splitext(filename)[1][1:]
+                if ext not in ('pdb', 'log') or filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    ctime = os.path.getctime(path)
+                except OSError:
+                    continue
+                if ext not in newest or ctime > newest[ext][0]:
+                    newest[ext] = (ctime, path)
+        self._newest[name] = newest
+        self._dir_mtimes[name] = dir_mtimes
+
+    def _is_stale(self, name):
+        for dirpath, mtime in self._dir_mtimes[name].items():
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def refresh(self):
+        """Re-walk only new or modified top-level folders and drop the removed ones."""
+        with self._lock:
+            try:
+                names = {
+                    entry.name for entry in os.scandir(self.root)
+                    if entry.is_dir() and not entry.name.startswith('.')
+                }
+            except OSError:
+                names = set()
+
+            if names != set(self._newest):
+                self._matches.clear()
+            for name in set(self._newest) - names:
+                del self._newest[name]
+                del self._dir_mtimes[name]
+            for name in names:
+                if name not in self._newest or self._is_stale(name):
+                    self._scan_folder(name)
+            self._refreshed_at = time.monotonic()
+
+    def _lookup(self, run_name):
+        folders = self._matches.get(run_name)
+        if folders is None:
+            folders = tuple(name for name in self._newest if run_name in name)
+            self._matches[run_name] = folders
+        for ext in ('pdb', 'log'):
+            candidates = [self._newest[name][ext] for name in folders if ext in self._newest[name]]
+            if candidates:
+                return max(candidates)[1]
+        return None
+
+    def newest(self, run_name):
+        """Return the newest Phenix pdb (or, if there is none, log) for the run.
+
+        Args:
+            run_name (str): Name of the run, matched as `*{run_name}*` against folder names.
+        Returns:
+            str: Path to the newest pdb/log file, or None if nothing was found.
+        """
+        if time.monotonic() - self._refreshed_at > self.max_age:
+            self.refresh()
+        with self._lock:
+            return self._lookup(run_name)
+
+
+def get_phenix_results_index(root):
+    """Return the shared PhenixResultsIndex for the given refinement folder."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = PhenixResultsIndex(root)
+        return _indexes[root]
@@ -0,0 +1,159 @@
+import os
+import json
+import math
+import hashlib
+import threading
+import concurrent.futures
+from functools import lru_cache
+
+from refinment_utils.dimple import dimple_execution, density_image_task, render_density_images, RENDER_PROCESSES
+from run_processing_utils.mtz_conversion import get_mtz_conversion_stage, get_mtz_path
+from run_processing_utils.pipeline_metrics import get_pipeline_metrics
+
+REFINEMENT_WORKERS = 4
+BACKENDS = ('local', 'slurm')
+SRUN_OPTIONS = ['--partition=short,upex,allcpu', '--time=12:00:00', '--nodes=1', '--nice=100']
+CACHE_FOLDER = '.refinement_cache'  # next to the mtz file, one json per refinement key
+RENDER_BATCH = 8  # density images rendered together in one batch of PyMOL sessions
+RENDER_INTERVAL = 600  # seconds, a smaller batch is rendered when the oldest task waited this long
+
+
+@lru_cache(maxsize=4096)
+def _file_digest(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """sha256 of the file content, computed once per (path, mtime, size)."""
+    stat = os.stat(path)
+    return _file_digest(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def refinement_key(mtz, pdb, highres_cutoff):
+    """Cache key of a refinement: content of the mtz and pdb files and the cut-off."""
+    highres = '' if highres_cutoff is None else f"{highres_cutoff:.3f}"
+    return hashlib.sha256(f"{file_digest(mtz)}:{file_digest(pdb)}:{highres}".encode()).hexdigest()
+
+
+def _cache_path(mtz, key):
+    return os.path.join(os.path.dirname(os.path.abspath(mtz)), CACHE_FOLDER, f"{key}.json")
+
+
+def load_cached_refinement(mtz, key):
+    try:
+        with open(_cache_path(mtz, key)) as f:
+            return tuple(json.load(f)['result'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def store_cached_refinement(mtz, key, result):
+    path = _cache_path(mtz, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'result': list(result)}, f)
+    os.replace(tmp_path, path)
+
+
+class RefinementQueue:
+    """Runs DIMPLE refinements concurrently and reports results as they finish.
+
+    Each submitted run is converted to mtz (through the shared conversion stage),
+    looked up in the cache keyed by the mtz and pdb content and the high resolution
+    cut-off, and otherwise refined with DIMPLE, either as a local process or as a
+    SLURM job step (`srun`). When a refinement finishes, its values are written into
+    the RunStats record and `on_result(stats)` is called, e.g. ResultSink.update.
+    Density images are rendered in batches of PyMOL sessions in the background: every
+    `render_batch` finished refinements, after `render_interval` seconds, and on shutdown.
+
+    Args:
+        max_workers (int): Number of refinements running at the same time.
+        backend (str): 'local' or 'slurm'.
+        on_result (callable): Called with the updated RunStats record.
+        render_processes (int): PyMOL sessions rendering a batch in parallel.
+        render_batch (int): Number of density images rendered together.
+        render_interval (float): Maximum seconds a density image waits for its batch.
+    """
+
+    def __init__(self, max_workers=REFINEMENT_WORKERS, backend='local', on_result=None,
+                 render_processes=RENDER_PROCESSES, render_batch=RENDER_BATCH, render_interval=RENDER_INTERVAL):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+        self.launcher = ['srun'] + SRUN_OPTIONS if backend == 'slurm' else None
+        self.on_result = on_result
+        self.render_processes = render_processes
+        self.render_batch = render_batch
+        self.render_interval = render_interval
+        self._render_tasks = []
+        self._render_timer = None  # renders a partial batch after render_interval seconds
+        self._render_lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='refinement')
+        # one batch at a time, so rendering does not hold back the refinements
+        self._render_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='density-render')
+
+    def submit(self, stats, hkl_file, pdb, highres_cutoff=None):
+        """Schedule the refinement of a run; returns a Future with (rwork, rfree, res_high, res_low)."""
+        if highres_cutoff is not None and not (math.isfinite(highres_cutoff) and highres_cutoff > 0):
+            highres_cutoff = None  # no CC*/Rsplit crossing was found (-1000 or NaN)
+        return self._executor.submit(self._refine, stats, hkl_file, pdb, highres_cutoff)
+
+    def _refine(self, stats, hkl_file, pdb, highres_cutoff):
+        try:
+            mtz = hkl_file
+            if hkl_file.endswith('.hkl'):
+                mtz, returncode = get_mtz_conversion_stage().submit(hkl_file, pdb, get_mtz_path(hkl_file)).result()
+                if returncode != 0:
+                    raise RuntimeError(f"Conversion of {hkl_file} to mtz failed")
+            key = refinement_key(mtz, pdb, highres_cutoff)
+            result = load_cached_refinement(mtz, key)
+            if result is None:
+                with get_pipeline_metrics().stage('refinement'):
+                    result = dimple_execution(mtz, pdb, highres_cutoff, launcher=self.launcher, render=False)
+                store_cached_refinement(mtz, key, result)
+            else:
+                print(f"Refinement of {stats.run} is taken from the cache")
+            self._add_render_task(density_image_task(mtz, pdb))
+        except Exception as e:
+            print(f"[ERROR] refinement failed for {stats.run}: {e}")
+            stats.comment = f'Refinement failed: {e}'
+            result = None
+        else:
+            stats.Rwork, stats.Rfree, stats.refinement_high, stats.refinement_low = result
+        if self.on_result is not None:
+            self.on_result(stats)
+        return result
+
+    def _add_render_task(self, task):
+        with self._render_lock:
+            self._render_tasks.append(task)
+            if self._render_timer is None:
+                # a partial batch is rendered at the latest render_interval seconds after its first task
+                self._render_timer = threading.Timer(self.render_interval, self._render_pending)
+                self._render_timer.daemon = True
+                self._render_timer.start()
+            due = len(self._render_tasks) >= self.render_batch
+        if due:
+            self._render_pending()
+
+    def _render_pending(self):
+        """Hand the collected density image tasks to the render worker as one batch."""
+        with self._render_lock:
+            tasks, self._render_tasks = self._render_tasks, []
+            if self._render_timer is not None:
+                self._render_timer.cancel()
+                self._render_timer = None
+        if tasks:
+            self._render_executor.submit(render_density_images, tasks, self.render_processes)
+
+    def shutdown(self, wait=True):
+        """Wait for the scheduled refinements, render the remaining density images and stop the workers."""
+        self._executor.shutdown(wait=wait)
+        self._render_pending()
+        self._render_executor.shutdown(wait=wait)
@@ -0,0 +1,106 @@
+import os
+import subprocess
+import threading
+import concurrent.futures
+
+MTZ_WORKERS = 4
+
+
+def get_mtz_path(hkl_file):
+    """Path of the mtz file converted from the hkl file (same folder and name)."""
+    return os.path.splitext(hkl_file)[0] + '.mtz'
+
+
+def get_mtz_command(hkl_file, UC_file, mtz_file):
+    return f'get_hkl -i {hkl_file} -p {UC_file} -o {mtz_file} --output-format=mtz'
+
+
+def is_up_to_date(mtz_file, *sources):
+    """The mtz file exists, is not empty and is newer than all of its sources."""
+    try:
+        mtz_stat = os.stat(mtz_file)
+        return mtz_stat.st_size > 0 and all(mtz_stat.st_mtime >= os.path.getmtime(source) for source in sources)
+    except OSError:
+        return False
+
+
+def convert_to_mtz(hkl_file, UC_file, mtz_file):
+    """
+    Convert a CrystFEL reflection file to mtz with get_hkl.
+
+    The output of get_hkl goes to `{mtz without extension}_get_hkl.log`.
+
+    Returns:
+        tuple: (mtz_file, returncode)
+    """
+    log_file = os.path.splitext(mtz_file)[0] + '_get_hkl.log'
+    with open(log_file, 'w') as log:
+        try:
+            returncode = subprocess.run(
+                ['get_hkl', '-i', hkl_file, '-p', UC_file, '-o', mtz_file, '--output-format=mtz'],
+                stdout=log, stderr=subprocess.STDOUT
+            ).returncode
+        except OSError as e:
+            log.write(f"{e}\n")
+            returncode = -1
+    if returncode != 0:
+        print(f"[ERROR] get_hkl failed for {hkl_file}, see {log_file}")
+    return mtz_file, returncode
+
+
+def _failed(future):
+    return future.done() and (future.exception() is not None or future.result()[1] != 0)
+
+
+class MtzConversionStage:
+    """Converts hkl files to mtz in a bounded thread pool, off the statistics path.
+
+    Each worker thread only waits for its get_hkl subprocess, so no process of the
+    (heavily threaded) pipeline is forked. Conversions whose mtz is newer than the hkl
+    and unit cell files are skipped, and an hkl file submitted again (e.g. once per
+    offset) shares the running conversion, or the finished one while its mtz is still
+    up to date.
+
+    Args:
+        max_workers (int): Number of get_hkl processes running at the same time.
+    """
+
+    def __init__(self, max_workers=MTZ_WORKERS):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='mtz')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, hkl_file, UC_file, mtz_file=None):
+        """Schedule the conversion; returns a Future with (mtz_file, returncode)."""
+        mtz_file = mtz_file or get_mtz_path(hkl_file)
+        key = (os.path.abspath(hkl_file), os.path.abspath(UC_file), os.path.abspath(mtz_file))
+        with self._lock:
+            future = self._futures.get(key)
+            # a finished conversion is reused only while the hkl was not rewritten since
+            if future is not None and (not future.done() or
+                                       (not _failed(future) and is_up_to_date(mtz_file, hkl_file, UC_file))):
+                return future
+            if is_up_to_date(mtz_file, hkl_file, UC_file):
+                future = concurrent.futures.Future()
+                future.set_result((mtz_file, 0))
+            else:
+                future = self._executor.submit(convert_to_mtz, hkl_file, UC_file, mtz_file)
+            self._futures[key] = future
+            return future
+
+    def shutdown(self, wait=True):
+        """Wait for the scheduled conversions and stop the workers."""
+        self._executor.shutdown(wait=wait)
+
+
+_stage = None
+_stage_lock = threading.Lock()
+
+
+def get_mtz_conversion_stage(max_workers=MTZ_WORKERS):
+    """Return the process-wide MtzConversionStage, created with max_workers on first use."""
+    global _stage
+    with _stage_lock:
+        if _stage is None:
+            _stage = MtzConversionStage(max_workers)
+        return _stage
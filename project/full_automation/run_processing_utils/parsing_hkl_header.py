@@ -0,0 +1,84 @@
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+TAIL_CHUNK = 64 * 1024
+END_OF_REFLECTIONS = 'End of reflections'
+REFLECTION_LINE = re.compile(r'^\s*-?\d+\s+-?\d+\s+-?\d+\s+\S')
+CELL_OR_PDB = re.compile(r"\b\S+\.(?:cell|pdb)")
+
+HklHeader = namedtuple('HklHeader', ['symmetry', 'command_line', 'cell_file'])
+
+
+def _decode(raw):
+    return raw.decode('utf-8', errors='replace').splitlines()
+
+
+def _read_head(f):
+    """Read the lines before the first reflection line."""
+    lines = []
+    for raw in f:
+        line = raw.decode('utf-8', errors='replace').rstrip('\n')
+        if REFLECTION_LINE.match(line) or line.startswith(END_OF_REFLECTIONS):
+            break
+        lines.append(line)
+    return lines
+
+
+def _read_tail(f, size):
+    """Read the lines after the last reflection line (CrystFEL writes the audit notes there)."""
+    chunk = TAIL_CHUNK
+    while True:
+        start = max(0, size - chunk)
+        f.seek(start)
+        lines = _decode(f.read(size - start))
+        if start > 0:
+            lines = lines[1:]  # first line is most likely cut
+        for i in range(len(lines) - 1, -1, -1):
+            if lines[i].startswith(END_OF_REFLECTIONS) or REFLECTION_LINE.match(lines[i]):
+                return lines[i + 1:]
+        if start == 0:
+            return []
+        chunk *= 4
+
+
+def _first_line_with(lines, pattern):
+    return next((line for line in lines if pattern in line), None)
+
+
+@lru_cache(maxsize=1024)
+def _read_hkl_header(hkl_input_file, mtime_ns, size):
+    with open(hkl_input_file, 'rb') as f:
+        lines = _read_head(f)
+        lines += _read_tail(f, size)
+
+    symmetry = _first_line_with(lines, 'Symmetry')
+    if symmetry:
+        symmetry = symmetry.split(':')[-1].strip()
+
+    command_line = _first_line_with(lines, 'indexamajig')
+    cell_file = None
+    if command_line:
+        cell_or_pdb = CELL_OR_PDB.findall(command_line)
+        if cell_or_pdb:
+            cell_file = os.path.join("/", cell_or_pdb[0])
+
+    return HklHeader(symmetry, command_line, cell_file)
+
+
+def read_hkl_header(hkl_input_file):
+    """Parse the metadata of a CrystFEL reflection file without scanning the reflections.
+
+    The point group is taken from the leading block (`Symmetry: ...`), the indexamajig
+    command line from the audit notes CrystFEL appends after `End of reflections`.
+    Reading stops at the first reflection line on the way in and at the last one on the
+    way back from the end of the file. Results are cached per (path, mtime, size).
+
+    Args:
+        hkl_input_file (str): Path to the .hkl file.
+    Returns:
+        HklHeader: (symmetry, command_line, cell_file); missing entries are None.
+    """
+    stat = os.stat(hkl_input_file)
+    return _read_hkl_header(os.path.abspath(hkl_input_file), stat.st_mtime_ns, stat.st_size)
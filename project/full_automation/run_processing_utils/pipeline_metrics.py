@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+PUBLISH_INTERVAL = 5  # seconds between writes of the state file
+METRICS_SUFFIX = '_metrics.json'  # state file next to the results table, read by the web viewer
+RUN_STATES = ('discovered', 'prepared', 'submitted', 'running', 'completed')
+# upper bounds in seconds; a job waits minutes to hours in the queue and runs up to the 12 h wall time
+JOB_BUCKETS = (10, 30, 60, 300, 600, 1800, 3600, 7200, 14400, 43200)
+STAGE_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800)
+
+
+def get_metrics_path(csv_path):
+    """Path of the state file published for the results table csv_path."""
+    return os.path.splitext(csv_path)[0] + METRICS_SUFFIX
+
+
+def get_started_marker(output_base):
+    """File the statistics job writes its start time to (see run_partialator)."""
+    return f"{output_base}.started"
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus layout: counts[i] observations <= buckets[i]."""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        for i in range(bisect.bisect_left(self.buckets, value), len(self.buckets)):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {'buckets': self.buckets, 'counts': list(self.counts), 'sum': self.sum, 'count': self.count}
+
+
+class PipelineMetrics:
+    """Progress and throughput of a processing campaign, published to a JSON state file.
+
+    Runs go through discovered (hkl files found), prepared (statistics job script
+    written), submitted (job handed to SLURM), running (the job wrote its start marker)
+    and completed (statistics collected); 'running' counts the statistics jobs that
+    started and have not finished. The time between submission and start and between
+    start and the last shell file of every job are recorded as the queue wait and run
+    time histograms; `stage(name)` records the latency of pipeline stages and
+    `record_stream` the throughput of the stream parser.
+
+    A background thread checks the start markers of the submitted jobs and rewrites
+    the state file (atomically) every `publish_interval` seconds; the web viewer serves
+    it on /metrics.
+
+    Args:
+        state_file (str): Path of the state file, or None to only keep the metrics in memory.
+        publish_interval (float): Seconds between writes of the state file.
+    """
+
+    def __init__(self, state_file=None, publish_interval=PUBLISH_INTERVAL):
+        self.state_file = state_file
+        self.publish_interval = publish_interval
+        self.started = time.time()
+        self.counts = dict.fromkeys(RUN_STATES, 0)
+        self.queue_wait = Histogram(JOB_BUCKETS)
+        self.run_time = Histogram(JOB_BUCKETS)
+        self.stages = {}  # stage name -> Histogram
+        self.stream_bytes = 0
+        self.stream_seconds = 0.
+        self._jobs = {}  # run or job key -> [output_base, submitted, started]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, state, n=1):
+        """Count n runs entering the state ('discovered', 'prepared', 'submitted' or 'completed')."""
+        with self._lock:
+            self.counts[state] += n
+
+    def submitted(self, run, output_base, submitted_at=None):
+        """A statistics job writing `{output_base}_*.dat` was submitted for the run."""
+        self.add('submitted')
+        self.job_submitted(run, output_base, submitted_at)
+
+    def completed(self, run):
+        """The statistics of the run were collected; records its queue wait and run time."""
+        self.add('completed')
+        self.job_finished(run)
+
+    def job_submitted(self, key, output_base, submitted_at=None):
+        """Track the timing of a statistics job without counting a run (see submitted).
+
+        A cut-off search submits several jobs for one run; each is tracked under its own key.
+        """
+        with self._lock:
+            self._jobs[key] = [output_base, submitted_at or time.time(), None]
+
+    def job_finished(self, key):
+        """The job tracked under key wrote its shell files; records its queue wait and run time."""
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if job is None:
+            return
+        output_base, submitted_at, started_at = job
+        started_at = started_at or _read_started(get_started_marker(output_base))
+        try:
+            finished_at = os.path.getmtime(f"{output_base}_SNR.dat")  # written last by the job
+        except OSError:
+            finished_at = time.time()
+        with self._lock:
+            if job[2] is not None:
+                self.counts['running'] -= 1  # was counted as running by _check_started
+            if started_at is not None:
+                self.queue_wait.observe(max(0., started_at - submitted_at))
+                self.run_time.observe(max(0., finished_at - started_at))
+
+    def observe_stage(self, name, seconds):
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = Histogram(STAGE_BUCKETS)
+            self.stages[name].observe(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """Record the duration of the with block as a latency of the stage."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.monotonic() - start)
+
+    def record_stream(self, n_bytes, seconds):
+        """A stream file of n_bytes was parsed in the given time."""
+        with self._lock:
+            self.stream_bytes += n_bytes
+            self.stream_seconds += seconds
+
+    def _check_started(self):
+        with self._lock:
+            waiting = [(key, job[0]) for key, job in self._jobs.items() if job[2] is None]
+        for key, output_base in waiting:
+            started_at = _read_started(get_started_marker(output_base))
+            if started_at is None:
+                continue
+            with self._lock:
+                job = self._jobs.get(key)
+                if job is not None and job[2] is None:
+                    job[2] = started_at
+                    self.counts['running'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'updated': time.time(),
+                'started': self.started,
+                'pid': os.getpid(),
+                'runs': dict(self.counts),
+                'queue_wait_seconds': self.queue_wait.to_dict(),
+                'run_seconds': self.run_time.to_dict(),
+                'stage_seconds': {name: histogram.to_dict() for name, histogram in self.stages.items()},
+                'stream': {
+                    'bytes': self.stream_bytes,
+                    'seconds': self.stream_seconds,
+                    'bytes_per_second': self.stream_bytes / self.stream_seconds if self.stream_seconds else 0.
+                }
+            }
+
+    def publish(self):
+        """Write the state file (to a temporary file renamed over the previous one)."""
+        self._check_started()
+        if not self.state_file:
+            return
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"[WARNING] Failed to publish metrics to {self.state_file}: {e}")
+
+    def start(self):
+        """Start publishing in the background."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pipeline-metrics', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.publish_interval):
+            self.publish()
+
+    def close(self):
+        """Stop the background thread and publish the final state."""
+        self._stop.set()
+        self.publish()
+
+
+def _read_started(marker):
+    try:
+        with open(marker) as f:
+            return float(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_pipeline_metrics(state_file=None):
+    """Return the process-wide PipelineMetrics, created with state_file on first use."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = PipelineMetrics(state_file)
+        return _metrics
@@ -1,46 +1,28 @@
 import os
-import re
-import glob
-import shlex
-import subprocess
+from collections import namedtuple
 from partialator_utils.partialator_execution import run_partialator
+from run_processing_utils.parsing_hkl_header import read_hkl_header
 from unit_cell_utils.parsing_UC_files import parse_UC_file
 from partialator_utils.resolution_cutoff_determination import get_d_at_snr_one, get_d_at_cc_threshold
 from refinment_utils.parsing_phenix_pdb_file import parsing_phenix_pdb_file
+from refinment_utils.phenix_results_index import get_phenix_results_index
 
-def extract_first_match(pattern, filepath):
+def get_UC(hkl_input_file):
     try:
-        cmd = f"grep -e {pattern} {filepath}"
-        result = subprocess.check_output(shlex.split(cmd)).decode().strip().split('\n')[0]
-        return result
-    except subprocess.CalledProcessError:
+        return read_hkl_header(hkl_input_file).cell_file
+    except OSError:
         return None
 
 
-def get_UC(hkl_input_file):
-    result = extract_first_match("indexamajig", hkl_input_file)
-    if result:
-        cell_or_pdb = re.findall(r"\b\S+\.(?:cell|pdb)", result)
-        if cell_or_pdb:
-            return os.path.join("/", cell_or_pdb[0])
-    return None
-
-
 def get_pg(hkl_input_file):
-    result = extract_first_match("Symmetry", hkl_input_file)
-    return result.split(":")[-1].strip() if result else None
-
-
-def find_latest_file(pattern):
-    files = glob.glob(pattern, recursive=True)
-    return max(files, key=os.path.getctime) if files else None
+    try:
+        return read_hkl_header(hkl_input_file).symmetry
+    except OSError:
+        return None
 
 
 def get_resolution_cutoff_from_logs(hkl_name, Rfree_Rwork_path, run_name):
-    pdb_path = f'{Rfree_Rwork_path}/*{run_name.strip()}*/**/*.pdb'
-    log_path = f'{Rfree_Rwork_path}/*{run_name.strip()}*/**/*.log'
-
-    phenix_file = find_latest_file(pdb_path) or find_latest_file(log_path)
+    phenix_file = get_phenix_results_index(Rfree_Rwork_path).newest(run_name.strip())
     if phenix_file:
         return (*parsing_phenix_pdb_file(phenix_file), phenix_file)
     return (None, None, 1.5, None, None)
@@ -57,12 +39,13 @@ def fallback_resolution_cutoff(hkl_name):
 
 
 def resolve_pdb_path(pdb, hkl_input_file, cell_path):
-    if os.path.exists(pdb):
+    if pdb and os.path.exists(pdb):
         return pdb
 
-    local_dir = os.path.join(os.path.dirname(hkl_input_file), os.path.basename(pdb))
-    if os.path.exists(local_dir):
-        return local_dir
+    if pdb:
+        local_dir = os.path.join(os.path.dirname(hkl_input_file), os.path.basename(pdb))
+        if os.path.exists(local_dir):
+            return local_dir
 
     if cell_path:
         base_name = os.path.basename(hkl_input_file)
@@ -73,11 +56,26 @@ def resolve_pdb_path(pdb, hkl_input_file, cell_path):
     return None
 
 
-def prep_for_calculating_overall_statistics(
-    hkl_input_file, offset, cell_path, Rfree_Rwork_path=None, nsh=10):
+HklContext = namedtuple('HklContext', [
+    'hkl_input_file', 'run_name', 'pdb', 'pg',
+    'Rwork', 'Rfree', 'resolution_cut_off_high', 'resolution_low'
+])
+
+
+def build_hkl_context(hkl_input_file, cell_path, Rfree_Rwork_path=None):
+    """Collect everything about an hkl file that does not depend on the offset.
+
+    Args:
+        hkl_input_file (str): Path to the merged .hkl file.
+        cell_path (str): Folder with cell/pdb files named after the hkl files, or None.
+        Rfree_Rwork_path (str): Folder with Phenix refinement results, or None.
+    Returns:
+        HklContext: Shared by all offsets of this hkl file, or None if the hkl file
+        or its cell/pdb file is missing.
+    """
     if not os.path.exists(hkl_input_file):
         print(f"{os.path.basename(hkl_input_file)} does not exist.")
-        return (None, ) * 6
+        return None
 
     hkl_name = os.path.basename(hkl_input_file)
     run_name = hkl_name.replace('.hkl', '')
@@ -98,13 +96,27 @@ def prep_for_calculating_overall_statistics(
 
     if not pdb or not os.path.exists(pdb):
         print(f"No cell/pdb file exists for {hkl_input_file}")
-        return (None, ) * 6
+        return None
 
     pg = get_pg(hkl_input_file)
-    resolution_cut_off_new = resolution_cut_off_high + offset
+
+    return HklContext(
+        hkl_input_file, run_name, pdb, pg,
+        Rwork, Rfree, resolution_cut_off_high, resolution_low
+    )
+
+
+def prep_for_calculating_overall_statistics(
+    hkl_input_file, offset, cell_path, Rfree_Rwork_path=None, nsh=10, context=None):
+    if context is None:
+        context = build_hkl_context(hkl_input_file, cell_path, Rfree_Rwork_path)
+    if context is None:
+        return (None, ) * 6
+
+    resolution_cut_off_new = context.resolution_cut_off_high + offset
 
     CCstar_dat_file, error_file = run_partialator(
-        hkl_input_file, resolution_cut_off_new, pg, pdb, nsh, str(offset)
+        context.hkl_input_file, resolution_cut_off_new, context.pg, context.pdb, nsh, str(offset)
     )
 
-    return CCstar_dat_file, error_file, Rwork, Rfree, resolution_cut_off_new, resolution_low
+    return CCstar_dat_file, error_file, context.Rwork, context.Rfree, resolution_cut_off_new, context.resolution_low
@@ -1,36 +1,44 @@
 import os
-import glob
-import time
-from collections import defaultdict
 
-from stream_utils.parsing_stream import parsing_stream
+from stream_utils.parsing_stream import parsing_stream_cached
 from partialator_utils.parsing_err_file import parse_err
+from partialator_utils.err_file_index import get_err_file_index
+from partialator_utils.wait_for_file import wait_for_files
 from unit_cell_utils.parsing_UC_files import parse_UC_file
 from partialator_utils.resolution_cutoff_determination import calculating_max_res_from_Rsplit_CCstar_dat
 from run_processing_utils.preparation_for_statistics_calculations import get_UC
 from partialator_utils.resolution_cutoff_determination import get_d_at_snr_one, get_d_at_cc_threshold
-from refinement_utils.dimple import dimple_execution
+from refinment_utils.dimple import dimple_execution
+from run_processing_utils.run_stats import RunStats
+from run_processing_utils.mtz_conversion import get_mtz_conversion_stage, get_mtz_command, get_mtz_path
 
-indexes = [
-    'Num. patterns/hits', 'Indexed patterns/crystals', 'Resolution', 'Rsplit(%)',
-    'CC1/2', 'CC*', 'CCano', 'SNR', 'Completeness(%)', 'Multiplicity',
-    'Total Measurements', 'Unique Reflections', 'Wilson B-factor',
-    'Resolution SNR=1', 'Resolution CC>=0.3', 'a,b,c,alpha,betta,gamma'
-]
+DAT_FILES_TIMEOUT = 12 * 3600  # seconds, the wall time of the statistics job
 
 def processing_statistics_for_run(
     name_of_run, data_info_for_the_current_run, hkl_file, main_path,
-    is_extended=False, cell_path=None, is_refining=False
+    is_extended=False, cell_path=None, is_refining=False, refinement_queue=None
 ):
+    """
+    Collect the statistics of one run into a RunStats record.
+
+    With is_refining, runs without Phenix results are refined with DIMPLE: through
+    refinement_queue (a RefinementQueue back-filling the record when it finishes) if
+    given, otherwise synchronously.
+
+    Returns:
+        RunStats: Numeric results of the run; render_run_stats turns it into a table row.
+    """
     print(f'Processing {name_of_run}')
-    data_info = defaultdict(dict)
-    data_info[name_of_run] = {key: '' for key in indexes}
+    stats = RunStats(name_of_run)
 
     base, _ = os.path.splitext(hkl_file)
-    CCstar_dat_file = f"{base}_CCstar.dat"
-    Rsplit_dat_file = f"{base}_Rsplit.dat"
-    SNR_dat_file = f"{base}_SNR.dat"
-    CC_dat_file = f"{base}_CC.dat"
+    # Every offset of the hkl file has its own shell files, named after the CCstar.dat run_partialator reported
+    CCstar_dat_file = data_info_for_the_current_run[name_of_run].get('CCstar_dat_file') or f"{base}_CCstar.dat"
+    dat_base = CCstar_dat_file[:-len("_CCstar.dat")]
+    Rsplit_dat_file = f"{dat_base}_Rsplit.dat"
+    SNR_dat_file = f"{dat_base}_SNR.dat"
+    CC_dat_file = f"{dat_base}_CC.dat"
+    stats.shell_files = dat_base
     stream_file = f"{base}.stream" if "_offset_" not in base else base.split("_offset_")[0] + '.stream'
 
     # Locate UC file
@@ -47,73 +55,53 @@ def processing_statistics_for_run(
                 UC_file = candidate
                 break
 
-    # Parse stream file
-    chunks, hits, indexed_patterns, indexed = parsing_stream(stream_file)
-    data_info[name_of_run]['Num. patterns/hits'] = f"{chunks}/{hits}"
-    data_info[name_of_run]['Indexed patterns/crystals'] = f"{indexed_patterns}/{indexed}"
+    # Parse stream file (once per stream, shared by all offsets)
+    chunks, hits, indexed_patterns, indexed = parsing_stream_cached(stream_file)
+    stats.n_patterns, stats.n_hits = chunks, hits
+    stats.indexed_patterns, stats.indexed_crystals = indexed_patterns, indexed
 
     # Parse unit cell
-    a, b, c, al, be, ga = parse_UC_file(UC_file) if UC_file else (None,) * 6
-    data_info[name_of_run]['a,b,c,alpha,betta,gamma'] = (a, b, c, al, be, ga)
+    stats.cell = parse_UC_file(UC_file) if UC_file else (None,) * 6
+    stats.UC_file = UC_file
 
     # Wait for required files
-    for file_path in [Rsplit_dat_file, SNR_dat_file, CC_dat_file]:
-        while not os.path.exists(file_path) or os.stat(file_path).st_size == 0:
-            time.sleep(5)
+    if not wait_for_files([Rsplit_dat_file, SNR_dat_file, CC_dat_file], timeout=DAT_FILES_TIMEOUT):
+        stats.comment = 'Shell statistics files did not appear in time'
+        return stats
 
     # Resolution metrics
-    d_snr = get_d_at_snr_one(SNR_dat_file)
-    d_cc = get_d_at_cc_threshold(CC_dat_file)
-    max_res = calculating_max_res_from_Rsplit_CCstar_dat(CCstar_dat_file, Rsplit_dat_file)
+    stats.d_snr_one = get_d_at_snr_one(SNR_dat_file)
+    stats.d_cc_threshold = get_d_at_cc_threshold(CC_dat_file)
+    stats.d_ccstar_rsplit = max_res = calculating_max_res_from_Rsplit_CCstar_dat(CCstar_dat_file, Rsplit_dat_file)
 
-    Rwork = data_info_for_the_current_run[name_of_run].get('Rwork', '')
-    Rfree = data_info_for_the_current_run[name_of_run].get('Rfree', '')
-    resolution_cut_off_high = data_info_for_the_current_run[name_of_run].get('resolution_cut_off_high', '')
-    resolution_cut_off_low = data_info_for_the_current_run[name_of_run].get('resolution_low', '')
+    Rwork = data_info_for_the_current_run[name_of_run].get('Rwork')
+    Rfree = data_info_for_the_current_run[name_of_run].get('Rfree')
+    resolution_cut_off_high = data_info_for_the_current_run[name_of_run].get('resolution_cut_off_high')
+    resolution_cut_off_low = data_info_for_the_current_run[name_of_run].get('resolution_low')
 
-    if Rwork is None and is_refining:
+    stats.Rwork, stats.Rfree = Rwork, Rfree
+    stats.refinement_high, stats.refinement_low = resolution_cut_off_high, resolution_cut_off_low
+
+    if Rwork is None and is_refining and UC_file:
         print('Calling refinement...')
-        Rwork, Rfree, resolution_cut_off_high, resolution_cut_off_low = dimple_execution(hkl_file, UC_file, max_res)
-
-
-    data_info[name_of_run].update({
-        'Rwork/Rfree': f'{Rwork}/{Rfree}',
-        'Refinement resolution cut-off high': str(resolution_cut_off_high),
-        'Refinement resolution cut-off low': str(resolution_cut_off_low),
-        'Resolution SNR=1': str(d_snr),
-        'Resolution CC>=0.3': str(d_cc),
-        'CC* intersects with Rsplit at': str(max_res)
-    })
-
-    # Parse error file
-    err_pattern = os.path.join(
-        main_path, '**', os.path.basename(CCstar_dat_file).replace("_CCstar.dat", "*.err")
-    )
-    err_files = glob.glob(err_pattern, recursive=True)
-    if err_files:
-        latest_err = max(err_files, key=os.path.getctime)
-        data_info = parse_err(data_info, name_of_run, latest_err, CCstar_dat_file)
-
-    # Convert to MTZ if UC file exists
-    mtz_file = hkl_file.replace("hkl", "mtz")
+        if refinement_queue is not None:
+            refinement_queue.submit(stats, hkl_file, UC_file, max_res)
+        else:
+            stats.Rwork, stats.Rfree, stats.refinement_high, stats.refinement_low = dimple_execution(
+                hkl_file, UC_file, max_res if max_res > 0 else None)
+
+    # Parse error file: run_partialator reports the exact path, older trees go through the index
+    latest_err = data_info_for_the_current_run[name_of_run].get('error_file')
+    if not latest_err or not os.path.exists(latest_err):
+        err_prefix = os.path.basename(CCstar_dat_file).replace("_CCstar.dat", "")
+        latest_err = get_err_file_index(main_path).latest(err_prefix)
+    if latest_err:
+        parse_err(stats, latest_err, CCstar_dat_file)
+
+    # Convert to MTZ if UC file exists; the conversion runs in the background stage
     if UC_file:
-        mtz_command = f'get_hkl -i {hkl_file} -p {UC_file} -o {mtz_file} --output-format=mtz | tee conversion_log.txt'
-        os.system(mtz_command)
-    else:
-        mtz_command = ''
-
-    # Extended data
-    if is_extended:
-        data_info[name_of_run].update({
-            'UC_file': UC_file,
-            'N_patterns': str(chunks),
-            'N_hits': str(hits),
-            'Indexed_patterns': str(indexed_patterns),
-            'Indexed_crystals': str(indexed),
-            'a': a, 'b': b, 'c': c,
-            'alpha': al, 'betta': be, 'gamma': ga,
-            'mtz_command': mtz_command,
-            'mtz_with_the_defined_resolution': f"{mtz_file} {d_snr}" if d_snr else ''
-        })
-
-    return data_info
+        stats.mtz_file = get_mtz_path(hkl_file)
+        stats.mtz_command = get_mtz_command(hkl_file, UC_file, stats.mtz_file)
+        get_mtz_conversion_stage().submit(hkl_file, UC_file, stats.mtz_file)
+
+    return stats
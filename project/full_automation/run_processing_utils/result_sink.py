@@ -0,0 +1,230 @@
+import io
+import os
+import csv
+import time
+import threading
+
+from run_processing_utils.run_stats import render_run_stats, stats_to_columns, column_types
+from run_processing_utils.pipeline_metrics import get_pipeline_metrics
+
+try:
+    import portalocker
+except ImportError:
+    portalocker = None
+    import fcntl
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DELIMITER = ';'  # the live viewers read ';'-separated tables
+FLUSH_INTERVAL = 30  # seconds
+FLUSH_ROWS = 50
+
+
+def _lock(f, exclusive=True):
+    if portalocker is not None:
+        portalocker.lock(f, portalocker.LOCK_EX if exclusive else portalocker.LOCK_SH)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+def _unlock(f):
+    if portalocker is not None:
+        portalocker.unlock(f)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _open_locked(path):
+    """Open the file for appending under an exclusive lock.
+
+    A rewrite replaces the file by rename, so a lock taken on the old inode is
+    retried until it is held on the file the path currently points to.
+    """
+    while True:
+        f = open(path, 'a+', newline='')
+        _lock(f)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        _unlock(f)
+        f.close()
+
+
+def parquet_schema():
+    """Schema of the Parquet dataset, the same for every file whatever values a flush has."""
+    return pa.schema([(name, pa.string() if kind is str else pa.float64())
+                      for name, kind in column_types().items()])
+
+
+def _render_csv(fieldnames, rows, with_header):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, delimiter=DELIMITER, restval='')
+    if with_header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+class ResultSink:
+    """Streaming writer of RunStats records into the results table and a Parquet dataset.
+
+    Records are buffered and flushed every `flush_rows` records or, by a timer, at
+    most `flush_interval` seconds after they were added. Every flush appends the rendered rows to the ';'-separated CSV in a single
+    write under an exclusive lock, so viewers holding a shared lock never see torn rows.
+    Records updated after they were written (see update) are appended again, and
+    readers keep the last row of every Run. The table is only rewritten (to a temporary
+    file renamed over the original) when the first flush replaces the output of a
+    previous campaign or new columns appear; the rewrite keeps one row per Run.
+
+    With `parquet_dir` set and pyarrow available, each flush also adds one file with
+    the numeric columns of the flushed records to an append-only dataset partitioned by
+    day (`{parquet_dir}/date=YYYY-MM-DD/part-*.parquet`). Updated records are appended
+    again, the last file of a run holds its current values.
+
+    Args:
+        csv_path (str): Path to the results table.
+        parquet_dir (str): Root of the Parquet dataset, or None.
+        is_extended (bool): Render the extended version of the rows.
+        append (bool): Keep the rows already in csv_path instead of replacing them.
+        flush_interval (float): Maximum age in seconds of buffered records.
+        flush_rows (int): Maximum number of buffered records.
+    """
+
+    def __init__(self, csv_path, parquet_dir=None, is_extended=False, append=False,
+                 flush_interval=FLUSH_INTERVAL, flush_rows=FLUSH_ROWS):
+        self.csv_path = os.path.abspath(csv_path)
+        self.parquet_dir = parquet_dir
+        if parquet_dir and pa is None:
+            print("[WARNING] pyarrow is not installed, the Parquet dataset is not written.")
+            self.parquet_dir = None
+        self.is_extended = is_extended
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self._replace_existing = not append
+        self._pending = []
+        self._written = set()
+        self._updated = {}
+        self._last_flush = time.monotonic()
+        self._timer = None  # flushes the buffer once it is flush_interval old
+        self._lock = threading.Lock()
+
+    def add(self, stats):
+        """Buffer a record; flushes when the buffer is full or old enough."""
+        with self._lock:
+            self._pending.append(stats)
+            due = (len(self._pending) >= self.flush_rows
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+            if not due:
+                self._schedule()
+        if due:
+            self.flush()
+
+    def update(self, stats):
+        """Re-write the row of a record that changed after it was added (e.g. refinement back-fill).
+
+        Records that are still buffered need nothing, rows already written are appended
+        again with the next flush and supersede the earlier row of the run.
+        """
+        with self._lock:
+            if stats.run in self._written:
+                self._updated[stats.run] = stats
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+            if not due:
+                self._schedule()
+        if due:
+            self.flush()
+
+    def _schedule(self):
+        """Start the flush timer for the buffered records; called with the lock held."""
+        if self._timer is not None or not (self._pending or self._updated):
+            return
+        delay = max(0., self.flush_interval - (time.monotonic() - self._last_flush))
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _render(self, stats):
+        row = {'Run': stats.run}
+        row.update(render_run_stats(stats, self.is_extended))
+        return row
+
+    def flush(self):
+        """Write all buffered records and updates."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            records, self._pending = self._pending, []
+            updated, self._updated = self._updated, {}
+            self._last_flush = time.monotonic()
+            if not records and not updated:
+                return
+            start = time.monotonic()
+            self._write_csv([self._render(stats) for stats in records + list(updated.values())])
+            self._written.update(stats.run for stats in records)
+            if self.parquet_dir:
+                self._write_parquet(records + list(updated.values()))
+            get_pipeline_metrics().observe_stage('flush', time.monotonic() - start)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_csv(self, rows):
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+        f = _open_locked(self.csv_path)
+        try:
+            f.seek(0)
+            header = next(csv.reader([f.readline()], delimiter=DELIMITER), [])
+            if self._replace_existing:
+                self._rewrite(fieldnames, rows)
+                self._replace_existing = False
+            elif not header:
+                f.write(_render_csv(fieldnames, rows, with_header=True))
+            elif not set(fieldnames) <= set(header):
+                f.seek(0)
+                latest = {}
+                for row in list(csv.DictReader(f, delimiter=DELIMITER)) + rows:
+                    latest[row.get('Run')] = row  # the last row of a run wins, at its first position
+                self._rewrite(list(dict.fromkeys(header + fieldnames)), list(latest.values()))
+            else:
+                f.write(_render_csv(header, rows, with_header=False))
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            _unlock(f)
+            f.close()
+
+    def _rewrite(self, fieldnames, rows):
+        """Replace the table atomically; called with the lock on the current file held."""
+        folder, name = os.path.split(self.csv_path)
+        tmp_path = os.path.join(folder, f".{name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', newline='') as tmp:
+            tmp.write(_render_csv(fieldnames, rows, with_header=True))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, self.csv_path)
+
+    def _write_parquet(self, records):
+        schema = parquet_schema()
+        columns = stats_to_columns(records)
+        table = pa.table([pa.array(columns[field.name], type=field.type, from_pandas=True) for field in schema],
+                         schema=schema)
+        folder = os.path.join(self.parquet_dir, f"date={time.strftime('%Y-%m-%d')}")
+        os.makedirs(folder, exist_ok=True)
+        name = f"part-{time.time_ns()}-{os.getpid()}.parquet"
+        # files starting with '.' are ignored by dataset readers until the rename
+        tmp_path = os.path.join(folder, f".{name}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(folder, name))
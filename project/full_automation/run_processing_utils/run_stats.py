@@ -0,0 +1,195 @@
+import math
+from dataclasses import dataclass, fields
+import numpy as np
+
+CELL_FIELDS = ('a', 'b', 'c', 'alpha', 'betta', 'gamma')
+
+
+@dataclass
+class ShellStats:
+    """Statistics over one resolution range: all shells (overall) or the outer shell.
+
+    d_max and d_min are the low and high resolution edges in Angstrom.
+    """
+    d_max: float = None
+    d_min: float = None
+    CCstar: float = None
+    Rsplit: float = None
+    CC: float = None
+    snr: float = None
+    completeness: float = None
+    multiplicity: float = None
+    unique_reflections: int = None
+
+
+@dataclass
+class RunStats:
+    """Numeric results of one run; display strings are only rendered by render_run_stats."""
+    run: str
+    n_patterns: int = None
+    n_hits: int = None
+    indexed_patterns: int = None
+    indexed_crystals: int = None
+    cell: tuple = (None,) * 6
+    overall: ShellStats = None
+    outer: ShellStats = None
+    CCano: float = None
+    total_measurements: int = None
+    Wilson_B_factor: float = None
+    d_snr_one: float = None
+    d_cc_threshold: float = None
+    d_ccstar_rsplit: float = None
+    Rwork: float = None
+    Rfree: float = None
+    refinement_high: float = None
+    refinement_low: float = None
+    UC_file: str = None
+    mtz_file: str = None
+    mtz_command: str = ''
+    shell_files: str = None  # prefix of the shell files, {shell_files}_CCstar.dat etc.
+    comment: str = None
+
+
+def _is_missing(value):
+    return value is None or value == '' or (isinstance(value, float) and math.isnan(value))
+
+
+def _text(value):
+    return '' if _is_missing(value) else str(value)
+
+
+def _rounded(value, digits):
+    if _is_missing(value):
+        return ''
+    return str(value) if isinstance(value, (int, np.integer)) else str(round(float(value), digits))
+
+
+def _d_range(shell, fmt):
+    if shell is None or _is_missing(shell.d_max) or _is_missing(shell.d_min):
+        return ''
+    return f"{fmt(shell.d_max)} - {fmt(shell.d_min)}"
+
+
+def _with_outer(overall, outer, name, overall_digits=4, outer_digits=3):
+    return f"{_rounded(getattr(overall, name), overall_digits)} ({_rounded(getattr(outer, name), outer_digits)})"
+
+
+def render_run_stats(stats, is_extended=False):
+    """
+    Render a RunStats record into the display row written to the results table.
+
+    Overall values are shown with 4 decimals and the outer shell in brackets with 3,
+    e.g. 'CC*': '0.9876 (0.512)'. Missing values are rendered as empty strings.
+
+    Args:
+        stats (RunStats): Record to render.
+        is_extended (bool): If True, adds the per-value columns of the extended version.
+    Returns:
+        dict: Column name -> display string.
+    """
+    overall, outer = stats.overall, stats.outer or ShellStats()
+    row = {
+        'Num. patterns/hits': f"{_text(stats.n_patterns)}/{_text(stats.n_hits)}",
+        'Indexed patterns/crystals': f"{_text(stats.indexed_patterns)}/{_text(stats.indexed_crystals)}",
+        'Resolution': '', 'Rsplit(%)': '', 'CC1/2': '', 'CC*': '', 'CCano': '', 'SNR': '',
+        'Completeness(%)': '', 'Multiplicity': '', 'Total Measurements': '',
+        'Unique Reflections': '', 'Wilson B-factor': '',
+        'Resolution SNR=1': _text(stats.d_snr_one),
+        'Resolution CC>=0.3': _text(stats.d_cc_threshold),
+        'a,b,c,alpha,betta,gamma': str(tuple(stats.cell)),
+    }
+    if overall is not None:
+        row.update({
+            'Resolution': f"{_d_range(overall, '{:.2f}'.format)} ({_d_range(outer, lambda d: _rounded(d, 2))})",
+            'Rsplit(%)': _with_outer(overall, outer, 'Rsplit'),
+            'CC1/2': _with_outer(overall, outer, 'CC'),
+            'CC*': _with_outer(overall, outer, 'CCstar'),
+            'CCano': _rounded(stats.CCano, 4),
+            'SNR': _with_outer(overall, outer, 'snr'),
+            'Completeness(%)': _with_outer(overall, outer, 'completeness'),
+            'Multiplicity': _with_outer(overall, outer, 'multiplicity'),
+            'Total Measurements': _text(stats.total_measurements),
+            'Unique Reflections': f"{_text(overall.unique_reflections)} ({_text(outer.unique_reflections)})",
+            'Wilson B-factor': _rounded(stats.Wilson_B_factor, 4),
+        })
+    row.update({
+        'Rwork/Rfree': f"{_text(stats.Rwork)}/{_text(stats.Rfree)}",
+        'Refinement resolution cut-off high': _text(stats.refinement_high),
+        'Refinement resolution cut-off low': _text(stats.refinement_low),
+        'CC* intersects with Rsplit at': _text(stats.d_ccstar_rsplit),
+        'Shell files': _text(stats.shell_files),
+    })
+    row['Comment'] = _text(stats.comment)
+
+    if is_extended:
+        row.update({
+            'UC_file': _text(stats.UC_file),
+            'N_patterns': _text(stats.n_patterns),
+            'N_hits': _text(stats.n_hits),
+            'Indexed_patterns': _text(stats.indexed_patterns),
+            'Indexed_crystals': _text(stats.indexed_crystals),
+            **{name: _text(value) for name, value in zip(CELL_FIELDS, stats.cell)},
+            'mtz_command': stats.mtz_command,
+            'mtz_with_the_defined_resolution': (
+                f"{stats.mtz_file} {stats.d_snr_one}" if stats.d_snr_one and stats.mtz_file else ''
+            )
+        })
+    return row
+
+
+def column_types():
+    """
+    Type of every column of stats_to_columns, taken from the declared field types.
+
+    Returns:
+        dict: Column name -> float (float64 with NaN, also for int fields) or str.
+    """
+    types = {}
+    for f in fields(RunStats):
+        if f.name in ('overall', 'outer'):
+            for shell_field in fields(ShellStats):
+                types[f"{f.name}_{shell_field.name}"] = str if shell_field.type is str else float
+        elif f.name == 'cell':
+            types.update(dict.fromkeys(CELL_FIELDS, float))
+        else:
+            types[f.name] = str if f.type is str else float
+    return types
+
+
+def _column(values, kind):
+    """Numeric columns become a float64 array (None -> NaN), text columns an object array."""
+    if kind is float:
+        return np.array([np.nan if value is None else value for value in values], dtype=float)
+    return np.array([None if value is None else str(value) for value in values], dtype=object)
+
+
+def stats_to_columns(records):
+    """
+    Export RunStats records as columns for vectorized aggregation.
+
+    Scalar fields keep their names, the shell records are flattened into overall_* and
+    outer_* columns and the unit cell into a, b, c, alpha, betta, gamma. The type of a
+    column does not depend on the values, see column_types.
+
+    Args:
+        records (iterable of RunStats): Records to export.
+    Returns:
+        dict: Column name -> numpy array (float64 with NaN for numeric columns).
+    """
+    records = list(records)
+    types = column_types()
+    columns = {}
+    for f in fields(RunStats):
+        if f.name in ('overall', 'outer'):
+            for shell_field in fields(ShellStats):
+                name = f"{f.name}_{shell_field.name}"
+                columns[name] = _column([
+                    getattr(getattr(stats, f.name), shell_field.name) if getattr(stats, f.name) else None
+                    for stats in records
+                ], types[name])
+        elif f.name == 'cell':
+            for i, name in enumerate(CELL_FIELDS):
+                columns[name] = _column([stats.cell[i] for stats in records], types[name])
+        else:
+            columns[f.name] = _column([getattr(stats, f.name) for stats in records], types[f.name])
+    return columns
@@ -1,22 +1,14 @@
+import os
+import time
 import subprocess
+from functools import lru_cache
+from run_processing_utils.pipeline_metrics import get_pipeline_metrics
 from visualization_utils.avg_resolution_plot import avg_resolution_plot
 from visualization_utils.orientation_plot import orientation_plot
 from visualization_utils.detector_shift import detector_shift
 
-def parsing_stream(stream):
-    """Parse a stream file to extract information about hits, chunks, indexed patterns, and indexed crystals.
-    This function uses subprocess to run grep commands on the stream file to count occurrences of specific patterns.
-    It returns the number of chunks, hits, indexed patterns, and indexed crystals.
-    The function handles potential errors in subprocess calls and returns default values if the patterns are not found.
-    The function is designed to work with a stream file generated by a crystallographic software, which contains information about crystal hits and indexing.
-    Args:
-        stream (str): The path to the stream file to be parsed.
-    Returns:
-        tuple: A tuple containing the number of chunks, hits, indexed patterns, and indexed crystals
-    Raises:
-        subprocess.CalledProcessError: If the grep command fails to execute or find the patterns.
-        
-    """
+def count_stream(stream):
+    """Count the chunks, hits, indexed patterns and indexed crystals of a stream file (see parsing_stream)."""
     try:
         res_hits = subprocess.check_output(['grep', '-rc', 'hit = 1', stream]).decode('utf-8').strip().split('\n')
         hits = int(res_hits[0])
@@ -38,10 +30,59 @@ def parsing_stream(stream):
         none_indexed_patterns = 0
 
     indexed_patterns = chunks - none_indexed_patterns
-    
-    #Generating plots
+    return chunks, hits, indexed_patterns, indexed
+
+
+def plot_stream(stream):
+    """Generate the resolution, orientation and detector shift plots of a stream file."""
     avg_resolution_plot(stream)
     orientation_plot(stream)
     detector_shift(stream)
-    
-    return chunks, hits, indexed_patterns, indexed 
+
+
+def parsing_stream(stream):
+    """Parse a stream file to extract information about hits, chunks, indexed patterns, and indexed crystals.
+    This function uses subprocess to run grep commands on the stream file to count occurrences of specific patterns.
+    It returns the number of chunks, hits, indexed patterns, and indexed crystals.
+    The function handles potential errors in subprocess calls and returns default values if the patterns are not found.
+    The function is designed to work with a stream file generated by a crystallographic software, which contains information about crystal hits and indexing.
+    Args:
+        stream (str): The path to the stream file to be parsed.
+    Returns:
+        tuple: A tuple containing the number of chunks, hits, indexed patterns, and indexed crystals
+    Raises:
+        subprocess.CalledProcessError: If the grep command fails to execute or find the patterns.
+        
+    """
+    chunks, hits, indexed_patterns, indexed = count_stream(stream)
+
+    #Generating plots
+    plot_stream(stream)
+
+    return chunks, hits, indexed_patterns, indexed
+
+
+@lru_cache(maxsize=256)
+def _parsing_stream_cached(stream, mtime_ns, size):
+    start = time.monotonic()
+    result = count_stream(stream)
+    get_pipeline_metrics().record_stream(size, time.monotonic() - start)  # the parse only, not the plots
+    plot_stream(stream)
+    return result
+
+
+def parsing_stream_cached(stream):
+    """Same as parsing_stream, but parses (and plots) each stream file only once.
+
+    All offsets of an hkl file share the same stream, so the counts are cached per
+    (path, mtime, size) and reused for every offset row.
+    Args:
+        stream (str): The path to the stream file to be parsed.
+    Returns:
+        tuple: A tuple containing the number of chunks, hits, indexed patterns, and indexed crystals
+    """
+    try:
+        stat = os.stat(stream)
+    except OSError:
+        return parsing_stream(stream)
+    return _parsing_stream_cached(os.path.abspath(stream), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from partialator_utils import parsing_err_file
+from partialator_utils.parsing_err_file import read_err_summary, err_summary_is_complete, parse_err
+from run_processing_utils.run_stats import RunStats
+
+SUMMARY = (
+    'Fixed resolution range: 1.0 to 2.0 (30.00 to 2.50 Angstroms)\n'
+    'Overall CC* = 0.9512\n'
+    'Overall Rsplit = 12.30\n'
+    'Overall CC = 0.8100\n'
+    'Overall CCano = 0.0500\n'
+    'Overall <snr> = 5.10\n'
+    'Overall redundancy = 40.20\n'
+    'Overall completeness = 99.10\n'
+    '12345 measurements in total.\n'
+    '678 reflections in total.\n'
+)
+
+
+def write_err(path, text, age=10):
+    with open(path, 'w') as f:
+        f.write(text)
+    past = time.time() - age  # completely written for the readiness service
+    os.utime(path, (past, past))
+    return str(path)
+
+
+def test_summary_values_are_parsed(tmp_path):
+    path = write_err(tmp_path / 'run.err', 'partialator output\n' + SUMMARY + 'B = 23.40 A^2\n')
+    summary = read_err_summary(path)
+    assert summary.CCstar == 0.9512 and summary.Rsplit == 12.3 and summary.CC == 0.81
+    assert summary.CCano == 0.05 and summary.snr == 5.1
+    assert summary.multiplicity == 40.2 and summary.completeness == 99.1
+    assert summary.total_measurements == 12345 and summary.unique_reflections == 678
+    assert summary.Wilson_B_factor == 23.4
+    assert (summary.resolution_low, summary.resolution_high) == (30.0, 2.5)
+    assert err_summary_is_complete(path)
+
+
+def test_last_reported_value_wins(tmp_path):
+    path = write_err(tmp_path / 'run.err', SUMMARY + 'Overall CC* = 0.9600\nB = 23.40 A^2\n')
+    assert read_err_summary(path).CCstar == 0.96
+
+
+def test_missing_value_does_not_grow_the_tail_to_the_limit(tmp_path, monkeypatch):
+    summary = SUMMARY.replace('Overall CCano = 0.0500\n', '')
+    path = write_err(tmp_path / 'run.err', 'partialator output\n' * 50000 + summary + 'B = 23.40 A^2\n')
+    reads = []
+    monkeypatch.setattr(parsing_err_file, '_parse_summary_lines',
+                        lambda lines, parse=parsing_err_file._parse_summary_lines: reads.append(len(lines)) or parse(lines))
+    summary = read_err_summary(path)
+    assert summary.CCano is None and summary.Wilson_B_factor == 23.4
+    assert len(reads) == 1
+
+
+def test_summary_without_wilson_line_is_not_complete(tmp_path):
+    path = write_err(tmp_path / 'run.err', SUMMARY)
+    assert not err_summary_is_complete(path)
+    assert not err_summary_is_complete(str(tmp_path / 'missing.err'))
+
+
+def write_shell_files(base):
+    for kind, column, value in (('CCstar', 'CC*', 0.512), ('Rsplit', 'Rsplit/%', 40.0), ('CC', 'CC', 0.3)):
+        write_err(f'{base}_{kind}.dat', f'  1/d centre  {column}  nref  d / A  min 1/nm  max 1/nm\n'
+                                        f'  2.500  {value}  80  4.00  2.0  3.0\n')
+    write_err(f'{base}_SNR.dat', '  1/d centre   nref  possible  compl  meas  red  SNR  mean I  d(A)  min 1/nm  max 1/nm\n'
+                                 '2.500 80 85 94.1 3200 40.0 1.2 10.0 4.00 2.0 4.0\n')
+
+
+def test_parse_err_fills_the_run_record(tmp_path):
+    base = tmp_path / 'run'
+    write_shell_files(base)
+    path = write_err(tmp_path / 'run.err', SUMMARY + 'B = 23.40 A^2\n')
+    stats = parse_err(RunStats(run='run'), path, f'{base}_CCstar.dat')
+    assert stats.overall.CCstar == 0.9512 and stats.overall.unique_reflections == 678
+    assert (stats.overall.d_max, stats.overall.d_min) == (30.0, 2.5)
+    assert stats.CCano == 0.05 and stats.total_measurements == 12345 and stats.Wilson_B_factor == 23.4
+    assert stats.outer.CCstar == 0.512 and stats.outer.Rsplit == 40.0 and stats.outer.snr == 1.2
+    assert (stats.outer.d_max, stats.outer.d_min) == (5.0, 2.5)
+    assert stats.comment is None
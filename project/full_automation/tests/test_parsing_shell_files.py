@@ -0,0 +1,55 @@
+import os
+import sys
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from partialator_utils.parsing_shell_files import read_shell_file, shell_column
+
+
+def write_file(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_columns_are_named_after_the_cleaned_header(tmp_path):
+    path = write_file(tmp_path / 'run_CCstar.dat',
+                      '  1/d centre  CC*  nref  d / A  min 1/nm  max 1/nm\n'
+                      '  1.500  0.9876  120  6.67  1.0  2.0\n'
+                      '  2.500  0.5120  80  4.00  2.0  3.0\n')
+    table = read_shell_file(path)
+    assert table.dtype.names == ('1/d', 'CC*', 'nref', 'd', 'min', 'max')
+    assert table['CC*'].tolist() == [0.9876, 0.512]
+    assert shell_column(table, 3).tolist() == [6.67, 4.0]
+
+
+def test_non_numeric_values_are_nan_and_short_rows_padded(tmp_path):
+    path = write_file(tmp_path / 'run_CC.dat',
+                      '  1/d centre  CC  nref  d / A  min 1/nm  max 1/nm\n'
+                      '  1.500  -nan  120  6.67  1.0  2.0\n'
+                      '  2.500  0.5  80\n')
+    table = read_shell_file(path)
+    assert np.isnan(table['CC'][0])
+    assert table['CC'][1] == 0.5
+    assert np.isnan(table['d'][1])
+
+
+def test_header_not_matching_the_data_gives_positional_names(tmp_path):
+    path = write_file(tmp_path / 'run_SNR.dat',
+                      '  1/d centre   nref  possible  compl  meas  red  SNR  mean I  d(A)  min 1/nm  max 1/nm\n'
+                      '1.500 100 100 100.0 500 5.0 3.2 10.0 6.67 1.0 2.0\n')
+    table = read_shell_file(path)
+    assert table.dtype.names == tuple(f'f{i}' for i in range(11))
+    assert shell_column(table, 6).tolist() == [3.2]
+
+
+def test_file_is_parsed_again_only_when_it_changes(tmp_path):
+    path = write_file(tmp_path / 'run_Rsplit.dat', '  1/d centre  Rsplit/%  nref  d / A  min 1/nm  max 1/nm\n'
+                                                   '  1.500  12.0  120  6.67  1.0  2.0\n')
+    first = read_shell_file(path)
+    assert read_shell_file(path) is first
+    assert not first.flags.writeable
+
+    with open(path, 'a') as f:
+        f.write('  2.500  40.0  80  4.00  2.0  3.0\n')
+    assert read_shell_file(path)['Rsplit/%'].tolist() == [12.0, 40.0]
@@ -0,0 +1,79 @@
+import os
+import sys
+import numpy as np
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from partialator_utils.resolution_cutoff_determination import (
+    d_at_threshold_batch, get_d_at_snr_one, resolution_cutoffs_batch
+)
+
+
+def loop_d_at_threshold(values, d_values, target):
+    """The per-shell loop get_d_at_snr_one and get_d_at_cc_threshold used before the batch search."""
+    filtered_data = []
+    for i, (value, d_value) in enumerate(zip(values, d_values)):
+        if i == 0 or value < filtered_data[-1][0]:
+            filtered_data.append((value, d_value))
+    for i in range(len(filtered_data) - 1):
+        value1, d1 = filtered_data[i]
+        value2, d2 = filtered_data[i + 1]
+        if value1 == target:
+            return d1
+        if value1 > target > value2:
+            return round(d1 + (d2 - d1) * (target - value1) / (value2 - value1), 3)
+    return None
+
+
+def random_tables(rng, n_tables):
+    for _ in range(n_tables):
+        n = int(rng.integers(2, 12))
+        values = np.round(np.sort(rng.random(n) * 3)[::-1] + rng.normal(0, 0.2, n), 3)
+        d_values = np.round(np.sort(rng.random(n) * 8 + 1)[::-1], 3)
+        yield values.tolist(), d_values.tolist()
+
+
+def test_batch_matches_the_per_shell_loop():
+    tables = list(random_tables(np.random.default_rng(0), 20000))
+    values = np.full((len(tables), 11), np.nan)
+    d_values = np.full((len(tables), 11), np.nan)
+    for i, (y, d) in enumerate(tables):
+        values[i, :len(y)], d_values[i, :len(d)] = y, d
+    for target in (1.0, 0.3):
+        result = d_at_threshold_batch(values, d_values, target)
+        expected = [loop_d_at_threshold(y, d, target) for y, d in tables]
+        assert [None if np.isnan(value) else value for value in result.tolist()] == expected
+
+
+@pytest.mark.parametrize('values, expected', [
+    ([3.0, 2.0, 1.0, 0.5], 4.0),         # exact shell
+    ([3.0, 2.0, 0.5, 0.2], 4.333),       # interpolated
+    ([3.0, 3.5, 2.0, 1.5, 0.5], 2.5),    # non-monotone shell dropped
+    ([3.0, 2.0, 1.5, 1.2], None),        # never reached
+])
+def test_get_d_at_snr_one(tmp_path, values, expected):
+    snr_file = tmp_path / 'run_SNR.dat'
+    with open(snr_file, 'w') as f:
+        f.write('  1/d centre   nref  possible  compl  meas  red  SNR  mean I  d(A)  min 1/nm  max 1/nm\n')
+        for i, snr in enumerate(values):
+            d = 6.0 - i
+            f.write(f'{10 / d:.3f} 100 100 100.0 500 5.0 {snr} 10.0 {d} 1.0 2.0\n')
+    assert get_d_at_snr_one(str(snr_file)) == expected
+
+
+def test_cutoffs_batch_only_replaces_the_file_suffix(tmp_path):
+    folder = tmp_path / 'CCstar_runs'
+    folder.mkdir()
+    base = folder / 'run'
+    for kind, column in (('CCstar', 'CC*'), ('Rsplit', 'Rsplit/%'), ('CC', 'CC')):
+        with open(f'{base}_{kind}.dat', 'w') as f:
+            f.write(f'  1/d centre  {column}  nref  d / A  min 1/nm  max 1/nm\n')
+            for i, value in enumerate((0.9, 0.5, 0.2)):
+                f.write(f'  {1.5 + i:.3f}  {value * (100 if kind == "Rsplit" else 1)}  100  {4.0 - i}  1.0  2.0\n')
+    with open(f'{base}_SNR.dat', 'w') as f:
+        f.write('  1/d centre   nref  possible  compl  meas  red  SNR  mean I  d(A)  min 1/nm  max 1/nm\n')
+        for i, snr in enumerate((3.0, 1.0, 0.5)):
+            f.write(f'{1.5 + i:.3f} 100 100 100.0 500 5.0 {snr} 10.0 {4.0 - i} 1.0 2.0\n')
+    result = resolution_cutoffs_batch([f'{base}_CCstar.dat'])
+    assert result['Resolution SNR=1'].tolist() == [3.0]
+    assert result['Resolution CC>=0.3'].tolist() == [2.333]
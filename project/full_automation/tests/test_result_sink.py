@@ -0,0 +1,73 @@
+import os
+import csv
+import sys
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from run_processing_utils.result_sink import ResultSink
+from run_processing_utils.run_stats import RunStats
+
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f, delimiter=';'))
+
+
+def test_first_flush_replaces_a_previous_table(tmp_path):
+    path = tmp_path / 'results.csv'
+    path.write_text('Run;Comment\nold;previous campaign\n')
+    with ResultSink(str(path)) as sink:
+        sink.add(RunStats(run='a', comment='first'))
+    rows = read_rows(path)
+    assert [row['Run'] for row in rows] == ['a']
+    assert rows[0]['Comment'] == 'first'
+
+
+def test_later_flushes_append_and_append_mode_keeps_the_table(tmp_path):
+    path = tmp_path / 'results.csv'
+    with ResultSink(str(path)) as sink:
+        sink.add(RunStats(run='a'))
+        sink.flush()
+        inode = os.stat(path).st_ino
+        sink.add(RunStats(run='b'))
+        sink.flush()
+        assert os.stat(path).st_ino == inode  # appended, not rewritten
+    with ResultSink(str(path), append=True) as sink:
+        sink.add(RunStats(run='c'))
+    assert [row['Run'] for row in read_rows(path)] == ['a', 'b', 'c']
+
+
+def test_updated_record_is_appended_again(tmp_path):
+    path = tmp_path / 'results.csv'
+    with ResultSink(str(path)) as sink:
+        stats = RunStats(run='a')
+        sink.add(stats)
+        sink.add(RunStats(run='b'))
+        sink.flush()
+        stats.Rwork, stats.Rfree = 0.2, 0.25
+        sink.update(stats)
+        sink.update(RunStats(run='unknown'))  # never added, nothing to rewrite
+    rows = read_rows(path)
+    assert [row['Run'] for row in rows] == ['a', 'b', 'a']
+    assert rows[-1]['Rwork/Rfree'] == '0.2/0.25'
+
+
+def test_new_columns_rewrite_the_table_with_one_row_per_run(tmp_path):
+    path = tmp_path / 'results.csv'
+    path.write_text('Run;Comment\na;old\nb;kept\na;newer\n')
+    with ResultSink(str(path), append=True) as sink:
+        sink.add(RunStats(run='c', comment='new'))
+    rows = read_rows(path)
+    assert list(rows[0])[:2] == ['Run', 'Comment'] and 'Rwork/Rfree' in rows[0]
+    assert [(row['Run'], row['Comment']) for row in rows] == [('a', 'newer'), ('b', 'kept'), ('c', 'new')]
+    assert rows[1]['Rwork/Rfree'] == ''
+
+
+def test_buffered_records_are_flushed_by_the_timer(tmp_path):
+    path = tmp_path / 'results.csv'
+    sink = ResultSink(str(path), flush_interval=0.2)
+    sink.add(RunStats(run='a'))
+    assert not path.exists()
+    time.sleep(0.5)
+    assert [row['Run'] for row in read_rows(path)] == ['a']
+    sink.close()